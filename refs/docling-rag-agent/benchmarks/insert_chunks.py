@@ -0,0 +1,192 @@
+"""
+Benchmark chunk insertion throughput against PostgreSQL/PGVector.
+
+Compares the write paths used by the ingestion pipeline:
+- row:         one INSERT round trip per chunk (original _save_to_postgres)
+- executemany: one prepared statement, rows pipelined by asyncpg
+- copy:        COPY via copy_records_to_table with the binary pgvector codec
+
+Rows go into a temporary table shaped like `chunks`, so no real data is touched.
+
+Usage:
+    uv run python benchmarks/insert_chunks.py --rows 2000 --dimensions 1536
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+from typing import Any, Callable, Dict, List, Tuple
+
+import asyncpg
+from dotenv import load_dotenv
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.vector_codec import register_vector_codec
+
+load_dotenv()
+
+DOCUMENT_ID = "00000000-0000-0000-0000-000000000000"
+
+
+def make_rows(count: int, dimensions: int) -> List[Dict[str, Any]]:
+    """Generate synthetic chunks with random embeddings."""
+    return [
+        {
+            "content": f"Benchmark chunk {i} " + "lorem ipsum " * 80,
+            "embedding": [random.uniform(-1.0, 1.0) for _ in range(dimensions)],
+            "chunk_index": i,
+            "metadata": {"source": "benchmark", "chunk": i},
+            "token_count": 200,
+        }
+        for i in range(count)
+    ]
+
+
+def to_vector_text(embedding: List[float]) -> str:
+    """PostgreSQL vector text format."""
+    return '[' + ','.join(map(str, embedding)) + ']'
+
+
+INSERT_SQL = """
+    INSERT INTO bench_chunks (document_id, content, embedding, chunk_index, metadata, token_count)
+    VALUES ($1::uuid, $2, $3::vector, $4, $5, $6)
+"""
+
+
+async def insert_row_by_row(conn: asyncpg.Connection, rows: List[Dict[str, Any]]):
+    """Baseline: one execute per chunk."""
+    async with conn.transaction():
+        for row in rows:
+            await conn.execute(
+                INSERT_SQL,
+                DOCUMENT_ID,
+                row["content"],
+                to_vector_text(row["embedding"]),
+                row["chunk_index"],
+                json.dumps(row["metadata"]),
+                row["token_count"],
+            )
+
+
+async def insert_executemany(conn: asyncpg.Connection, rows: List[Dict[str, Any]]):
+    """Single prepared statement with pipelined rows."""
+    async with conn.transaction():
+        await conn.executemany(
+            INSERT_SQL,
+            [
+                (
+                    DOCUMENT_ID,
+                    row["content"],
+                    to_vector_text(row["embedding"]),
+                    row["chunk_index"],
+                    json.dumps(row["metadata"]),
+                    row["token_count"],
+                )
+                for row in rows
+            ],
+        )
+
+
+async def insert_copy(conn: asyncpg.Connection, rows: List[Dict[str, Any]]):
+    """COPY with embeddings encoded as binary float32."""
+    async with conn.transaction():
+        await conn.copy_records_to_table(
+            "bench_chunks",
+            records=[
+                (
+                    DOCUMENT_ID,
+                    row["content"],
+                    row["embedding"],
+                    row["chunk_index"],
+                    json.dumps(row["metadata"]),
+                    row["token_count"],
+                )
+                for row in rows
+            ],
+            columns=["document_id", "content", "embedding", "chunk_index", "metadata", "token_count"],
+        )
+
+
+# Method name -> (insert function, needs the binary vector codec)
+METHODS: Dict[str, Tuple[Callable, bool]] = {
+    "row": (insert_row_by_row, False),
+    "executemany": (insert_executemany, False),
+    "copy": (insert_copy, True),
+}
+
+
+async def run_benchmark(rows: int, dimensions: int, repeat: int, methods: List[str]):
+    """Run each insert method and print rows/sec."""
+    database_url = os.getenv("DATABASE_URL")
+    if not database_url:
+        print("DATABASE_URL environment variable is required")
+        sys.exit(1)
+
+    data = make_rows(rows, dimensions)
+    results: List[Tuple[str, float]] = []
+
+    for method in methods:
+        insert, binary = METHODS[method]
+
+        # Fresh connection per method: text-format paths must not have the
+        # binary codec registered
+        conn = await asyncpg.connect(database_url)
+        try:
+            if binary:
+                await register_vector_codec(conn)
+
+            await conn.execute(f"""
+                CREATE TEMP TABLE bench_chunks (
+                    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+                    document_id UUID NOT NULL,
+                    content TEXT NOT NULL,
+                    embedding vector({dimensions}),
+                    chunk_index INTEGER NOT NULL,
+                    metadata JSONB DEFAULT '{{}}',
+                    token_count INTEGER
+                )
+            """)
+
+            timings = []
+            for _ in range(repeat):
+                await conn.execute("TRUNCATE bench_chunks")
+                start = time.perf_counter()
+                await insert(conn, data)
+                timings.append(time.perf_counter() - start)
+        finally:
+            await conn.close()
+
+        best = min(timings)
+        results.append((method, rows / best))
+        print(f"{method:>12}: {rows / best:10.1f} rows/sec (best of {repeat}, {best:.3f}s)")
+
+    baseline = results[0][1]
+    print()
+    for method, rate in results[1:]:
+        print(f"{method} is {rate / baseline:.1f}x {results[0][0]}")
+
+
+def main():
+    """Main entry point."""
+    parser = argparse.ArgumentParser(description="Benchmark chunk insertion into PGVector")
+    parser.add_argument("--rows", type=int, default=2000, help="Chunks inserted per run")
+    parser.add_argument("--dimensions", type=int, default=1536, help="Embedding dimensions")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per method (best is reported)")
+    parser.add_argument(
+        "--methods",
+        nargs="+",
+        choices=list(METHODS),
+        default=list(METHODS),
+        help="Insert methods to compare (the first one is the baseline)"
+    )
+    args = parser.parse_args()
+
+    asyncio.run(run_benchmark(args.rows, args.dimensions, args.repeat, args.methods))
+
+
+if __name__ == "__main__":
+    main()
@@ -11,12 +11,17 @@ import argparse
 import logging
 import os
 import sys
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from datetime import datetime
 
 from dotenv import load_dotenv
 from pydantic_ai import Agent, RunContext
 
+from utils.vector_codec import register_vector_codec
+from utils.search import knowledge_base_multi_search, knowledge_base_search
+from utils.local_index import close_local_index
+from utils.answer_cache import AnswerCache, seed_instructions
+
 # Load environment variables
 load_dotenv(".env")
 
@@ -48,7 +53,8 @@ async def initialize_db():
             os.getenv("DATABASE_URL"),
             min_size=2,
             max_size=10,
-            command_timeout=60
+            command_timeout=60,
+            init=register_vector_codec
         )
         # logger.info("Database connection pool initialized")
 
@@ -56,18 +62,34 @@ async def initialize_db():
 async def close_db():
     """Close database connection pool."""
     global db_pool
+    await close_local_index()
     if db_pool:
         await db_pool.close()
         # logger.info("Database connection pool closed")
 
 
-async def search_knowledge_base(ctx: RunContext[None], query: str, limit: int = 5) -> str:
+async def search_knowledge_base(
+    ctx: RunContext[None],
+    query: str,
+    limit: int = 5,
+    source: Optional[str] = None,
+    title: Optional[str] = None,
+    file_type: Optional[str] = None,
+    ingested_after: Optional[str] = None
+) -> str:
     """
-    Search the knowledge base using semantic similarity.
+    Search the knowledge base by meaning and exact terms.
+
+    Combines vector similarity with full-text matching (SEARCH_TYPE=hybrid by
+    default), so names, tickers and other exact terms are found as well.
 
     Args:
         query: The search query to find relevant information
         limit: Maximum number of results to return (default: 5)
+        source: Only search documents whose file path contains this text
+        title: Only search documents whose title contains this text
+        file_type: Only search documents with this file extension (e.g. "pdf")
+        ingested_after: Only search documents ingested on or after this ISO date
 
     Returns:
         Formatted search results with source citations
@@ -77,54 +99,73 @@ async def search_knowledge_base(ctx: RunContext[None], query: str, limit: int =
         if not db_pool:
             await initialize_db()
 
-        # Generate embedding for query
-        from ingestion.embedder import create_embedder
-        embedder = create_embedder()
-        query_embedding = await embedder.embed_query(query)
-
-        # Convert to PostgreSQL vector format
-        embedding_str = '[' + ','.join(map(str, query_embedding)) + ']'
-
-        # Search using match_chunks function
-        async with db_pool.acquire() as conn:
-            results = await conn.fetch(
-                """
-                SELECT * FROM match_chunks($1::vector, $2)
-                """,
-                embedding_str,
-                limit
-            )
+        return await knowledge_base_search(
+            db_pool,
+            query,
+            limit,
+            filters={
+                "source": source,
+                "title": title,
+                "file_type": file_type,
+                "ingested_after": ingested_after
+            }
+        )
 
-        # Format results for response
-        if not results:
-            return "No relevant information found in the knowledge base for your query."
+    except Exception as e:
+        # logger.error(f"Knowledge base search failed: {e}", exc_info=True)
+        return f"I encountered an error searching the knowledge base: {str(e)}"
 
-        # Build response with sources
-        response_parts = []
-        for i, row in enumerate(results, 1):
-            similarity = row['similarity']
-            content = row['content']
-            doc_title = row['document_title']
-            doc_source = row['document_source']
 
-            response_parts.append(
-                f"[Source: {doc_title}]\n{content}\n"
-            )
+async def search_knowledge_base_multi(
+    ctx: RunContext[None],
+    queries: List[str],
+    limit: int = 3,
+    source: Optional[str] = None,
+    title: Optional[str] = None,
+    file_type: Optional[str] = None,
+    ingested_after: Optional[str] = None
+) -> str:
+    """
+    Search the knowledge base for several related queries at once.
+
+    Use this instead of calling search_knowledge_base repeatedly when a question
+    needs more than one search (e.g. comparing companies or covering several
+    aspects). Each result is listed once, under the query it matches best.
+
+    Args:
+        queries: Search queries (at most 8)
+        limit: Maximum number of results per query (default: 3)
+        source: Only search documents whose file path contains this text
+        title: Only search documents whose title contains this text
+        file_type: Only search documents with this file extension (e.g. "pdf")
+        ingested_after: Only search documents ingested on or after this ISO date
 
-        if not response_parts:
-            return "Found some results but they may not be directly relevant to your query. Please try rephrasing your question."
+    Returns:
+        Formatted search results per query with source citations
+    """
+    try:
+        # Ensure database is initialized
+        if not db_pool:
+            await initialize_db()
 
-        return f"Found {len(response_parts)} relevant results:\n\n" + "\n---\n".join(response_parts)
+        return await knowledge_base_multi_search(
+            db_pool,
+            queries,
+            limit,
+            filters={
+                "source": source,
+                "title": title,
+                "file_type": file_type,
+                "ingested_after": ingested_after
+            }
+        )
 
     except Exception as e:
-        # logger.error(f"Knowledge base search failed: {e}", exc_info=True)
+        # logger.error(f"Knowledge base multi-query search failed: {e}", exc_info=True)
         return f"I encountered an error searching the knowledge base: {str(e)}"
 
 
-# Create the PydanticAI agent with the RAG tool
-agent = Agent(
-    'openai:gpt-4o-mini',
-    system_prompt="""You are an intelligent knowledge assistant with access to an organization's documentation and information.
+SYSTEM_PROMPT = """You are an intelligent knowledge assistant with access to an organization's documentation and information.
 Your role is to help users find accurate information from the knowledge base.
 You have a professional yet friendly demeanor.
 
@@ -132,8 +173,18 @@ IMPORTANT: Always search the knowledge base before answering questions about spe
 If information isn't in the knowledge base, clearly state that and offer general guidance.
 Be concise but thorough in your responses.
 Ask clarifying questions if the user's query is ambiguous.
-When you find relevant information, synthesize it clearly and cite the source documents.""",
-    tools=[search_knowledge_base]
+When a question needs several searches, run them together with search_knowledge_base_multi.
+When you find relevant information, synthesize it clearly and cite the source documents."""
+
+# Semantic cache of answers to first questions
+answer_cache = AnswerCache.from_env()
+
+# Create the PydanticAI agent with the RAG tool
+agent = Agent(
+    'openai:gpt-4o-mini',
+    system_prompt=SYSTEM_PROMPT,
+    instructions=seed_instructions,
+    tools=[search_knowledge_base, search_knowledge_base_multi]
 )
 
 
@@ -169,6 +220,7 @@ class RAGAgentCLI:
 
 {Colors.BOLD}Features:{Colors.END}
   • Semantic search through embedded documents
+  • Paraphrased first questions answered from a semantic answer cache
   • Streaming responses in real-time
   • Conversation history maintained across turns
   • Source citations for all information
@@ -182,9 +234,17 @@ class RAGAgentCLI:
 
     def print_stats(self):
         """Print conversation statistics."""
+        from ingestion.embedder import get_query_embedder
+
         message_count = len(self.message_history)
+        cache_stats = get_query_embedder().stats()
         print(f"\n{Colors.MAGENTA}{Colors.BOLD}📊 Session Statistics:{Colors.END}")
         print(f"  Messages in history: {message_count}")
+        print(f"  Query embedding cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses")
+        print(
+            f"  Answer cache: {answer_cache.stats['hits']} hits, {answer_cache.stats['seeded']} seeded, "
+            f"{answer_cache.stats['misses']} misses, {answer_cache.stats['stored']} stored"
+        )
         print(f"  Session started: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
         print(f"{Colors.BLUE}{'─' * 60}{Colors.END}\n")
 
@@ -257,24 +317,26 @@ class RAGAgentCLI:
         try:
             print(f"\n{Colors.BOLD}🤖 Assistant:{Colors.END} ", end="", flush=True)
 
-            # Stream the response using run_stream
-            async with agent.run_stream(
+            # Stream the response (first questions go through the semantic answer cache)
+            response = await answer_cache.run_with_answer_cache(
+                agent,
+                db_pool,
                 message,
-                message_history=self.message_history
-            ) as result:
-                # Stream text as it comes in (delta=True for only new tokens)
-                async for text in result.stream_text(delta=True):
-                    # Print only the new token
-                    print(text, end="", flush=True)
-
-                print()  # New line after streaming completes
+                self.message_history,
+                SYSTEM_PROMPT,
+                on_text=lambda text: print(text, end='', flush=True)
+            )
+            print()  # New line after streaming completes
 
-                # Update message history for context
-                self.message_history = result.all_messages()
+            # Update message history for context
+            self.message_history = response.messages
 
+            if response.from_cache:
+                cached = response.cached
+                print(f"\n{Colors.MAGENTA}(Cached answer to \"{cached.query}\", similarity {cached.similarity:.2f}){Colors.END}")
+            else:
                 # Extract and display tools used in this turn
-                new_messages = result.new_messages()
-                tools_used = self.extract_tool_calls(new_messages)
+                tools_used = self.extract_tool_calls(response.new_messages)
                 if tools_used:
                     print(self.format_tools_used(tools_used))
 
@@ -380,8 +442,9 @@ def main():
         global agent
         agent = Agent(
             f'openai:{args.model}',
-            system_prompt=agent.system_prompt,
-            tools=[search_knowledge_base]
+            system_prompt=SYSTEM_PROMPT,
+            instructions=seed_instructions,
+            tools=[search_knowledge_base, search_knowledge_base_multi]
         )
         # logger.info(f"Using model: {args.model}")
 
@@ -0,0 +1,376 @@
+"""
+Process-pool Docling conversion for the ingestion pipeline.
+
+Docling conversion is CPU-bound and blocking, and building a DocumentConverter
+loads layout/table models. This module runs conversion in a pool of worker
+processes where each worker keeps one warm DocumentConverter for its lifetime,
+so conversion scales across cores while the event loop keeps embedding and
+writing other documents.
+
+Converted documents are cached on disk by file content hash and Docling
+version, so unchanged files are never converted twice, even when they are
+re-chunked or re-embedded with different settings.
+
+Audio files are transcribed with Whisper Turbo by a separate long-lived worker
+process that loads the ASR model once and works through queued recordings
+while documents convert in the pool.
+"""
+
+import os
+import gzip
+import json
+import asyncio
+import hashlib
+import logging
+import multiprocessing
+from importlib import metadata
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# File extensions converted by Docling (audio is handled separately)
+DOCLING_FORMATS = ['.pdf', '.docx', '.doc', '.pptx', '.ppt', '.xlsx', '.xls', '.html', '.htm']
+
+DEFAULT_CACHE_DIR = ".cache/conversions"
+
+# Per-process converters, created once by the pool initializers
+_worker_converter = None
+_asr_converter = None
+
+
+def _init_worker(num_threads: int) -> None:
+    """Create the DocumentConverter reused by this worker process."""
+    global _worker_converter
+
+    # Keep workers from oversubscribing the CPU with their own thread pools
+    os.environ.setdefault("OMP_NUM_THREADS", str(num_threads))
+
+    from docling.document_converter import DocumentConverter
+
+    _worker_converter = DocumentConverter()
+
+
+def convert_document(file_path: str) -> Tuple[str, Dict[str, Any]]:
+    """
+    Convert a document inside a worker process.
+
+    Args:
+        file_path: Path to the document file
+
+    Returns:
+        Tuple of (markdown_content, serialized DoclingDocument)
+    """
+    if _worker_converter is None:
+        _init_worker(num_threads=1)
+
+    result = _worker_converter.convert(file_path)
+
+    return result.document.export_to_markdown(), result.document.export_to_dict()
+
+
+def _init_asr_worker() -> None:
+    """Create the Whisper Turbo converter reused by the transcription process."""
+    global _asr_converter
+
+    from docling.document_converter import DocumentConverter, AudioFormatOption
+    from docling.datamodel.pipeline_options import AsrPipelineOptions
+    from docling.datamodel import asr_model_specs
+    from docling.datamodel.base_models import InputFormat
+    from docling.pipeline.asr_pipeline import AsrPipeline
+
+    # Configure ASR pipeline with Whisper Turbo model
+    pipeline_options = AsrPipelineOptions()
+    pipeline_options.asr_options = asr_model_specs.WHISPER_TURBO
+
+    _asr_converter = DocumentConverter(
+        format_options={
+            InputFormat.AUDIO: AudioFormatOption(
+                pipeline_cls=AsrPipeline,
+                pipeline_options=pipeline_options,
+            )
+        }
+    )
+    # Load the model up front instead of on the first recording
+    _asr_converter.initialize_pipeline(InputFormat.AUDIO)
+
+
+def transcribe_audio(file_path: str) -> str:
+    """
+    Transcribe an audio file inside the transcription process.
+
+    Args:
+        file_path: Path to the audio file
+
+    Returns:
+        Markdown transcript with timestamps
+    """
+    if _asr_converter is None:
+        _init_asr_worker()
+
+    # Docling expects a Path object
+    audio_path = Path(file_path).resolve()
+    if not audio_path.exists():
+        raise FileNotFoundError(f"Audio file not found: {audio_path}")
+
+    result = _asr_converter.convert(audio_path)
+
+    return result.document.export_to_markdown()
+
+
+def hash_file(file_path: str) -> str:
+    """Compute the SHA-256 of a file's content."""
+    sha256 = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            sha256.update(block)
+    return sha256.hexdigest()
+
+
+def get_docling_version() -> str:
+    """Installed Docling version; conversions from other versions are not reused."""
+    try:
+        return metadata.version("docling")
+    except metadata.PackageNotFoundError:
+        return "unknown"
+
+
+class ConversionCache:
+    """
+    On-disk cache of Docling conversions.
+
+    Each entry is a gzipped JSON file holding the exported markdown and the
+    serialized DoclingDocument, stored under the Docling version and the
+    SHA-256 of the source file.
+    """
+
+    def __init__(self, directory: Optional[str] = None):
+        """
+        Initialize conversion cache.
+
+        Args:
+            directory: Cache directory (default: CONVERSION_CACHE_DIR env var or
+                .cache/conversions)
+        """
+        self.directory = os.path.join(
+            directory or os.getenv("CONVERSION_CACHE_DIR", DEFAULT_CACHE_DIR),
+            get_docling_version()
+        )
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _path(self, content_hash: str) -> str:
+        return os.path.join(self.directory, f"{content_hash}.json.gz")
+
+    def get(self, content_hash: str) -> Optional[Tuple[str, Optional[Dict[str, Any]]]]:
+        """
+        Load a cached conversion.
+
+        Args:
+            content_hash: SHA-256 of the source file
+
+        Returns:
+            Tuple of (markdown_content, serialized DoclingDocument or None for
+            transcripts), or None on a miss
+        """
+        try:
+            with gzip.open(self._path(content_hash), "rt", encoding="utf-8") as f:
+                entry = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable conversion cache entry {content_hash}: {e}")
+            return None
+
+        return entry["markdown"], entry["document"]
+
+    def put(
+        self,
+        content_hash: str,
+        markdown_content: str,
+        document_dict: Optional[Dict[str, Any]]
+    ) -> None:
+        """
+        Store a conversion.
+
+        Args:
+            content_hash: SHA-256 of the source file
+            markdown_content: Exported markdown
+            document_dict: Serialized DoclingDocument (None for transcripts)
+        """
+        path = self._path(content_hash)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+
+        # Write to a temporary file first so readers never see a partial entry
+        with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+            json.dump({"markdown": markdown_content, "document": document_dict}, f)
+        os.replace(tmp_path, path)
+
+
+class DoclingConversionPool:
+    """Pool of worker processes, each holding a warm DocumentConverter."""
+
+    def __init__(self, max_workers: Optional[int] = None, cache: Optional[ConversionCache] = None):
+        """
+        Initialize conversion pool.
+
+        Args:
+            max_workers: Number of worker processes (default: CPU count)
+            cache: On-disk conversion cache consulted before converting
+        """
+        self.max_workers = max(1, max_workers or os.cpu_count() or 1)
+        self.cache = cache
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        """Create the executor on first use; workers are spawned on demand."""
+        if self._executor is None:
+            num_threads = max(1, (os.cpu_count() or 1) // self.max_workers)
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                # spawn avoids forking a process that holds an event loop and model threads
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(num_threads,)
+            )
+            logger.info(f"Started Docling conversion pool with {self.max_workers} workers")
+        return self._executor
+
+    async def convert(self, file_path: str, content_hash: Optional[str] = None) -> Tuple[str, Any]:
+        """
+        Convert a document in the pool, or load it from the cache.
+
+        Args:
+            file_path: Path to the document file
+            content_hash: SHA-256 of the file if already known
+
+        Returns:
+            Tuple of (markdown_content, DoclingDocument)
+        """
+        from docling_core.types.doc import DoclingDocument
+
+        cached = None
+        if self.cache is not None:
+            if content_hash is None:
+                content_hash = await asyncio.to_thread(hash_file, file_path)
+            cached = await asyncio.to_thread(self.cache.get, content_hash)
+
+        if cached is not None:
+            logger.info(f"Using cached conversion of {os.path.basename(file_path)}")
+            markdown_content, document_dict = cached
+        else:
+            loop = asyncio.get_running_loop()
+            executor = self._get_executor()
+            try:
+                markdown_content, document_dict = await loop.run_in_executor(
+                    executor, convert_document, file_path
+                )
+            except BrokenProcessPool:
+                # A worker died (e.g. out of memory); start a fresh pool for later files.
+                # Concurrent conversions on the same pool fail too, so only replace it
+                # if no other conversion already has.
+                if self._executor is executor:
+                    logger.error("Docling conversion pool broke, restarting it")
+                    self._executor = None
+                    # Don't block the event loop while the dead workers are reaped
+                    executor.shutdown(wait=False, cancel_futures=True)
+                raise
+
+            if self.cache is not None:
+                try:
+                    await asyncio.to_thread(self.cache.put, content_hash, markdown_content, document_dict)
+                except OSError as e:
+                    logger.warning(f"Failed to cache conversion of {file_path}: {e}")
+
+        return markdown_content, DoclingDocument.model_validate(document_dict)
+
+    def shutdown(self) -> None:
+        """Stop all worker processes."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+
+class AudioTranscriptionWorker:
+    """
+    Dedicated process that keeps the Whisper model loaded.
+
+    Recordings are queued to a single worker process, so a folder of audio
+    files costs one model load and transcription runs alongside Docling
+    conversion. Transcripts are cached by the audio file's content hash.
+    """
+
+    # Part of the cache key, so a different ASR model gets its own entries
+    MODEL_NAME = "whisper_turbo"
+
+    def __init__(self, cache: Optional[ConversionCache] = None):
+        """
+        Initialize transcription worker.
+
+        Args:
+            cache: On-disk cache for transcripts
+        """
+        self.cache = cache
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        """Start the transcription process on first use."""
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=1,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_asr_worker
+            )
+            logger.info("Started Whisper transcription worker")
+        return self._executor
+
+    async def transcribe(self, file_path: str, content_hash: Optional[str] = None) -> str:
+        """
+        Transcribe an audio file, or load its transcript from the cache.
+
+        Args:
+            file_path: Path to the audio file
+            content_hash: SHA-256 of the file if already known
+
+        Returns:
+            Markdown transcript with timestamps
+        """
+        cache_key = None
+        if self.cache is not None:
+            if content_hash is None:
+                content_hash = await asyncio.to_thread(hash_file, file_path)
+            cache_key = f"{content_hash}-{self.MODEL_NAME}"
+            cached = await asyncio.to_thread(self.cache.get, cache_key)
+            if cached is not None:
+                logger.info(f"Using cached transcript of {os.path.basename(file_path)}")
+                return cached[0]
+
+        logger.info(f"Transcribing audio file using Whisper Turbo: {os.path.basename(file_path)}")
+        loop = asyncio.get_running_loop()
+        executor = self._get_executor()
+        try:
+            transcript = await loop.run_in_executor(
+                executor, transcribe_audio, file_path
+            )
+        except BrokenProcessPool:
+            if self._executor is executor:
+                logger.error("Whisper transcription worker died, restarting it")
+                self._executor = None
+                executor.shutdown(wait=False, cancel_futures=True)
+            raise
+
+        if cache_key is not None:
+            try:
+                await asyncio.to_thread(self.cache.put, cache_key, transcript, None)
+            except OSError as e:
+                logger.warning(f"Failed to cache transcript of {file_path}: {e}")
+
+        return transcript
+
+    def shutdown(self) -> None:
+        """Stop the transcription process."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
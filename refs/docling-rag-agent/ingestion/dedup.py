@@ -0,0 +1,124 @@
+"""
+Chunk-level deduplication for the ingestion pipeline.
+
+Boilerplate (headers, disclaimers, repeated tables) produces identical chunks
+across many documents. Chunks are keyed by a hash of their whitespace-
+normalized content; the first occurrence is embedded and every later copy
+shares its vector instead of being sent to the embedder again.
+"""
+
+import hashlib
+import logging
+from typing import Any, Dict, List, Tuple
+
+from .chunker import DocumentChunk
+from .embedder import EmbeddingCache
+
+logger = logging.getLogger(__name__)
+
+# Metadata the embedder sets on a chunk, copied to its duplicates
+EMBEDDING_METADATA_KEYS = (
+    "embedding_model",
+    "embedding_generated_at",
+    "embedding_segments",
+    "embedding_error",
+    "embedding_status",
+)
+
+# (document, chunk) as passed between pipeline stages
+PipelineItem = Tuple[Any, DocumentChunk]
+
+
+def content_key(text: str) -> str:
+    """Hash chunk content with whitespace normalized."""
+    return hashlib.sha256(" ".join(text.split()).encode("utf-8")).hexdigest()
+
+
+class ChunkDeduplicator:
+    """
+    Routes chunks so that each distinct text is embedded once per run.
+
+    Vectors of recently embedded texts are kept in a bounded LRU, so memory
+    does not grow with the corpus; duplicates of a text that is still being
+    embedded wait for it instead of being embedded in parallel.
+    """
+
+    EMBED = "embed"
+    SHARED = "shared"
+    WAITING = "waiting"
+
+    def __init__(self, cache_size: int = 10000):
+        """
+        Initialize deduplicator.
+
+        Args:
+            cache_size: Number of recent embeddings kept for reuse
+        """
+        self.cache = EmbeddingCache(max_size=cache_size)
+        self._metadata: Dict[str, Dict[str, Any]] = {}
+        self._in_flight: Dict[str, List[PipelineItem]] = {}
+
+    def route(self, item: PipelineItem) -> str:
+        """
+        Decide how a chunk gets its embedding.
+
+        Args:
+            item: (document, chunk) leaving the chunking stage
+
+        Returns:
+            EMBED if the chunk must go to the embedder, SHARED if its embedding
+            was copied from an identical chunk, WAITING if an identical chunk is
+            being embedded right now (the item is returned by resolve())
+        """
+        chunk = item[1]
+        key = content_key(chunk.content)
+        chunk.metadata["chunk_hash"] = key
+
+        embedding = self.cache.get(key)
+        if embedding is not None:
+            self._share(chunk, embedding, self._metadata.get(key, {}))
+            return self.SHARED
+
+        if key in self._in_flight:
+            self._in_flight[key].append(item)
+            return self.WAITING
+
+        self._in_flight[key] = []
+        return self.EMBED
+
+    def resolve(self, chunk: DocumentChunk) -> List[PipelineItem]:
+        """
+        Share an embedded chunk's vector with the duplicates waiting for it.
+
+        Args:
+            chunk: Chunk routed with EMBED, back from the embedder
+
+        Returns:
+            Waiting (document, chunk) items, now with the same embedding
+        """
+        key = chunk.metadata["chunk_hash"]
+        waiting = self._in_flight.pop(key, [])
+        metadata = {
+            name: chunk.metadata[name]
+            for name in EMBEDDING_METADATA_KEYS
+            if name in chunk.metadata
+        }
+
+        # Failed embeddings are not remembered, so a later copy retries them
+        if chunk.embedding is not None:
+            self.cache.put(key, chunk.embedding)
+            self._metadata[key] = metadata
+            if len(self._metadata) > 2 * self.cache.max_size:
+                # Drop metadata of texts the LRU has evicted
+                self._metadata = {k: v for k, v in self._metadata.items() if k in self.cache}
+
+        for _, duplicate in waiting:
+            self._share(duplicate, chunk.embedding, metadata)
+
+        return waiting
+
+    def _share(self, chunk: DocumentChunk, embedding: Any, metadata: Dict[str, Any]) -> None:
+        """Give a duplicate chunk the embedding of the chunk it repeats."""
+        chunk.embedding = embedding
+        chunk.metadata.update(metadata)
+        chunk.metadata["duplicate_content"] = True
@@ -4,34 +4,75 @@ Document embedding generation for vector search.
 
 import os
 import asyncio
+import hashlib
 import logging
+from collections import OrderedDict
 from typing import List, Dict, Any, Optional, Tuple
 from datetime import datetime
 import json
 
+import numpy as np
 from openai import RateLimitError, APIError
 from dotenv import load_dotenv
 
 from .chunker import DocumentChunk
+from .embedding_store import PersistentEmbeddingCache
+from .rate_limiter import RateLimiter, retry_after_seconds
+from .local_embedder import is_local_model, get_local_backend, get_local_tokenizer
 
 # Import flexible providers
 try:
-    from ..utils.providers import get_embedding_client, get_embedding_model
+    from ..utils.providers import get_embedding_client, get_embedding_model, get_embedding_dimensions
 except ImportError:
     # For direct execution or testing
     import sys
     import os
     sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-    from utils.providers import get_embedding_client, get_embedding_model
+    from utils.providers import get_embedding_client, get_embedding_model, get_embedding_dimensions
 
 # Load environment variables
 load_dotenv()
 
 logger = logging.getLogger(__name__)
 
-# Initialize client with flexible provider
-embedding_client = get_embedding_client()
 EMBEDDING_MODEL = get_embedding_model()
+EMBEDDING_DIMENSIONS = get_embedding_dimensions()
+
+# Initialize client with flexible provider (local models need no API key)
+embedding_client = None if is_local_model(EMBEDDING_MODEL) else get_embedding_client()
+
+# Shared by every generator in the process, since limits apply per account
+rate_limiter = RateLimiter.from_env()
+
+
+def get_tokenizer(model: str):
+    """
+    Get the tokenizer used by an embedding model.
+    
+    OpenAI models use their tiktoken encoding, local models their Hugging
+    Face tokenizer.
+    
+    Returns:
+        Encoding, or None if it could not be loaded
+    """
+    if is_local_model(model):
+        return get_local_tokenizer(model)
+    
+    try:
+        import tiktoken
+    except ImportError:
+        logger.warning("tiktoken not installed, falling back to character-based token estimates")
+        return None
+    
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        # The encoding file is downloaded on first use, which fails offline
+        logger.warning(f"Failed to load tokenizer for {model} ({e}), using character-based token estimates")
+        return None
 
 
 class EmbeddingGenerator:
@@ -40,36 +81,91 @@ class EmbeddingGenerator:
     def __init__(
         self,
         model: str = EMBEDDING_MODEL,
-        batch_size: int = 100,
+        batch_size: int = 2048,
+        max_batch_tokens: Optional[int] = None,
         max_retries: int = 3,
-        retry_delay: float = 1.0
+        retry_delay: float = 1.0,
+        persistent_cache: Optional[PersistentEmbeddingCache] = None,
+        limiter: Optional[RateLimiter] = None,
+        dimensions: Optional[int] = EMBEDDING_DIMENSIONS
     ):
         """
         Initialize embedding generator.
         
         Args:
-            model: OpenAI embedding model to use
-            batch_size: Number of texts to process in parallel
+            model: Embedding model to use (OpenAI model name, or local:<model id>
+                for the local CPU backend)
+            batch_size: Maximum number of inputs per request
+            max_batch_tokens: Maximum input tokens per request (default: provider limit)
             max_retries: Maximum number of retry attempts
             retry_delay: Delay between retries in seconds
+            persistent_cache: On-disk cache consulted by embed_chunks before the API
+            limiter: Request scheduler (default: process-wide limiter from env)
+            dimensions: Output dimensions for models that support shortening
+                (default: EMBEDDING_DIMENSIONS env var, else the model's native size)
         """
         self.model = model
         self.batch_size = batch_size
         self.max_retries = max_retries
         self.retry_delay = retry_delay
+        self.persistent_cache = persistent_cache
+        self.dimensions = dimensions
+        
+        # Embeddings of different sizes must not share cache entries
+        self.cache_model = f"{model}@{dimensions}" if dimensions else model
+        
+        self.local_backend = get_local_backend(model, dimensions) if is_local_model(model) else None
+        if self.local_backend is not None:
+            # Local inference has no account limits; keep every worker busy
+            self.rate_limiter = limiter or RateLimiter.unlimited(self.local_backend.max_workers * 2)
+        else:
+            self.rate_limiter = limiter or rate_limiter
         
-        # Model-specific configurations
+        # Model-specific configurations (max_tokens is per input,
+        # max_request_tokens is summed over all inputs of one request)
         self.model_configs = {
-            "text-embedding-3-small": {"dimensions": 1536, "max_tokens": 8191},
-            "text-embedding-3-large": {"dimensions": 3072, "max_tokens": 8191},
-            "text-embedding-ada-002": {"dimensions": 1536, "max_tokens": 8191}
+            "text-embedding-3-small": {"dimensions": 1536, "max_tokens": 8191, "max_request_tokens": 300000},
+            "text-embedding-3-large": {"dimensions": 3072, "max_tokens": 8191, "max_request_tokens": 300000},
+            "text-embedding-ada-002": {"dimensions": 1536, "max_tokens": 8191, "max_request_tokens": 300000},
+            # Local models: max_tokens leaves room for the [CLS]/[SEP] tokens;
+            # max_request_tokens sizes the batches handed to one worker
+            "local:sentence-transformers/all-MiniLM-L6-v2": {"dimensions": 384, "max_tokens": 254, "max_request_tokens": 16384},
+            "local:sentence-transformers/all-mpnet-base-v2": {"dimensions": 768, "max_tokens": 382, "max_request_tokens": 16384},
+            "local:BAAI/bge-small-en-v1.5": {"dimensions": 384, "max_tokens": 510, "max_request_tokens": 16384},
+            "local:BAAI/bge-base-en-v1.5": {"dimensions": 768, "max_tokens": 510, "max_request_tokens": 16384}
         }
         
-        if model not in self.model_configs:
-            logger.warning(f"Unknown model {model}, using default config")
-            self.config = {"dimensions": 1536, "max_tokens": 8191}
+        if model in self.model_configs:
+            self.config = dict(self.model_configs[model])
+        elif self.local_backend is not None:
+            # Load the model once to read its shape
+            native_dimensions, max_seq_length = self.local_backend.describe()
+            self.config = {
+                "dimensions": native_dimensions,
+                "max_tokens": max_seq_length - 2,
+                "max_request_tokens": 16384
+            }
         else:
-            self.config = self.model_configs[model]
+            logger.warning(f"Unknown model {model}, using default config")
+            self.config = {"dimensions": 1536, "max_tokens": 8191, "max_request_tokens": 300000}
+        
+        if dimensions:
+            self.config["dimensions"] = dimensions
+        
+        self.max_batch_tokens = max_batch_tokens or self.config["max_request_tokens"]
+        
+        # Loaded when texts have to be packed or split; query embedding never
+        # needs it, and tiktoken downloads its encoding on first use
+        self._tokenizer = None
+        self._tokenizer_loaded = False
+    
+    @property
+    def tokenizer(self):
+        """Tokenizer of the model (None if unavailable), loaded on first use."""
+        if not self._tokenizer_loaded:
+            self._tokenizer = get_tokenizer(self.model)
+            self._tokenizer_loaded = True
+        return self._tokenizer
     
     async def generate_embedding(self, text: str) -> List[float]:
         """
@@ -81,25 +177,23 @@ class EmbeddingGenerator:
         Returns:
             Embedding vector
         """
-        # Truncate text if too long
-        if len(text) > self.config["max_tokens"] * 4:  # Rough token estimation
-            text = text[:self.config["max_tokens"] * 4]
+        # Truncate text if too long (embed_chunks splits long texts instead)
+        text = self._truncate_for_model(text) if text else text
         
         for attempt in range(self.max_retries):
             try:
-                response = await embedding_client.embeddings.create(
-                    model=self.model,
-                    input=text
-                )
+                async with self.rate_limiter.slot(self._estimate_tokens([text])):
+                    embeddings = await self._request([text])
                 
-                return response.data[0].embedding
+                return embeddings[0]
                 
             except RateLimitError as e:
                 if attempt == self.max_retries - 1:
                     raise
                 
-                # Exponential backoff for rate limits
-                delay = self.retry_delay * (2 ** attempt)
+                # Honor Retry-After, otherwise exponential backoff; pause all requests
+                delay = retry_after_seconds(e) or self.retry_delay * (2 ** attempt)
+                self.rate_limiter.pause(delay)
                 logger.warning(f"Rate limit hit, retrying in {delay}s")
                 await asyncio.sleep(delay)
                 
@@ -117,93 +211,251 @@ class EmbeddingGenerator:
     
     async def generate_embeddings_batch(
         self,
-        texts: List[str]
-    ) -> List[List[float]]:
+        texts: List[str],
+        token_count: Optional[int] = None
+    ) -> List[Optional[List[float]]]:
         """
         Generate embeddings for a batch of texts.
         
+        If the batch keeps failing, it is bisected to isolate the offending
+        inputs; healthy parts are still embedded.
+        
         Args:
             texts: List of texts to embed
+            token_count: Total input tokens if already known (skips recounting)
         
         Returns:
-            List of embedding vectors
+            List of embedding vectors, None for inputs that could not be embedded
         """
-        # Filter and truncate texts
+        # Filter and truncate texts; empty inputs are rejected by the API
         processed_texts = []
-        for text in texts:
+        valid_positions = []
+        for i, text in enumerate(texts):
             if not text or not text.strip():
-                processed_texts.append("")
                 continue
-                
-            # Truncate if too long
-            if len(text) > self.config["max_tokens"] * 4:
-                text = text[:self.config["max_tokens"] * 4]
             
-            processed_texts.append(text)
+            # Truncate if too long (embed_chunks splits long texts instead)
+            processed_texts.append(self._truncate_for_model(text))
+            valid_positions.append(i)
         
-        for attempt in range(self.max_retries):
+        results: List[Optional[List[float]]] = [None] * len(texts)
+        if not processed_texts:
+            return results
+        
+        estimated_tokens = token_count or self._estimate_tokens(processed_texts)
+        
+        try:
+            embeddings = await self._create_embeddings(
+                processed_texts, estimated_tokens, self.max_retries
+            )
+        except RateLimitError:
+            raise
+        except Exception as e:
+            logger.error(f"Batch of {len(processed_texts)} texts failed: {e}; bisecting to isolate failures")
+            embeddings = await self._bisect_failed_batch(processed_texts)
+        
+        for i, embedding in zip(valid_positions, embeddings):
+            results[i] = embedding
+        
+        return results
+    
+    async def _create_embeddings(
+        self,
+        texts: List[str],
+        token_count: int,
+        attempts: int
+    ) -> List[List[float]]:
+        """
+        Send one embeddings request.
+        
+        Rate limit errors are retried up to max_retries times, honoring
+        Retry-After; other errors are retried up to `attempts` times.
+        
+        Args:
+            texts: Non-empty texts to embed
+            token_count: Total input tokens, for rate limiting
+            attempts: Attempts allowed for non rate limit errors
+        
+        Returns:
+            List of embedding vectors
+        """
+        rate_limit_attempt = 0
+        attempt = 0
+        
+        while True:
             try:
-                response = await embedding_client.embeddings.create(
-                    model=self.model,
-                    input=processed_texts
-                )
-                
-                return [data.embedding for data in response.data]
+                async with self.rate_limiter.slot(token_count):
+                    return await self._request(texts)
                 
             except RateLimitError as e:
-                if attempt == self.max_retries - 1:
+                rate_limit_attempt += 1
+                if rate_limit_attempt >= self.max_retries:
                     raise
                 
-                delay = self.retry_delay * (2 ** attempt)
+                delay = retry_after_seconds(e) or self.retry_delay * (2 ** (rate_limit_attempt - 1))
+                self.rate_limiter.pause(delay)
                 logger.warning(f"Rate limit hit, retrying batch in {delay}s")
                 await asyncio.sleep(delay)
                 
-            except APIError as e:
-                logger.error(f"OpenAI API error in batch: {e}")
-                if attempt == self.max_retries - 1:
-                    # Fallback to individual processing
-                    return await self._process_individually(processed_texts)
-                await asyncio.sleep(self.retry_delay)
-                
             except Exception as e:
-                logger.error(f"Unexpected error in batch embedding: {e}")
-                if attempt == self.max_retries - 1:
-                    return await self._process_individually(processed_texts)
+                attempt += 1
+                if attempt >= attempts:
+                    raise
+                
+                logger.warning(f"Embedding request failed ({e}), retrying in {self.retry_delay}s")
                 await asyncio.sleep(self.retry_delay)
     
-    async def _process_individually(
-        self,
-        texts: List[str]
-    ) -> List[List[float]]:
+    async def _request(self, texts: List[str]) -> List[List[float]]:
         """
-        Process texts individually as fallback.
+        Embed texts with the configured backend, without retries.
         
         Args:
-            texts: List of texts to embed
+            texts: Non-empty texts to embed
         
         Returns:
             List of embedding vectors
         """
-        embeddings = []
+        if self.local_backend is not None:
+            return await self.local_backend.embed(texts)
         
-        for text in texts:
-            try:
-                if not text or not text.strip():
-                    embeddings.append([0.0] * self.config["dimensions"])
-                    continue
-                
-                embedding = await self.generate_embedding(text)
-                embeddings.append(embedding)
-                
-                # Small delay to avoid overwhelming the API
-                await asyncio.sleep(0.1)
-                
-            except Exception as e:
-                logger.error(f"Failed to embed text: {e}")
-                # Use zero vector as fallback
-                embeddings.append([0.0] * self.config["dimensions"])
+        global embedding_client
+        if embedding_client is None:
+            embedding_client = get_embedding_client()
         
-        return embeddings
+        kwargs = {"dimensions": self.dimensions} if self.dimensions else {}
+        response = await embedding_client.embeddings.create(
+            model=self.model,
+            input=texts,
+            **kwargs
+        )
+        return [data.embedding for data in response.data]
+    
+    def _count_tokens(self, text: str) -> int:
+        """Count input tokens of a text with the model's tokenizer."""
+        if self.tokenizer is None:
+            # Conservative estimate without a tokenizer: ~3 characters per token
+            return -(-len(text) // 3)
+        return len(self.tokenizer.encode(text, disallowed_special=()))
+    
+    def _estimate_tokens(self, texts: List[str]) -> int:
+        """Count input tokens of a request for tokens-per-minute budgeting."""
+        if not self._tokenizer_loaded:
+            # Do not load the tokenizer just for a budget estimate
+            return sum(-(-len(text) // 3) for text in texts)
+        return sum(self._count_tokens(text) for text in texts)
+    
+    def _truncate_for_model(self, text: str) -> str:
+        """Cut a text to the model's per-input token limit."""
+        # Every token covers at least one byte, so short texts (queries) fit
+        # without loading the tokenizer
+        if len(text.encode("utf-8")) <= self.config["max_tokens"]:
+            return text
+        return self._split_for_model(text)[0][0]
+    
+    def _split_for_model(self, text: str) -> List[Tuple[str, int]]:
+        """
+        Split a text into pieces that fit the model's per-input token limit.
+        
+        Args:
+            text: Text to split
+        
+        Returns:
+            List of (piece, token_count); a single piece if the text fits
+        """
+        max_tokens = self.config["max_tokens"]
+        
+        if self.tokenizer is None:
+            # Without a tokenizer split by characters using the same estimate
+            max_chars = max_tokens * 3
+            pieces = [text[i:i + max_chars] for i in range(0, max(len(text), 1), max_chars)]
+            return [(piece, self._count_tokens(piece)) for piece in pieces]
+        
+        tokens = self.tokenizer.encode(text, disallowed_special=())
+        if len(tokens) <= max_tokens:
+            return [(text, len(tokens))]
+        
+        return [
+            (self.tokenizer.decode(tokens[i:i + max_tokens]), len(tokens[i:i + max_tokens]))
+            for i in range(0, len(tokens), max_tokens)
+        ]
+    
+    def _pack_batches(self, token_counts: List[int]) -> List[List[int]]:
+        """
+        Group inputs into requests by token budget.
+        
+        Inputs are packed in order until adding the next one would exceed
+        max_batch_tokens or batch_size inputs.
+        
+        Args:
+            token_counts: Token count of each input
+        
+        Returns:
+            Batches as lists of input positions
+        """
+        batches: List[List[int]] = []
+        current: List[int] = []
+        current_tokens = 0
+        
+        for i, tokens in enumerate(token_counts):
+            if current and (
+                current_tokens + tokens > self.max_batch_tokens
+                or len(current) >= self.batch_size
+            ):
+                batches.append(current)
+                current, current_tokens = [], 0
+            
+            current.append(i)
+            current_tokens += tokens
+        
+        if current:
+            batches.append(current)
+        
+        return batches
+    
+    def _combine_segments(self, embeddings: List[List[float]], weights: List[int]) -> List[float]:
+        """Combine embeddings of a split text: token-weighted mean, re-normalized."""
+        combined = np.average(np.asarray(embeddings, dtype=np.float32), axis=0, weights=weights)
+        norm = np.linalg.norm(combined)
+        if norm > 0:
+            combined = combined / norm
+        return combined.tolist()
+    
+    async def _bisect_failed_batch(
+        self,
+        texts: List[str]
+    ) -> List[Optional[List[float]]]:
+        """
+        Recover a failed batch by bisection.
+        
+        The batch is split in half and both halves are embedded concurrently;
+        halves that fail again are split further until the failing inputs are
+        isolated. Healthy inputs cost about log2(n) extra requests instead of
+        one request per text.
+        
+        Args:
+            texts: Texts of a batch that already failed
+        
+        Returns:
+            List of embedding vectors, None for inputs that failed on their own
+        """
+        if len(texts) == 1:
+            logger.error(f"Failed to embed text ({len(texts[0])} chars), marking for retry")
+            return [None]
+        
+        middle = len(texts) // 2
+        halves = await asyncio.gather(
+            self._embed_or_bisect(texts[:middle]),
+            self._embed_or_bisect(texts[middle:])
+        )
+        return halves[0] + halves[1]
+    
+    async def _embed_or_bisect(self, texts: List[str]) -> List[Optional[List[float]]]:
+        """Embed part of a failed batch, bisecting again if it fails."""
+        try:
+            return await self._create_embeddings(texts, self._estimate_tokens(texts), attempts=1)
+        except Exception as e:
+            logger.warning(f"Sub-batch of {len(texts)} texts failed: {e}")
+            return await self._bisect_failed_batch(texts)
     
     async def embed_chunks(
         self,
@@ -218,66 +470,124 @@ class EmbeddingGenerator:
             progress_callback: Optional callback for progress updates
         
         Returns:
-            Chunks with embeddings added
+            The same chunks, with embeddings and embedding metadata set
         """
         if not chunks:
             return chunks
         
         logger.info(f"Generating embeddings for {len(chunks)} chunks")
         
-        # Process chunks in batches
-        embedded_chunks = []
-        total_batches = (len(chunks) + self.batch_size - 1) // self.batch_size
+        texts = [chunk.content for chunk in chunks]
+        embeddings: List[Optional[List[float]]] = [None] * len(chunks)
+        errors: Dict[int, str] = {}
+        
+        # Reuse embeddings stored by earlier runs before calling the API
+        if self.persistent_cache is not None:
+            embeddings = await asyncio.to_thread(self.persistent_cache.get_many, self.cache_model, texts)
+            cached_count = sum(1 for embedding in embeddings if embedding is not None)
+            if cached_count:
+                logger.info(f"Embedding cache hit for {cached_count}/{len(chunks)} chunks")
+        
+        # Split over-length chunks into pieces that fit the model's input limit
+        # (instead of truncating them), then pack pieces into requests by tokens
+        pending = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        segments: List[Tuple[int, str, int]] = []  # (chunk position, text, tokens)
+        for j in pending:
+            if not texts[j].strip():
+                errors[j] = "Empty chunk"
+                continue
+            for piece, tokens in self._split_for_model(texts[j]):
+                segments.append((j, piece, tokens))
+        
+        batches = self._pack_batches([tokens for _, _, tokens in segments])
+        segment_embeddings: List[Optional[List[float]]] = [None] * len(segments)
+        total_batches = len(batches)
+        completed_batches = 0
         
-        for i in range(0, len(chunks), self.batch_size):
-            batch_chunks = chunks[i:i + self.batch_size]
-            batch_texts = [chunk.content for chunk in batch_chunks]
+        # Batches run concurrently; the rate limiter keeps them within the
+        # account's request/token budgets
+        async def process_batch(batch_number: int, segment_ids: List[int]):
+            nonlocal completed_batches
+            batch_texts = [segments[k][1] for k in segment_ids]
+            batch_tokens = sum(segments[k][2] for k in segment_ids)
             
             try:
                 # Generate embeddings for this batch
-                embeddings = await self.generate_embeddings_batch(batch_texts)
+                batch_embeddings = await self.generate_embeddings_batch(batch_texts, batch_tokens)
                 
-                # Add embeddings to chunks
-                for chunk, embedding in zip(batch_chunks, embeddings):
-                    # Create a new chunk with embedding
-                    embedded_chunk = DocumentChunk(
-                        content=chunk.content,
-                        index=chunk.index,
-                        start_char=chunk.start_char,
-                        end_char=chunk.end_char,
-                        metadata={
-                            **chunk.metadata,
-                            "embedding_model": self.model,
-                            "embedding_generated_at": datetime.now().isoformat()
-                        },
-                        token_count=chunk.token_count
-                    )
-                    
-                    # Add embedding as a separate attribute
-                    embedded_chunk.embedding = embedding
-                    embedded_chunks.append(embedded_chunk)
+                for k, embedding in zip(segment_ids, batch_embeddings):
+                    segment_embeddings[k] = embedding
+                    if embedding is None:
+                        errors[segments[k][0]] = "Embedding request failed for this chunk"
                 
                 # Progress update
-                current_batch = (i // self.batch_size) + 1
+                completed_batches += 1
                 if progress_callback:
-                    progress_callback(current_batch, total_batches)
+                    progress_callback(completed_batches, total_batches)
                 
-                logger.info(f"Processed batch {current_batch}/{total_batches}")
+                logger.info(
+                    f"Processed batch {batch_number} ({len(segment_ids)} inputs, {batch_tokens} tokens; "
+                    f"{completed_batches}/{total_batches} done)"
+                )
                 
             except Exception as e:
-                logger.error(f"Failed to process batch {i//self.batch_size + 1}: {e}")
+                logger.error(f"Failed to process batch {batch_number}: {e}")
                 
-                # Add chunks without embeddings as fallback
-                for chunk in batch_chunks:
-                    chunk.metadata.update({
-                        "embedding_error": str(e),
-                        "embedding_generated_at": datetime.now().isoformat()
-                    })
-                    chunk.embedding = [0.0] * self.config["dimensions"]
-                    embedded_chunks.append(chunk)
-        
-        logger.info(f"Generated embeddings for {len(embedded_chunks)} chunks")
-        return embedded_chunks
+                for k in segment_ids:
+                    errors[segments[k][0]] = str(e)
+        
+        await asyncio.gather(*(
+            process_batch(number, segment_ids)
+            for number, segment_ids in enumerate(batches, 1)
+        ))
+        
+        # Reassemble chunk embeddings from their pieces
+        chunk_segments: Dict[int, List[int]] = {}
+        for k, (j, _, _) in enumerate(segments):
+            chunk_segments.setdefault(j, []).append(k)
+        
+        for j, segment_ids in chunk_segments.items():
+            if j in errors:
+                continue
+            elif len(segment_ids) == 1:
+                embeddings[j] = segment_embeddings[segment_ids[0]]
+            else:
+                chunks[j].metadata["embedding_segments"] = len(segment_ids)
+                embeddings[j] = self._combine_segments(
+                    [segment_embeddings[k] for k in segment_ids],
+                    [segments[k][2] for k in segment_ids]
+                )
+        
+        if self.persistent_cache is not None:
+            # Failed chunks have no embedding, so only successes are stored
+            await asyncio.to_thread(self.persistent_cache.put_many, self.cache_model, [
+                (texts[j], embeddings[j]) for j in chunk_segments if j not in errors
+            ])
+        
+        if errors:
+            logger.warning(f"{len(errors)}/{len(chunks)} chunks could not be embedded and are marked for retry")
+        
+        # Attach embeddings in place; copying every chunk would double the
+        # memory held by the ingestion pipeline
+        generated_at = datetime.now().isoformat()
+        for j, (chunk, embedding) in enumerate(zip(chunks, embeddings)):
+            if j in errors:
+                # Keep the chunk without an embedding (stored as NULL, excluded
+                # from search) rather than a zero vector, and flag it for retry
+                chunk.metadata.update({
+                    "embedding_error": errors[j],
+                    "embedding_status": "failed",
+                    "embedding_generated_at": generated_at
+                })
+                chunk.embedding = None
+                continue
+            
+            chunk.metadata["embedding_model"] = self.model
+            chunk.metadata["embedding_generated_at"] = generated_at
+            chunk.embedding = embedding
+        
+        logger.info(f"Generated embeddings for {len(chunks) - len(errors)} chunks")
+        return chunks
     
     async def embed_query(self, query: str) -> List[float]:
         """
@@ -298,45 +608,260 @@ class EmbeddingGenerator:
 
 # Cache for embeddings
 class EmbeddingCache:
-    """Simple in-memory cache for embeddings."""
+    """
+    In-memory LRU cache for embeddings.
+
+    Entries live in an OrderedDict, so lookups, recency updates and evictions
+    are all O(1). Embeddings are stored as float32 arrays under 16-byte BLAKE2
+    digests of the text. The cache is bounded by entry count and, optionally,
+    by the total bytes of stored vectors.
+    """
     
-    def __init__(self, max_size: int = 1000):
-        """Initialize cache."""
-        self.cache: Dict[str, List[float]] = {}
-        self.access_times: Dict[str, datetime] = {}
+    def __init__(self, max_size: int = 1000, max_bytes: Optional[int] = None):
+        """
+        Initialize cache.
+        
+        Args:
+            max_size: Maximum number of entries
+            max_bytes: Optional limit on the total size of stored vectors
+        """
+        self.cache: "OrderedDict[bytes, np.ndarray]" = OrderedDict()
         self.max_size = max_size
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
     
-    def get(self, text: str) -> Optional[List[float]]:
+    def get(self, text: str) -> Optional[np.ndarray]:
         """Get embedding from cache."""
         text_hash = self._hash_text(text)
-        if text_hash in self.cache:
-            self.access_times[text_hash] = datetime.now()
-            return self.cache[text_hash]
-        return None
+        embedding = self.cache.get(text_hash)
+        if embedding is None:
+            self.misses += 1
+            return None
+        
+        self.hits += 1
+        self.cache.move_to_end(text_hash)
+        return embedding
     
     def put(self, text: str, embedding: List[float]):
         """Store embedding in cache."""
         text_hash = self._hash_text(text)
+        vector = np.asarray(embedding, dtype=np.float32)
+        
+        previous = self.cache.pop(text_hash, None)
+        if previous is not None:
+            self.current_bytes -= previous.nbytes
         
-        # Evict oldest entries if cache is full
-        if len(self.cache) >= self.max_size:
-            oldest_key = min(self.access_times.keys(), key=lambda k: self.access_times[k])
-            del self.cache[oldest_key]
-            del self.access_times[oldest_key]
+        self.cache[text_hash] = vector
+        self.current_bytes += vector.nbytes
         
-        self.cache[text_hash] = embedding
-        self.access_times[text_hash] = datetime.now()
+        # Evict least recently used entries until within bounds
+        while len(self.cache) > self.max_size or (
+            self.max_bytes is not None
+            and self.current_bytes > self.max_bytes
+            and len(self.cache) > 1
+        ):
+            _, evicted = self.cache.popitem(last=False)
+            self.current_bytes -= evicted.nbytes
+            self.evictions += 1
     
-    def _hash_text(self, text: str) -> str:
+    def __contains__(self, text: str) -> bool:
+        """Check for an entry without counting a hit or updating its recency."""
+        return self._hash_text(text) in self.cache
+    
+    def _hash_text(self, text: str) -> bytes:
         """Generate hash for text."""
-        import hashlib
-        return hashlib.md5(text.encode()).hexdigest()
+        return hashlib.blake2b(text.encode(), digest_size=16).digest()
+    
+    def stats(self) -> Dict[str, int]:
+        """Get cache statistics."""
+        return {
+            "size": len(self.cache),
+            "max_size": self.max_size,
+            "bytes": self.current_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions
+        }
+
+
+class QueryEmbedder:
+    """
+    Process-wide query embedding service.
+
+    Holds one EmbeddingGenerator (and therefore one warm HTTP client) plus an
+    LRU cache keyed by the normalized query, so repeated agent tool calls skip
+    the network. Concurrent requests for the same query share one API call.
+    """
+    
+    def __init__(
+        self,
+        generator: Optional[EmbeddingGenerator] = None,
+        cache_size: int = 1000
+    ):
+        """
+        Initialize query embedder.
+        
+        Args:
+            generator: Embedding generator to use (default: new EmbeddingGenerator)
+            cache_size: Maximum number of cached query embeddings
+        """
+        self.generator = generator or EmbeddingGenerator()
+        self.cache = EmbeddingCache(max_size=cache_size)
+        self._pending: Dict[str, asyncio.Future] = {}
+    
+    async def embed(self, query: str) -> np.ndarray:
+        """
+        Embed a search query, using the cache when possible.
+        
+        Args:
+            query: Search query
+        
+        Returns:
+            Query embedding as a float32 array
+        """
+        # Whitespace and case differences should not cost an API call
+        text = " ".join(query.split())
+        key = text.lower()
+        
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+        
+        pending = self._pending.get(key)
+        if pending is not None:
+            return await self._wait_for(pending, text)
+        
+        future = asyncio.get_running_loop().create_future()
+        self._pending[key] = future
+        try:
+            embedding = np.asarray(
+                await self.generator.generate_embedding(text), dtype=np.float32
+            )
+            self.cache.put(key, embedding)
+            future.set_result(embedding)
+            return embedding
+        except Exception as e:
+            future.set_exception(e)
+            # Mark retrieved so an unawaited failure is not logged as never retrieved
+            future.exception()
+            raise
+        finally:
+            # Cancelled while embedding: release the callers waiting on this request
+            if not future.done():
+                future.cancel()
+            del self._pending[key]
+    
+    async def _wait_for(self, pending: asyncio.Future, text: str) -> np.ndarray:
+        """
+        Wait for another caller's request for the same query.
+        
+        Args:
+            pending: Future of the request in flight
+            text: Normalized query, embedded again if that caller was cancelled
+        
+        Returns:
+            Query embedding as a float32 array
+        """
+        # Unlike awaiting the future, wait() does not raise if the owner is cancelled
+        await asyncio.wait([pending])
+        if pending.cancelled():
+            return await self.embed(text)
+        return pending.result()
+    
+    async def embed_many(self, queries: List[str]) -> List[np.ndarray]:
+        """
+        Embed several search queries with at most one API request.
+        
+        Cached queries are served from the cache, queries already being
+        embedded are awaited, and the rest are sent as one batch.
+        
+        Args:
+            queries: Search queries
+        
+        Returns:
+            Query embeddings as float32 arrays, in query order
+        """
+        texts = [" ".join(query.split()) for query in queries]
+        keys = [text.lower() for text in texts]
+        
+        embeddings: Dict[str, np.ndarray] = {}
+        waiting: Dict[str, Tuple[asyncio.Future, str]] = {}
+        missing: Dict[str, str] = {}
+        for key, text in zip(keys, texts):
+            if key in embeddings or key in waiting or key in missing:
+                continue
+            cached = self.cache.get(key)
+            if cached is not None:
+                embeddings[key] = cached
+            elif key in self._pending:
+                waiting[key] = (self._pending[key], text)
+            else:
+                missing[key] = text
+        
+        if missing:
+            loop = asyncio.get_running_loop()
+            futures = {key: loop.create_future() for key in missing}
+            self._pending.update(futures)
+            try:
+                results = await self.generator.generate_embeddings_batch(list(missing.values()))
+                for (key, text), embedding in zip(missing.items(), results):
+                    if embedding is None:
+                        futures[key].set_exception(ValueError(f"Could not embed query: {text!r}"))
+                        futures[key].exception()
+                        continue
+                    embedding = np.asarray(embedding, dtype=np.float32)
+                    self.cache.put(key, embedding)
+                    futures[key].set_result(embedding)
+            except Exception as e:
+                for future in futures.values():
+                    if not future.done():
+                        future.set_exception(e)
+                        future.exception()
+                raise
+            finally:
+                for key, future in futures.items():
+                    # Cancelled while embedding: release the callers waiting on this request
+                    if not future.done():
+                        future.cancel()
+                    del self._pending[key]
+            for key, future in futures.items():
+                embeddings[key] = future.result()
+        
+        for key, (future, text) in waiting.items():
+            embeddings[key] = await self._wait_for(future, text)
+        
+        return [embeddings[key] for key in keys]
+    
+    def stats(self) -> Dict[str, int]:
+        """Get query cache statistics."""
+        return self.cache.stats()
+
+
+_query_embedder: Optional[QueryEmbedder] = None
+
+
+def get_query_embedder() -> QueryEmbedder:
+    """
+    Get the process-wide query embedder, creating it on first use.
+    
+    Returns:
+        Shared QueryEmbedder instance
+    """
+    global _query_embedder
+    if _query_embedder is None:
+        _query_embedder = QueryEmbedder()
+    return _query_embedder
 
 
 # Factory function
 def create_embedder(
     model: str = EMBEDDING_MODEL,
     use_cache: bool = True,
+    use_persistent_cache: bool = False,
+    cache_path: Optional[str] = None,
     **kwargs
 ) -> EmbeddingGenerator:
     """
@@ -345,11 +870,16 @@ def create_embedder(
     Args:
         model: Embedding model to use
         use_cache: Whether to use caching
+        use_persistent_cache: Whether embed_chunks should use the on-disk cache
+        cache_path: On-disk cache location (default: EMBEDDING_CACHE_PATH env var)
         **kwargs: Additional arguments for EmbeddingGenerator
     
     Returns:
         EmbeddingGenerator instance
     """
+    if use_persistent_cache:
+        kwargs["persistent_cache"] = PersistentEmbeddingCache(cache_path)
+    
     embedder = EmbeddingGenerator(model=model, **kwargs)
     
     if use_cache:
@@ -360,7 +890,8 @@ def create_embedder(
         async def cached_generate(text: str) -> List[float]:
             cached = cache.get(text)
             if cached is not None:
-                return cached
+                # The cache holds float32 arrays; return a list like a miss does
+                return cached.tolist()
             
             embedding = await original_generate(text)
             cache.put(text, embedding)
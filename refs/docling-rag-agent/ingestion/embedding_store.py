@@ -0,0 +1,126 @@
+"""
+Persistent on-disk embedding cache.
+
+Embeddings are stored in SQLite keyed by (embedding model, SHA-256 of the text)
+as compact float32 blobs, so re-ingesting unchanged chunks or overlapping
+documents costs no embedding API calls, across process restarts.
+
+Lookups and writes are blocking, so async callers run them in a thread;
+the connection is shared between threads behind a lock.
+"""
+
+import os
+import hashlib
+import logging
+import sqlite3
+import threading
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_PATH = ".cache/embeddings.sqlite3"
+
+# Stay well below SQLite's bound-parameter limit
+_LOOKUP_BATCH_SIZE = 500
+
+
+class PersistentEmbeddingCache:
+    """SQLite-backed embedding cache keyed by model and content hash."""
+
+    def __init__(self, path: Optional[str] = None):
+        """
+        Open (or create) the cache database.
+
+        Args:
+            path: SQLite file path (default: EMBEDDING_CACHE_PATH env var or
+                .cache/embeddings.sqlite3)
+        """
+        self.path = path or os.getenv("EMBEDDING_CACHE_PATH", DEFAULT_CACHE_PATH)
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        # Calls come from worker threads (asyncio.to_thread), one at a time
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._lock = threading.Lock()
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS embeddings (
+                model TEXT NOT NULL,
+                text_hash TEXT NOT NULL,
+                dimensions INTEGER NOT NULL,
+                embedding BLOB NOT NULL,
+                PRIMARY KEY (model, text_hash)
+            ) WITHOUT ROWID
+            """
+        )
+        self.conn.commit()
+
+        logger.info(f"Persistent embedding cache: {self.path}")
+
+    @staticmethod
+    def hash_text(text: str) -> str:
+        """Generate the cache key for a text."""
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def get_many(self, model: str, texts: Sequence[str]) -> List[Optional[List[float]]]:
+        """
+        Look up embeddings for several texts.
+
+        Args:
+            model: Embedding model name
+            texts: Texts to look up
+
+        Returns:
+            Embeddings in input order, None for cache misses
+        """
+        hashes = [self.hash_text(text) for text in texts]
+        found = {}
+
+        unique_hashes = list(dict.fromkeys(hashes))
+        with self._lock:
+            for i in range(0, len(unique_hashes), _LOOKUP_BATCH_SIZE):
+                batch = unique_hashes[i:i + _LOOKUP_BATCH_SIZE]
+                placeholders = ",".join("?" * len(batch))
+                rows = self.conn.execute(
+                    f"SELECT text_hash, embedding FROM embeddings "
+                    f"WHERE model = ? AND text_hash IN ({placeholders})",
+                    [model, *batch]
+                )
+                for text_hash, blob in rows:
+                    found[text_hash] = np.frombuffer(blob, dtype="<f4").tolist()
+
+        return [found.get(text_hash) for text_hash in hashes]
+
+    def put_many(self, model: str, items: Sequence[Tuple[str, Sequence[float]]]) -> None:
+        """
+        Store embeddings for several texts.
+
+        Args:
+            model: Embedding model name
+            items: (text, embedding) pairs
+        """
+        if not items:
+            return
+
+        rows = []
+        for text, embedding in items:
+            vector = np.asarray(embedding, dtype="<f4")
+            rows.append((model, self.hash_text(text), vector.shape[0], vector.tobytes()))
+
+        with self._lock, self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, text_hash, dimensions, embedding) "
+                "VALUES (?, ?, ?, ?)",
+                rows
+            )
+
+    def close(self) -> None:
+        """Close the cache database."""
+        with self._lock:
+            self.conn.close()
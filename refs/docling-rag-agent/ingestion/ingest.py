@@ -11,17 +11,28 @@ from pathlib import Path
 from typing import List, Dict, Any, Optional
 from datetime import datetime
 import argparse
+from dataclasses import dataclass, field
 
 import asyncpg
 from dotenv import load_dotenv
 
 from .chunker import ChunkingConfig, create_chunker, DocumentChunk
 from .embedder import create_embedder
+from .dedup import ChunkDeduplicator
+from .near_duplicates import NearDuplicateIndex
+from .converter import (
+    AudioTranscriptionWorker,
+    ConversionCache,
+    DoclingConversionPool,
+    DOCLING_FORMATS,
+    hash_file
+)
 
 # Import utilities
 try:
     from ..utils.db_utils import initialize_database, close_database, db_pool
     from ..utils.models import IngestionConfig, IngestionResult
+    from ..utils.vector_index import tune_vector_index
 except ImportError:
     # For direct execution or testing
     import sys
@@ -29,6 +40,7 @@ except ImportError:
     sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
     from utils.db_utils import initialize_database, close_database, db_pool
     from utils.models import IngestionConfig, IngestionResult
+    from utils.vector_index import tune_vector_index
 
 # Load environment variables
 load_dotenv()
@@ -36,6 +48,28 @@ load_dotenv()
 logger = logging.getLogger(__name__)
 
 
+@dataclass
+class PendingDocument:
+    """A document moving through the ingestion stages."""
+    position: int  # Index in the discovered file list, for ordered results
+    file_path: str
+    source: str
+    existing: Optional[Dict[str, Any]] = None  # Stored state from a previous run
+    title: str = ""
+    content: str = ""
+    docling_doc: Optional[Any] = None
+    metadata: Dict[str, Any] = field(default_factory=dict)
+    chunks: List[DocumentChunk] = field(default_factory=list)
+    pending_chunks: int = 0  # Chunks not yet back from the embedder
+    duplicate_chunks: int = 0  # Chunks that reuse the embedding of an identical chunk
+    signature: Optional[bytes] = None  # MinHash signature, stored for near-duplicate detection
+    started_at: datetime = field(default_factory=datetime.now)
+
+    def elapsed_ms(self) -> float:
+        """Milliseconds since the document entered the pipeline."""
+        return (datetime.now() - self.started_at).total_seconds() * 1000
+
+
 class DocumentIngestionPipeline:
     """Pipeline for ingesting documents into vector DB and knowledge graph."""
     
@@ -43,7 +77,17 @@ class DocumentIngestionPipeline:
         self,
         config: IngestionConfig,
         documents_folder: str = "documents",
-        clean_before_ingest: bool = True
+        clean_before_ingest: bool = True,
+        incremental: bool = False,
+        concurrency: int = 1,
+        conversion_workers: Optional[int] = None,
+        use_embedding_cache: bool = True,
+        chunk_queue_size: int = 1024,
+        use_conversion_cache: bool = True,
+        deduplicate_chunks: bool = True,
+        near_duplicates: Optional[str] = None,
+        near_duplicate_threshold: float = 0.8,
+        tune_index: bool = True
     ):
         """
         Initialize ingestion pipeline.
@@ -52,10 +96,29 @@ class DocumentIngestionPipeline:
             config: Ingestion configuration
             documents_folder: Folder containing markdown documents
             clean_before_ingest: Whether to clean existing data before ingestion (default: True)
+            incremental: Only re-process new or modified files and remove deleted ones
+                (implies clean_before_ingest=False)
+            concurrency: Maximum number of documents processed at the same time (default: 1)
+            conversion_workers: Docling worker processes (default: min(concurrency, CPU count))
+            use_embedding_cache: Reuse chunk embeddings from the on-disk cache (default: True)
+            chunk_queue_size: Chunks buffered between chunking and embedding (default: 1024)
+            use_conversion_cache: Reuse Docling conversions of unchanged files (default: True)
+            deduplicate_chunks: Embed identical chunk texts once and share the vector (default: True)
+            near_duplicates: Near-duplicate document handling: None (off), "flag" (store
+                and mark in metadata) or "skip" (do not chunk, embed or store)
+            near_duplicate_threshold: Minimum estimated Jaccard similarity of near-duplicates
+            tune_index: Rebuild the vector index after ingestion if it no longer fits
+                the chunk count (default: True)
         """
+        if near_duplicates not in (None, "flag", "skip"):
+            raise ValueError(f"near_duplicates must be None, 'flag' or 'skip', got {near_duplicates!r}")
+
         self.config = config
         self.documents_folder = documents_folder
-        self.clean_before_ingest = clean_before_ingest
+        self.incremental = incremental
+        self.clean_before_ingest = clean_before_ingest and not incremental
+        self.concurrency = max(1, concurrency)
+        self.chunk_queue_size = max(1, chunk_queue_size)
         
         # Initialize components
         self.chunker_config = ChunkingConfig(
@@ -66,7 +129,19 @@ class DocumentIngestionPipeline:
         )
         
         self.chunker = create_chunker(self.chunker_config)
-        self.embedder = create_embedder()
+        self.embedder = create_embedder(use_persistent_cache=use_embedding_cache)
+        conversion_cache = ConversionCache() if use_conversion_cache else None
+        self.conversion_pool = DoclingConversionPool(
+            max_workers=conversion_workers or min(self.concurrency, os.cpu_count() or 1),
+            cache=conversion_cache
+        )
+        self.transcriber = AudioTranscriptionWorker(cache=conversion_cache)
+        self.deduplicator = ChunkDeduplicator() if deduplicate_chunks else None
+        self.near_duplicates = near_duplicates
+        self.tune_index = tune_index
+        self.near_duplicate_index = (
+            NearDuplicateIndex(threshold=near_duplicate_threshold) if near_duplicates else None
+        )
         
         self._initialized = False
     
@@ -79,12 +154,37 @@ class DocumentIngestionPipeline:
         
         # Initialize database connections
         await initialize_database()
+        await self._check_embedding_dimensions()
         
         self._initialized = True
         logger.info("Ingestion pipeline initialized")
     
+    async def _check_embedding_dimensions(self):
+        """Fail early if the schema's vector size does not match the embedding model."""
+        async with db_pool.acquire() as conn:
+            # pgvector stores the declared dimensions as the column's type modifier
+            column_dimensions = await conn.fetchval(
+                """
+                SELECT atttypmod FROM pg_attribute
+                WHERE attrelid = 'chunks'::regclass AND attname = 'embedding'
+                """
+            )
+        
+        model_dimensions = self.embedder.get_embedding_dimension()
+        if column_dimensions and column_dimensions > 0 and column_dimensions != model_dimensions:
+            raise ValueError(
+                f"chunks.embedding is vector({column_dimensions}) but {self.embedder.model} "
+                f"produces {model_dimensions}-dimensional embeddings. Recreate the schema with "
+                f"matching dimensions, e.g.: sed 's/vector(1536)/vector({model_dimensions})/g' "
+                f"sql/schema.sql | psql \"$DATABASE_URL\""
+            )
+    
     async def close(self):
         """Close database connections."""
+        self.conversion_pool.shutdown()
+        self.transcriber.shutdown()
+        if self.embedder.local_backend is not None:
+            self.embedder.local_backend.shutdown()
         if self._initialized:
             await close_database()
             self._initialized = False
@@ -96,6 +196,12 @@ class DocumentIngestionPipeline:
         """
         Ingest all documents from the documents folder.
         
+        Documents stream through bounded queues between the stages
+        discover -> convert -> chunk -> embed -> write. Chunks of many documents
+        are embedded together, so embedding batches fill across document
+        boundaries, and peak memory depends on the queue sizes rather than on
+        the size of the corpus.
+        
         Args:
             progress_callback: Optional callback for progress updates
         
@@ -112,122 +218,404 @@ class DocumentIngestionPipeline:
         # Find all supported document files
         document_files = self._find_document_files()
 
+        # In incremental mode, load what is already stored and drop removed files
+        existing_sources: Dict[str, Dict[str, Any]] = {}
+        removed_ids: List[str] = []
+        if self.incremental:
+            existing_sources = await self._load_existing_sources()
+            current_sources = {
+                os.path.relpath(file_path, self.documents_folder) for file_path in document_files
+            }
+            removed_ids = [
+                document_id
+                for source, state in existing_sources.items()
+                if source not in current_sources
+                for document_id in state["ids"]
+            ]
+            if removed_ids:
+                await self._delete_documents(removed_ids)
+                logger.info(f"Removed {len(removed_ids)} documents whose source files no longer exist")
+
+        if self.near_duplicate_index is not None:
+            self.near_duplicate_index.load(await self._load_signatures())
+
         if not document_files:
             logger.warning(f"No supported document files found in {self.documents_folder}")
             return []
 
-        logger.info(f"Found {len(document_files)} document files to process")
+        logger.info(
+            f"Found {len(document_files)} document files to process "
+            f"(concurrency={self.concurrency})"
+        )
 
-        results = []
+        total = len(document_files)
+        results: List[Optional[IngestionResult]] = [None] * total
+        completed = 0
 
-        for i, file_path in enumerate(document_files):
-            try:
-                logger.info(f"Processing file {i+1}/{len(document_files)}: {file_path}")
+        def finish(document: PendingDocument, result: IngestionResult):
+            nonlocal completed
+            results[document.position] = result
+            completed += 1
+            if progress_callback:
+                progress_callback(completed, total)
+
+        def fail(document: PendingDocument, error: Exception):
+            logger.error(f"Failed to process {document.file_path}: {error}")
+            finish(document, IngestionResult(
+                document_id="",
+                title=document.title or os.path.basename(document.file_path),
+                chunks_created=0,
+                entities_extracted=0,
+                relationships_created=0,
+                processing_time_ms=0,
+                errors=[str(error)]
+            ))
 
-                result = await self._ingest_single_document(file_path)
-                results.append(result)
+        # Bounded queues between stages provide backpressure: a slow stage
+        # stalls the ones before it instead of letting work pile up in memory
+        convert_queue: asyncio.Queue = asyncio.Queue(maxsize=self.concurrency)
+        chunk_queue: asyncio.Queue = asyncio.Queue(maxsize=self.concurrency)
+        embed_queue: asyncio.Queue = asyncio.Queue(maxsize=self.chunk_queue_size)
+        write_queue: asyncio.Queue = asyncio.Queue(maxsize=self.concurrency)
 
-                if progress_callback:
-                    progress_callback(i + 1, len(document_files))
-                
-            except Exception as e:
-                logger.error(f"Failed to process {file_path}: {e}")
-                results.append(IngestionResult(
-                    document_id="",
-                    title=os.path.basename(file_path),
-                    chunks_created=0,
-                    entities_extracted=0,
-                    relationships_created=0,
-                    processing_time_ms=0,
-                    errors=[str(e)]
+        async def discover():
+            for i, file_path in enumerate(document_files):
+                source = os.path.relpath(file_path, self.documents_folder)
+                await convert_queue.put(PendingDocument(
+                    position=i,
+                    file_path=file_path,
+                    source=source,
+                    existing=existing_sources.get(source)
                 ))
+
+        async def convert_worker():
+            while True:
+                document = await convert_queue.get()
+                if document is None:
+                    break
+
+                document.started_at = datetime.now()
+                logger.info(f"Processing file {document.position + 1}/{total}: {document.file_path}")
+                try:
+                    if not await self._convert_document(document):
+                        finish(document, self._skipped_result(document))
+                        continue
+
+                    match = await self._check_near_duplicate(document)
+                    if match and self.near_duplicates == "skip":
+                        logger.info(
+                            f"Skipping {document.source}: near-duplicate of {match[0]} "
+                            f"(similarity {match[1]:.2f})"
+                        )
+                        if document.existing:
+                            # The previous version of this file is superseded too
+                            await self._delete_documents(document.existing["ids"])
+                        finish(document, IngestionResult(
+                            document_id="",
+                            title=document.title,
+                            chunks_created=0,
+                            processing_time_ms=document.elapsed_ms(),
+                            near_duplicate_of=match[0]
+                        ))
+                        continue
+
+                    await chunk_queue.put(document)
+                except Exception as e:
+                    fail(document, e)
+
+        async def chunk_worker():
+            while True:
+                document = await chunk_queue.get()
+                if document is None:
+                    break
+
+                try:
+                    chunks = await self._chunk_document(document)
+                except Exception as e:
+                    fail(document, e)
+                    continue
+
+                if not chunks:
+                    logger.warning(f"No chunks created for {document.title}")
+                    finish(document, IngestionResult(
+                        document_id="",
+                        title=document.title,
+                        chunks_created=0,
+                        entities_extracted=0,
+                        relationships_created=0,
+                        processing_time_ms=document.elapsed_ms(),
+                        errors=["No chunks created"]
+                    ))
+                    continue
+
+                logger.info(f"Created {len(chunks)} chunks for {document.title}")
+                document.chunks = chunks
+                document.pending_chunks = len(chunks)
+                for chunk in chunks:
+                    # Dedup stage: only the first copy of a text goes to the embedder
+                    route = self.deduplicator.route((document, chunk)) if self.deduplicator else ChunkDeduplicator.EMBED
+                    if route == ChunkDeduplicator.EMBED:
+                        await embed_queue.put((document, chunk))
+                        continue
+
+                    document.duplicate_chunks += 1
+                    if route == ChunkDeduplicator.SHARED:
+                        await chunk_embedded(document)
+
+        async def chunk_embedded(document: PendingDocument):
+            document.pending_chunks -= 1
+            if document.pending_chunks == 0:
+                await write_queue.put(document)
+
+        async def embed_batch(batch: List[tuple]):
+            chunks = [chunk for _, chunk in batch]
+            try:
+                await self.embedder.embed_chunks(chunks)
+            except Exception as e:
+                logger.error(f"Failed to embed {len(chunks)} chunks: {e}")
+                for chunk in chunks:
+                    chunk.embedding = None
+                    chunk.metadata.update({"embedding_error": str(e), "embedding_status": "failed"})
+
+            for document, chunk in batch:
+                if self.deduplicator:
+                    for duplicate_document, _ in self.deduplicator.resolve(chunk):
+                        await chunk_embedded(duplicate_document)
+                await chunk_embedded(document)
+
+        async def embed_stage():
+            # Collect chunks across documents into batches; a batch is sent once
+            # it is full or no more chunks are immediately available
+            slots = asyncio.Semaphore(self.embedder.rate_limiter.max_concurrency)
+            in_flight = set()
+
+            async def run(batch: List[tuple]):
+                try:
+                    await embed_batch(batch)
+                finally:
+                    slots.release()
+
+            done = False
+            while not done:
+                item = await embed_queue.get()
+                if item is None:
+                    break
+
+                batch = [item]
+                batch_tokens = item[1].token_count or 0
+                while (
+                    len(batch) < self.embedder.batch_size
+                    and batch_tokens < self.embedder.max_batch_tokens
+                    and not embed_queue.empty()
+                ):
+                    item = embed_queue.get_nowait()
+                    if item is None:
+                        done = True
+                        break
+                    batch.append(item)
+                    batch_tokens += item[1].token_count or 0
+
+                await slots.acquire()
+                task = asyncio.create_task(run(batch))
+                in_flight.add(task)
+                task.add_done_callback(in_flight.discard)
+
+            if in_flight:
+                await asyncio.gather(*in_flight)
+
+        async def write_worker():
+            while True:
+                document = await write_queue.get()
+                if document is None:
+                    break
+
+                try:
+                    finish(document, await self._write_document(document))
+                except Exception as e:
+                    fail(document, e)
+                # Release the document's chunks as soon as they are stored
+                document.chunks = []
+
+        async def run_stage(workers: List[Any], next_queue: Optional[asyncio.Queue], next_workers: int):
+            # Wait for a stage to drain, then stop the workers of the next stage
+            await asyncio.gather(*workers)
+            if next_queue is not None:
+                for _ in range(next_workers):
+                    await next_queue.put(None)
+
+        write_workers = self.concurrency
+        await asyncio.gather(
+            run_stage([discover()], convert_queue, self.concurrency),
+            run_stage([convert_worker() for _ in range(self.concurrency)], chunk_queue, 1),
+            run_stage([chunk_worker()], embed_queue, 1),
+            run_stage([embed_stage()], write_queue, write_workers),
+            run_stage([write_worker() for _ in range(write_workers)], None, 0)
+        )
         
         # Log summary
         total_chunks = sum(r.chunks_created for r in results)
+        total_duplicates = sum(r.duplicate_chunks for r in results)
         total_errors = sum(len(r.errors) for r in results)
+        total_skipped = sum(1 for r in results if r.skipped)
+        
+        logger.info(
+            f"Ingestion complete: {len(results)} documents ({total_skipped} unchanged), "
+            f"{total_chunks} chunks ({total_duplicates} deduplicated), {total_errors} errors"
+        )
         
-        logger.info(f"Ingestion complete: {len(results)} documents, {total_chunks} chunks, {total_errors} errors")
+        if self.tune_index and (total_chunks or removed_ids):
+            try:
+                # Bulk loads can outgrow the index; rebuild concurrently if needed
+                await tune_vector_index()
+            except Exception as e:
+                logger.warning(f"Vector index tuning failed: {e}")
         
         return results
     
-    async def _ingest_single_document(self, file_path: str) -> IngestionResult:
+    async def _convert_document(self, document: "PendingDocument") -> bool:
         """
-        Ingest a single document.
+        Read and convert a document unless it is unchanged since the last run.
 
         Args:
-            file_path: Path to the document file
+            document: Document to convert; filled with content and metadata
 
         Returns:
-            Ingestion result
+            False if the document is unchanged and should be skipped
         """
-        start_time = datetime.now()
+        existing = document.existing
+        fingerprint = await asyncio.to_thread(self._fingerprint_file, document.file_path, existing)
+
+        if existing and self._is_unchanged(existing, fingerprint):
+            logger.info(f"Skipping unchanged file: {document.file_path}")
+            if existing["source_mtime_ns"] != fingerprint["source_mtime_ns"]:
+                # Content is identical but the file was touched; record the
+                # new mtime so the next run can skip without hashing
+                await self._update_fingerprint(existing["ids"][0], fingerprint)
+            return False
 
-        # Read document (returns tuple: content, docling_doc)
-        document_content, docling_doc = self._read_document(file_path)
-        document_title = self._extract_title(document_content, file_path)
-        document_source = os.path.relpath(file_path, self.documents_folder)
+        # Read document (returns tuple: content, docling_doc, conversion_failed)
+        document.content, document.docling_doc, conversion_failed = await self._read_document(
+            document.file_path, content_hash=fingerprint["content_hash"]
+        )
+        document.title = self._extract_title(document.content, document.file_path)
 
         # Extract metadata from content
-        document_metadata = self._extract_document_metadata(document_content, file_path)
+        document.metadata = self._extract_document_metadata(document.content, document.file_path)
+        document.metadata.update(fingerprint)
+        if conversion_failed:
+            # Stored as a placeholder; the next incremental run converts it again
+            document.metadata["conversion_failed"] = True
+
+        logger.info(f"Processing document: {document.title}")
+        return True
 
-        logger.info(f"Processing document: {document_title}")
+    async def _check_near_duplicate(self, document: "PendingDocument") -> Optional[tuple]:
+        """
+        Look for a stored or earlier document that is nearly identical.
 
-        # Chunk the document - pass DoclingDocument for HybridChunker
+        In "flag" mode a match is recorded in the document metadata. Documents
+        that will be stored are added to the index so later files in the same
+        run are compared against them too.
+
+        Args:
+            document: Converted document
+
+        Returns:
+            Tuple of (source, estimated similarity) of the best match, or None
+        """
+        if self.near_duplicate_index is None:
+            return None
+
+        signature = await asyncio.to_thread(
+            self.near_duplicate_index.hasher.signature, document.content
+        )
+        if signature is None:
+            return None
+
+        # A modified file must not match its own previous version
+        match = self.near_duplicate_index.query(signature, exclude=document.source)
+        if match:
+            document.metadata["near_duplicate_of"] = match[0]
+            document.metadata["near_duplicate_similarity"] = round(match[1], 3)
+            if self.near_duplicates == "skip":
+                return match
+
+        self.near_duplicate_index.add(document.source, signature)
+        document.signature = NearDuplicateIndex.to_bytes(signature)
+        return match
+
+    async def _chunk_document(self, document: "PendingDocument") -> List[DocumentChunk]:
+        """Chunk a converted document."""
         chunks = await self.chunker.chunk_document(
-            content=document_content,
-            title=document_title,
-            source=document_source,
-            metadata=document_metadata,
-            docling_doc=docling_doc  # Pass DoclingDocument for HybridChunker
+            content=document.content,
+            title=document.title,
+            source=document.source,
+            metadata=document.metadata,
+            docling_doc=document.docling_doc  # Pass DoclingDocument for HybridChunker
         )
-        
-        if not chunks:
-            logger.warning(f"No chunks created for {document_title}")
-            return IngestionResult(
-                document_id="",
-                title=document_title,
-                chunks_created=0,
-                entities_extracted=0,
-                relationships_created=0,
-                processing_time_ms=(datetime.now() - start_time).total_seconds() * 1000,
-                errors=["No chunks created"]
+
+        # The DoclingDocument is only needed for chunking
+        document.docling_doc = None
+        return chunks
+
+    async def _write_document(self, document: "PendingDocument") -> IngestionResult:
+        """
+        Store an embedded document and its chunks.
+
+        Args:
+            document: Document whose chunks all have been through the embedder
+
+        Returns:
+            Ingestion result
+        """
+        # Chunks that could not be embedded are stored without a vector; flag the
+        # document so the next incremental run re-processes it
+        embedding_errors = []
+        if document.metadata.get("conversion_failed"):
+            embedding_errors.append(
+                "Conversion failed (stored the fallback content, retried on the next --incremental run)"
+            )
+        failed_chunks = sum(1 for chunk in document.chunks if chunk.embedding is None)
+        if failed_chunks:
+            document.metadata["embedding_incomplete"] = True
+            embedding_errors.append(
+                f"{failed_chunks} chunks could not be embedded (stored without embeddings, "
+                f"retried on the next --incremental run)"
             )
-        
-        logger.info(f"Created {len(chunks)} chunks")
-        
-        # Entity extraction removed (graph-related functionality)
-        entities_extracted = 0
-        
-        # Generate embeddings
-        embedded_chunks = await self.embedder.embed_chunks(chunks)
-        logger.info(f"Generated embeddings for {len(embedded_chunks)} chunks")
         
         # Save to PostgreSQL
         document_id = await self._save_to_postgres(
-            document_title,
-            document_source,
-            document_content,
-            embedded_chunks,
-            document_metadata
+            document.title,
+            document.source,
+            document.content,
+            document.chunks,
+            document.metadata,
+            replace_document_ids=document.existing["ids"] if document.existing else None,
+            signature=document.signature
         )
         
         logger.info(f"Saved document to PostgreSQL with ID: {document_id}")
         
-        # Knowledge graph functionality removed
-        relationships_created = 0
-        graph_errors = []
-        
-        # Calculate processing time
-        processing_time = (datetime.now() - start_time).total_seconds() * 1000
-        
         return IngestionResult(
             document_id=document_id,
-            title=document_title,
-            chunks_created=len(chunks),
-            entities_extracted=entities_extracted,
-            relationships_created=relationships_created,
-            processing_time_ms=processing_time,
-            errors=graph_errors
+            title=document.title,
+            chunks_created=len(document.chunks),
+            duplicate_chunks=document.duplicate_chunks,
+            near_duplicate_of=document.metadata.get("near_duplicate_of"),
+            entities_extracted=0,
+            relationships_created=0,
+            processing_time_ms=document.elapsed_ms(),
+            errors=embedding_errors
+        )
+
+    def _skipped_result(self, document: "PendingDocument") -> IngestionResult:
+        """Result for a document left untouched by an incremental run."""
+        return IngestionResult(
+            document_id=document.existing["ids"][0],
+            title=document.existing["title"],
+            chunks_created=0,
+            processing_time_ms=0,
+            skipped=True
         )
     
     def _find_document_files(self) -> List[str]:
@@ -253,40 +641,50 @@ class DocumentIngestionPipeline:
 
         return sorted(files)
     
-    def _read_document(self, file_path: str) -> tuple[str, Optional[Any]]:
+    async def _read_document(
+        self,
+        file_path: str,
+        content_hash: Optional[str] = None
+    ) -> tuple[str, Optional[Any], bool]:
         """
         Read document content from file - supports multiple formats via Docling.
 
+        Args:
+            file_path: Path to the document file
+            content_hash: SHA-256 of the file, used as the conversion cache key
+
         Returns:
-            Tuple of (markdown_content, docling_document)
+            Tuple of (markdown_content, docling_document, conversion_failed)
             docling_document is None for text files and audio files
+            conversion_failed is True when Docling or Whisper failed and the
+            content is a raw-text fallback or an error placeholder
         """
         file_ext = os.path.splitext(file_path)[1].lower()
 
         # Audio formats - transcribe with Whisper ASR
         audio_formats = ['.mp3', '.wav', '.m4a', '.flac']
         if file_ext in audio_formats:
-            content = self._transcribe_audio(file_path)
-            return (content, None)  # No DoclingDocument for audio
-
-        # Docling-supported formats (convert to markdown)
-        docling_formats = ['.pdf', '.docx', '.doc', '.pptx', '.ppt', '.xlsx', '.xls', '.html', '.htm']
-
-        if file_ext in docling_formats:
             try:
-                from docling.document_converter import DocumentConverter
+                # Queued to the long-lived Whisper process (or read from the cache)
+                content = await self.transcriber.transcribe(file_path, content_hash=content_hash)
+                logger.info(f"Successfully transcribed {os.path.basename(file_path)}")
+                return (content, None, False)  # No DoclingDocument for audio
+            except Exception as e:
+                logger.error(f"Failed to transcribe {file_path} with Whisper ASR: {e}")
+                return (f"[Error: Could not transcribe audio file {os.path.basename(file_path)}]", None, True)
 
+        # Docling-supported formats (convert to markdown in the worker pool)
+        if file_ext in DOCLING_FORMATS:
+            try:
                 logger.info(f"Converting {file_ext} file using Docling: {os.path.basename(file_path)}")
 
-                converter = DocumentConverter()
-                result = converter.convert(file_path)
-
-                # Export to markdown for consistent processing
-                markdown_content = result.document.export_to_markdown()
+                # Workers return markdown plus the DoclingDocument for HybridChunker
+                markdown_content, docling_doc = await self.conversion_pool.convert(
+                    file_path, content_hash=content_hash
+                )
                 logger.info(f"Successfully converted {os.path.basename(file_path)} to markdown")
 
-                # Return both markdown and DoclingDocument for HybridChunker
-                return (markdown_content, result.document)
+                return (markdown_content, docling_doc, False)
 
             except Exception as e:
                 logger.error(f"Failed to convert {file_path} with Docling: {e}")
@@ -294,63 +692,19 @@ class DocumentIngestionPipeline:
                 logger.warning(f"Falling back to raw text extraction for {file_path}")
                 try:
                     with open(file_path, 'r', encoding='utf-8') as f:
-                        return (f.read(), None)
+                        return (f.read(), None, True)
                 except:
-                    return (f"[Error: Could not read file {os.path.basename(file_path)}]", None)
+                    return (f"[Error: Could not read file {os.path.basename(file_path)}]", None, True)
 
         # Text-based formats (read directly)
         else:
             try:
                 with open(file_path, 'r', encoding='utf-8') as f:
-                    return (f.read(), None)
+                    return (f.read(), None, False)
             except UnicodeDecodeError:
                 # Try with different encoding
                 with open(file_path, 'r', encoding='latin-1') as f:
-                    return (f.read(), None)
-
-    def _transcribe_audio(self, file_path: str) -> str:
-        """Transcribe audio file using Whisper ASR via Docling."""
-        try:
-            from pathlib import Path
-            from docling.document_converter import DocumentConverter, AudioFormatOption
-            from docling.datamodel.pipeline_options import AsrPipelineOptions
-            from docling.datamodel import asr_model_specs
-            from docling.datamodel.base_models import InputFormat
-            from docling.pipeline.asr_pipeline import AsrPipeline
-
-            # Use Path object - Docling expects this
-            audio_path = Path(file_path).resolve()
-            logger.info(f"Transcribing audio file using Whisper Turbo: {audio_path.name}")
-            logger.info(f"Audio file absolute path: {audio_path}")
-
-            # Verify file exists
-            if not audio_path.exists():
-                raise FileNotFoundError(f"Audio file not found: {audio_path}")
-
-            # Configure ASR pipeline with Whisper Turbo model
-            pipeline_options = AsrPipelineOptions()
-            pipeline_options.asr_options = asr_model_specs.WHISPER_TURBO
-
-            converter = DocumentConverter(
-                format_options={
-                    InputFormat.AUDIO: AudioFormatOption(
-                        pipeline_cls=AsrPipeline,
-                        pipeline_options=pipeline_options,
-                    )
-                }
-            )
-
-            # Transcribe the audio file - pass Path object
-            result = converter.convert(audio_path)
-
-            # Export to markdown with timestamps
-            markdown_content = result.document.export_to_markdown()
-            logger.info(f"Successfully transcribed {os.path.basename(file_path)}")
-            return markdown_content
-
-        except Exception as e:
-            logger.error(f"Failed to transcribe {file_path} with Whisper ASR: {e}")
-            return f"[Error: Could not transcribe audio file {os.path.basename(file_path)}]"
+                    return (f.read(), None, False)
 
     def _extract_title(self, content: str, file_path: str) -> str:
         """Extract title from document content or filename."""
@@ -400,11 +754,21 @@ class DocumentIngestionPipeline:
         source: str,
         content: str,
         chunks: List[DocumentChunk],
-        metadata: Dict[str, Any]
+        metadata: Dict[str, Any],
+        replace_document_ids: Optional[List[str]] = None,
+        signature: Optional[bytes] = None
     ) -> str:
         """Save document and chunks to PostgreSQL."""
         async with db_pool.acquire() as conn:
             async with conn.transaction():
+                # Replace previous versions of this source in the same transaction
+                # (chunks are removed by ON DELETE CASCADE)
+                if replace_document_ids:
+                    await conn.execute(
+                        "DELETE FROM documents WHERE id = ANY($1::uuid[])",
+                        replace_document_ids
+                    )
+
                 # Insert document
                 document_result = await conn.fetchrow(
                     """
@@ -420,29 +784,142 @@ class DocumentIngestionPipeline:
                 
                 document_id = document_result["id"]
                 
-                # Insert chunks
-                for chunk in chunks:
-                    # Convert embedding to PostgreSQL vector string format
-                    embedding_data = None
-                    if hasattr(chunk, 'embedding') and chunk.embedding:
-                        # PostgreSQL vector format: '[1.0,2.0,3.0]' (no spaces after commas)
-                        embedding_data = '[' + ','.join(map(str, chunk.embedding)) + ']'
-                    
+                if signature is not None:
                     await conn.execute(
-                        """
-                        INSERT INTO chunks (document_id, content, embedding, chunk_index, metadata, token_count)
-                        VALUES ($1::uuid, $2, $3::vector, $4, $5, $6)
-                        """,
+                        "INSERT INTO document_signatures (document_id, signature) VALUES ($1::uuid, $2)",
                         document_id,
-                        chunk.content,
-                        embedding_data,
-                        chunk.index,
-                        json.dumps(chunk.metadata),
-                        chunk.token_count
+                        signature
                     )
                 
+                # Bulk-load chunks with COPY; embeddings are encoded by the binary
+                # pgvector codec registered on the pool (float32, no text formatting)
+                await conn.copy_records_to_table(
+                    "chunks",
+                    records=[
+                        (
+                            document_id,
+                            chunk.content,
+                            chunk.embedding,
+                            chunk.index,
+                            json.dumps(chunk.metadata),
+                            chunk.token_count
+                        )
+                        for chunk in chunks
+                    ],
+                    columns=["document_id", "content", "embedding", "chunk_index", "metadata", "token_count"]
+                )
+                
                 return document_id
     
+    def _fingerprint_file(
+        self,
+        file_path: str,
+        existing: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """
+        Compute the change-detection fingerprint of a source file.
+
+        The content hash is only computed when mtime or size differ from the
+        stored fingerprint, so unchanged files cost a single stat call.
+        """
+        stat = os.stat(file_path)
+        fingerprint = {
+            "source_mtime_ns": stat.st_mtime_ns,
+            "source_size": stat.st_size,
+        }
+
+        if (
+            existing
+            and existing["source_mtime_ns"] == stat.st_mtime_ns
+            and existing["source_size"] == stat.st_size
+        ):
+            fingerprint["content_hash"] = existing["content_hash"]
+            return fingerprint
+
+        fingerprint["content_hash"] = hash_file(file_path)
+
+        return fingerprint
+
+    def _is_unchanged(self, existing: Dict[str, Any], fingerprint: Dict[str, Any]) -> bool:
+        """Check whether a stored source matches the file on disk."""
+        return (
+            len(existing["ids"]) == 1
+            and existing["content_hash"] is not None
+            and not existing["embedding_incomplete"]
+            and not existing["conversion_failed"]
+            and existing["content_hash"] == fingerprint["content_hash"]
+        )
+
+    async def _load_existing_sources(self) -> Dict[str, Dict[str, Any]]:
+        """Load stored documents and their fingerprints, keyed by source."""
+        async with db_pool.acquire() as conn:
+            rows = await conn.fetch(
+                """
+                SELECT
+                    id::text,
+                    title,
+                    source,
+                    metadata->>'content_hash' AS content_hash,
+                    (metadata->>'source_mtime_ns')::bigint AS source_mtime_ns,
+                    (metadata->>'source_size')::bigint AS source_size,
+                    COALESCE((metadata->>'embedding_incomplete')::boolean, false) AS embedding_incomplete,
+                    COALESCE((metadata->>'conversion_failed')::boolean, false) AS conversion_failed
+                FROM documents
+                ORDER BY created_at DESC
+                """
+            )
+
+        sources: Dict[str, Dict[str, Any]] = {}
+        for row in rows:
+            state = sources.setdefault(row["source"], {
+                "ids": [],
+                "title": row["title"],
+                "content_hash": row["content_hash"],
+                "source_mtime_ns": row["source_mtime_ns"],
+                "source_size": row["source_size"],
+                "embedding_incomplete": row["embedding_incomplete"],
+                "conversion_failed": row["conversion_failed"],
+            })
+            state["ids"].append(row["id"])
+
+        return sources
+
+    async def _load_signatures(self) -> List[tuple]:
+        """Load stored near-duplicate signatures as (source, signature bytes)."""
+        async with db_pool.acquire() as conn:
+            try:
+                rows = await conn.fetch(
+                    """
+                    SELECT d.source, s.signature
+                    FROM document_signatures s
+                    JOIN documents d ON d.id = s.document_id
+                    """
+                )
+            except asyncpg.UndefinedTableError:
+                raise ValueError(
+                    "Table document_signatures not found; re-run sql/schema.sql to enable "
+                    "near-duplicate detection"
+                )
+
+        return [(row["source"], row["signature"]) for row in rows]
+
+    async def _update_fingerprint(self, document_id: str, fingerprint: Dict[str, Any]):
+        """Store a refreshed fingerprint for an unchanged document."""
+        async with db_pool.acquire() as conn:
+            await conn.execute(
+                "UPDATE documents SET metadata = metadata || $2::jsonb WHERE id = $1::uuid",
+                document_id,
+                json.dumps(fingerprint)
+            )
+
+    async def _delete_documents(self, document_ids: List[str]):
+        """Delete documents (and their chunks) by ID."""
+        async with db_pool.acquire() as conn:
+            await conn.execute(
+                "DELETE FROM documents WHERE id = ANY($1::uuid[])",
+                document_ids
+            )
+
     async def _clean_databases(self):
         """Clean existing data from databases."""
         logger.warning("Cleaning existing data from databases...")
@@ -460,9 +937,18 @@ async def main():
     parser = argparse.ArgumentParser(description="Ingest documents into vector DB")
     parser.add_argument("--documents", "-d", default="documents", help="Documents folder path")
     parser.add_argument("--no-clean", action="store_true", help="Skip cleaning existing data before ingestion (default: cleans automatically)")
+    parser.add_argument("--incremental", action="store_true", help="Only ingest new or modified files and remove deleted ones (implies --no-clean)")
     parser.add_argument("--chunk-size", type=int, default=1000, help="Chunk size for splitting documents")
     parser.add_argument("--chunk-overlap", type=int, default=200, help="Chunk overlap size")
     parser.add_argument("--no-semantic", action="store_true", help="Disable semantic chunking")
+    parser.add_argument("--concurrency", type=int, default=1, help="Number of documents to process concurrently")
+    parser.add_argument("--no-embedding-cache", action="store_true", help="Do not reuse embeddings from the on-disk cache (EMBEDDING_CACHE_PATH)")
+    parser.add_argument("--no-conversion-cache", action="store_true", help="Re-run Docling conversion even for files converted before (CONVERSION_CACHE_DIR)")
+    parser.add_argument("--no-dedup", action="store_true", help="Embed every chunk, even exact duplicates of other chunks")
+    parser.add_argument("--near-duplicates", choices=["flag", "skip"], help="Detect near-identical documents (MinHash LSH) and flag them in metadata or skip them")
+    parser.add_argument("--near-duplicate-threshold", type=float, default=0.8, help="Minimum estimated Jaccard similarity of near-duplicates")
+    parser.add_argument("--no-index-tuning", action="store_true", help="Do not rebuild the vector index after ingestion")
+    parser.add_argument("--workers", type=int, default=None, help="Docling conversion worker processes (default: min(concurrency, CPU count))")
     # Graph-related arguments removed
     parser.add_argument("--verbose", "-v", action="store_true", help="Enable verbose logging")
 
@@ -486,7 +972,16 @@ async def main():
     pipeline = DocumentIngestionPipeline(
         config=config,
         documents_folder=args.documents,
-        clean_before_ingest=not args.no_clean  # Clean by default
+        clean_before_ingest=not args.no_clean,  # Clean by default
+        incremental=args.incremental,
+        concurrency=args.concurrency,
+        conversion_workers=args.workers,
+        use_embedding_cache=not args.no_embedding_cache,
+        use_conversion_cache=not args.no_conversion_cache,
+        deduplicate_chunks=not args.no_dedup,
+        near_duplicates=args.near_duplicates,
+        near_duplicate_threshold=args.near_duplicate_threshold,
+        tune_index=not args.no_index_tuning
     )
     
     def progress_callback(current: int, total: int):
@@ -505,7 +1000,9 @@ async def main():
         print("INGESTION SUMMARY")
         print("="*50)
         print(f"Documents processed: {len(results)}")
+        print(f"Unchanged documents skipped: {sum(1 for r in results if r.skipped)}")
         print(f"Total chunks created: {sum(r.chunks_created for r in results)}")
+        print(f"Duplicate chunks (embedding reused): {sum(r.duplicate_chunks for r in results)}")
         # Graph-related stats removed
         print(f"Total errors: {sum(len(r.errors) for r in results)}")
         print(f"Total processing time: {total_time:.2f} seconds")
@@ -513,8 +1010,16 @@ async def main():
         
         # Print individual results
         for result in results:
+            if result.skipped:
+                print(f"- {result.title}: unchanged")
+                continue
+            if result.near_duplicate_of and not result.document_id:
+                print(f"- {result.title}: near-duplicate of {result.near_duplicate_of}, not stored")
+                continue
+
             status = "✓" if not result.errors else "✗"
-            print(f"{status} {result.title}: {result.chunks_created} chunks")
+            duplicates = f" ({result.duplicate_chunks} duplicates)" if result.duplicate_chunks else ""
+            print(f"{status} {result.title}: {result.chunks_created} chunks{duplicates}")
             
             if result.errors:
                 for error in result.errors:
@@ -0,0 +1,233 @@
+"""
+Local CPU embedding backend.
+
+Runs sentence-transformers models (PyTorch or ONNX Runtime) in a pool of
+worker processes, each holding one loaded model, so embeddings are computed
+offline at local-CPU throughput instead of through the OpenAI API.
+
+Selected with EMBEDDING_MODEL=local:<model id>, for example
+EMBEDDING_MODEL=local:sentence-transformers/all-MiniLM-L6-v2.
+"""
+
+import os
+import asyncio
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+LOCAL_MODEL_PREFIX = "local:"
+
+# Per-process model, created once by the pool initializer
+_worker_model = None
+
+
+def is_local_model(model: str) -> bool:
+    """Check whether an embedding model name selects the local backend."""
+    return model.startswith(LOCAL_MODEL_PREFIX)
+
+
+def local_model_id(model: str) -> str:
+    """Strip the local: prefix from an embedding model name."""
+    return model[len(LOCAL_MODEL_PREFIX):] if is_local_model(model) else model
+
+
+def _init_worker(
+    model_id: str,
+    backend: str,
+    dimensions: Optional[int],
+    num_threads: int
+) -> None:
+    """Load the model reused by this worker process."""
+    global _worker_model
+
+    # Keep workers from oversubscribing the CPU with their own thread pools
+    os.environ.setdefault("OMP_NUM_THREADS", str(num_threads))
+
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    torch.set_num_threads(num_threads)
+
+    _worker_model = SentenceTransformer(
+        model_id,
+        device="cpu",
+        backend=backend,
+        truncate_dim=dimensions
+    )
+
+
+def encode_texts(texts: List[str]) -> np.ndarray:
+    """
+    Embed texts inside a worker process.
+
+    Args:
+        texts: Texts to embed
+
+    Returns:
+        Normalized float32 embeddings, one row per text
+    """
+    embeddings = _worker_model.encode(
+        texts,
+        convert_to_numpy=True,
+        normalize_embeddings=True
+    )
+    return embeddings.astype(np.float32, copy=False)
+
+
+def describe_model() -> Tuple[int, int]:
+    """Return (embedding dimensions, max sequence length) of the worker's model."""
+    return _worker_model.get_sentence_embedding_dimension(), _worker_model.max_seq_length
+
+
+class LocalTokenizer:
+    """Hugging Face tokenizer with the encode/decode interface of a tiktoken encoding."""
+
+    def __init__(self, tokenizer):
+        self.tokenizer = tokenizer
+
+    def encode(self, text: str, **kwargs) -> List[int]:
+        """Tokenize text without the model's special tokens."""
+        return self.tokenizer.encode(text, add_special_tokens=False, verbose=False)
+
+    def decode(self, tokens: List[int]) -> str:
+        """Turn tokens back into text."""
+        return self.tokenizer.decode(tokens)
+
+
+def get_local_tokenizer(model: str) -> Optional[LocalTokenizer]:
+    """
+    Get the tokenizer of a local embedding model.
+
+    Returns:
+        Tokenizer, or None if it could not be loaded
+    """
+    try:
+        from transformers import AutoTokenizer
+
+        return LocalTokenizer(AutoTokenizer.from_pretrained(local_model_id(model)))
+    except Exception as e:
+        logger.warning(f"Failed to load tokenizer for {model} ({e}), using character-based token estimates")
+        return None
+
+
+class LocalEmbeddingBackend:
+    """Pool of worker processes, each holding a loaded sentence-transformers model."""
+
+    def __init__(
+        self,
+        model: str,
+        backend: str = "torch",
+        dimensions: Optional[int] = None,
+        max_workers: Optional[int] = None
+    ):
+        """
+        Initialize local embedding backend.
+
+        Args:
+            model: Model name, with or without the local: prefix
+            backend: sentence-transformers backend, "torch" or "onnx"
+            dimensions: Truncate embeddings to this many dimensions (Matryoshka models)
+            max_workers: Number of worker processes (default: min(4, CPU count))
+        """
+        self.model_id = local_model_id(model)
+        self.backend = backend
+        self.dimensions = dimensions
+        self.max_workers = max(1, max_workers or min(4, os.cpu_count() or 1))
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    @classmethod
+    def from_env(cls, model: str, dimensions: Optional[int] = None) -> "LocalEmbeddingBackend":
+        """Create a backend configured by EMBEDDING_LOCAL_BACKEND and EMBEDDING_LOCAL_WORKERS."""
+        workers = os.getenv("EMBEDDING_LOCAL_WORKERS")
+        return cls(
+            model,
+            backend=os.getenv("EMBEDDING_LOCAL_BACKEND", "torch"),
+            dimensions=dimensions,
+            max_workers=int(workers) if workers else None
+        )
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        """Create the executor on first use; workers are spawned on demand."""
+        if self._executor is None:
+            num_threads = max(1, (os.cpu_count() or 1) // self.max_workers)
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                # spawn avoids forking a process that holds an event loop and model threads
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(self.model_id, self.backend, self.dimensions, num_threads)
+            )
+            logger.info(
+                f"Started local embedding pool for {self.model_id} "
+                f"({self.backend}, {self.max_workers} workers)"
+            )
+        return self._executor
+
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embed a batch of texts in the pool.
+
+        Args:
+            texts: Non-empty texts to embed
+
+        Returns:
+            List of normalized embedding vectors
+        """
+        loop = asyncio.get_running_loop()
+        executor = self._get_executor()
+        try:
+            embeddings = await loop.run_in_executor(executor, encode_texts, texts)
+        except BrokenProcessPool:
+            # A worker died (e.g. out of memory); start a fresh pool for later batches.
+            # Concurrent batches on the same pool fail too, so only replace it if no
+            # other batch already has.
+            if self._executor is executor:
+                logger.error("Local embedding pool broke, restarting it")
+                self._executor = None
+                # Don't block the event loop while the dead workers are reaped
+                executor.shutdown(wait=False, cancel_futures=True)
+            raise
+
+        return embeddings.tolist()
+
+    def describe(self) -> Tuple[int, int]:
+        """
+        Load the model in a worker and report its shape.
+
+        Returns:
+            Tuple of (embedding dimensions, max sequence length in tokens)
+        """
+        return self._get_executor().submit(describe_model).result()
+
+    def shutdown(self) -> None:
+        """Stop all worker processes."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+
+# One pool per model and dimensions, shared by every generator in the process
+_backends: Dict[Tuple[str, Optional[int]], LocalEmbeddingBackend] = {}
+
+
+def get_local_backend(model: str, dimensions: Optional[int] = None) -> LocalEmbeddingBackend:
+    """
+    Get the process-wide backend for a local model, creating it on first use.
+
+    Args:
+        model: Model name, with or without the local: prefix
+        dimensions: Optional embedding truncation
+
+    Returns:
+        Shared LocalEmbeddingBackend instance
+    """
+    key = (local_model_id(model), dimensions)
+    if key not in _backends:
+        _backends[key] = LocalEmbeddingBackend.from_env(model, dimensions)
+    return _backends[key]
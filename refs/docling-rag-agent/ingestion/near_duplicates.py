@@ -0,0 +1,193 @@
+"""
+Near-duplicate document detection with MinHash LSH.
+
+Revised versions of the same report share most of their text. Each converted
+document is reduced to a MinHash signature over word shingles, and an LSH
+index finds earlier documents whose estimated Jaccard similarity exceeds a
+threshold, before the document is chunked and embedded.
+"""
+
+import hashlib
+import logging
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+
+# Shingles hashed per block, bounding the (shingles x permutations) matrix
+_BLOCK_SIZE = 8192
+
+
+class MinHasher:
+    """Computes MinHash signatures over word shingles."""
+
+    def __init__(self, num_perm: int = 128, shingle_size: int = 5, seed: int = 1):
+        """
+        Initialize hasher.
+
+        Args:
+            num_perm: Number of hash permutations (signature length)
+            shingle_size: Words per shingle
+            seed: Seed of the permutations; signatures are only comparable
+                between hashers with the same seed and num_perm
+        """
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+
+        generator = np.random.RandomState(seed)
+        self.a = generator.randint(1, _MERSENNE_PRIME, size=num_perm, dtype=np.uint64)
+        self.b = generator.randint(0, _MERSENNE_PRIME, size=num_perm, dtype=np.uint64)
+
+    def shingles(self, text: str) -> Set[str]:
+        """Split text into overlapping word n-grams, ignoring case and whitespace."""
+        words = text.lower().split()
+        if len(words) <= self.shingle_size:
+            return {" ".join(words)} if words else set()
+        return {
+            " ".join(words[i:i + self.shingle_size])
+            for i in range(len(words) - self.shingle_size + 1)
+        }
+
+    def signature(self, text: str) -> Optional[np.ndarray]:
+        """
+        Compute the MinHash signature of a text.
+
+        Args:
+            text: Document text (markdown)
+
+        Returns:
+            uint32 array of length num_perm, or None for texts without words
+        """
+        shingles = self.shingles(text)
+        if not shingles:
+            return None
+
+        hashes = np.fromiter(
+            (
+                int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=4).digest(), "little")
+                for shingle in shingles
+            ),
+            dtype=np.uint64,
+            count=len(shingles)
+        )
+
+        signature = np.full(self.num_perm, _MAX_HASH, dtype=np.uint64)
+        for start in range(0, len(hashes), _BLOCK_SIZE):
+            block = hashes[start:start + _BLOCK_SIZE, None]
+            permuted = ((block * self.a + self.b) % _MERSENNE_PRIME) & _MAX_HASH
+            np.minimum(signature, permuted.min(axis=0), out=signature)
+
+        return signature.astype(np.uint32)
+
+
+def _choose_bands(num_perm: int, threshold: float) -> Tuple[int, int]:
+    """
+    Pick (bands, rows) for LSH.
+
+    Uses the highest LSH threshold (1/bands)^(1/rows) that is still somewhat
+    below the similarity threshold, so true matches are rarely missed;
+    candidates are verified against the threshold afterwards.
+    """
+    options = [
+        (bands, num_perm // bands, (1 / bands) ** (1 / (num_perm // bands)))
+        for bands in range(1, num_perm + 1)
+        if num_perm % bands == 0
+    ]
+    below = [option for option in options if option[2] <= threshold - 0.05]
+    bands, rows, _ = max(below, key=lambda option: option[2]) if below else min(options, key=lambda option: option[2])
+    return bands, rows
+
+
+class NearDuplicateIndex:
+    """LSH index of document signatures keyed by document source."""
+
+    def __init__(self, threshold: float = 0.8, hasher: Optional[MinHasher] = None):
+        """
+        Initialize index.
+
+        Args:
+            threshold: Minimum estimated Jaccard similarity of near-duplicates
+            hasher: Signature hasher (default: 128 permutations, 5-word shingles)
+        """
+        self.threshold = threshold
+        self.hasher = hasher or MinHasher()
+        self.bands, self.rows = _choose_bands(self.hasher.num_perm, threshold)
+        self.signatures: Dict[str, np.ndarray] = {}
+        self._buckets: List[Dict[bytes, Set[str]]] = [{} for _ in range(self.bands)]
+
+    def _band_keys(self, signature: np.ndarray) -> List[bytes]:
+        return [
+            signature[band * self.rows:(band + 1) * self.rows].tobytes()
+            for band in range(self.bands)
+        ]
+
+    def load(self, entries: Iterable[Tuple[str, bytes]]) -> None:
+        """
+        Replace the index contents with stored signatures.
+
+        Args:
+            entries: (source, signature bytes) pairs
+        """
+        self.signatures.clear()
+        self._buckets = [{} for _ in range(self.bands)]
+
+        for source, data in entries:
+            signature = np.frombuffer(data, dtype="<u4").astype(np.uint32)
+            if signature.shape[0] != self.hasher.num_perm:
+                # Computed with other settings; not comparable
+                continue
+            self.add(source, signature)
+
+        logger.info(f"Loaded {len(self.signatures)} document signatures for near-duplicate detection")
+
+    def add(self, source: str, signature: np.ndarray) -> None:
+        """Add or replace the signature of a document."""
+        self.remove(source)
+        self.signatures[source] = signature
+        for buckets, key in zip(self._buckets, self._band_keys(signature)):
+            buckets.setdefault(key, set()).add(source)
+
+    def remove(self, source: str) -> None:
+        """Remove a document from the index."""
+        signature = self.signatures.pop(source, None)
+        if signature is None:
+            return
+        for buckets, key in zip(self._buckets, self._band_keys(signature)):
+            members = buckets.get(key)
+            if members is not None:
+                members.discard(source)
+                if not members:
+                    del buckets[key]
+
+    def query(self, signature: np.ndarray, exclude: Optional[str] = None) -> Optional[Tuple[str, float]]:
+        """
+        Find the most similar indexed document above the threshold.
+
+        Args:
+            signature: Signature of the new document
+            exclude: Source to ignore (the document's own previous version)
+
+        Returns:
+            Tuple of (source, estimated similarity), or None
+        """
+        candidates: Set[str] = set()
+        for buckets, key in zip(self._buckets, self._band_keys(signature)):
+            candidates.update(buckets.get(key, ()))
+        candidates.discard(exclude)
+
+        best = None
+        for source in candidates:
+            similarity = float(np.mean(self.signatures[source] == signature))
+            if similarity >= self.threshold and (best is None or similarity > best[1]):
+                best = (source, similarity)
+
+        return best
+
+    @staticmethod
+    def to_bytes(signature: np.ndarray) -> bytes:
+        """Serialize a signature for storage."""
+        return signature.astype("<u4").tobytes()
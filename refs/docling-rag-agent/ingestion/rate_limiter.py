@@ -0,0 +1,176 @@
+"""
+Request scheduling for the embeddings API.
+
+Keeps several embedding requests in flight while staying under the account's
+requests-per-minute and tokens-per-minute limits, and lets a 429 response's
+Retry-After pause every pending request instead of only the one that failed.
+"""
+
+import os
+import time
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import Any, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimiter:
+    """
+    Token-bucket limiter for requests/minute and tokens/minute with a cap on
+    concurrent requests.
+
+    Both buckets refill continuously and start full, so a burst of up to one
+    minute's budget is allowed before requests are spaced out.
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: int = 3000,
+        tokens_per_minute: int = 1_000_000,
+        max_concurrency: int = 4
+    ):
+        """
+        Initialize rate limiter.
+
+        Args:
+            requests_per_minute: Maximum requests started per minute
+            tokens_per_minute: Maximum input tokens sent per minute
+            max_concurrency: Maximum requests in flight at once
+        """
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.max_concurrency = max(1, max_concurrency)
+
+        self._request_budget = float(requests_per_minute)
+        self._token_budget = float(tokens_per_minute)
+        self._last_refill = time.monotonic()
+        self._paused_until = 0.0
+
+        # Created lazily so the limiter can be built outside an event loop
+        self._lock: Optional[asyncio.Lock] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    @classmethod
+    def from_env(cls) -> "RateLimiter":
+        """Create a limiter from EMBEDDING_RPM, EMBEDDING_TPM and EMBEDDING_MAX_CONCURRENCY."""
+        return cls(
+            requests_per_minute=int(os.getenv("EMBEDDING_RPM", "3000")),
+            tokens_per_minute=int(os.getenv("EMBEDDING_TPM", "1000000")),
+            max_concurrency=int(os.getenv("EMBEDDING_MAX_CONCURRENCY", "4"))
+        )
+
+    @classmethod
+    def unlimited(cls, max_concurrency: int) -> "RateLimiter":
+        """Create a limiter that only caps concurrency (for local backends)."""
+        return cls(
+            requests_per_minute=float("inf"),
+            tokens_per_minute=float("inf"),
+            max_concurrency=max_concurrency
+        )
+
+    def _refill(self) -> None:
+        """Add budget accrued since the last refill."""
+        now = time.monotonic()
+        elapsed = now - self._last_refill
+        self._last_refill = now
+
+        self._request_budget = min(
+            float(self.requests_per_minute),
+            self._request_budget + elapsed * self.requests_per_minute / 60.0
+        )
+        self._token_budget = min(
+            float(self.tokens_per_minute),
+            self._token_budget + elapsed * self.tokens_per_minute / 60.0
+        )
+
+    async def acquire(self, tokens: int) -> None:
+        """
+        Wait until a request carrying `tokens` input tokens may be sent.
+
+        Args:
+            tokens: Estimated input tokens of the request
+        """
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+
+        # A request larger than the whole per-minute budget waits for a full bucket
+        tokens = min(tokens, self.tokens_per_minute)
+
+        # The lock makes waiters take budget in arrival order
+        async with self._lock:
+            while True:
+                self._refill()
+
+                wait = self._paused_until - time.monotonic()
+                if wait <= 0:
+                    request_deficit = 1.0 - self._request_budget
+                    token_deficit = tokens - self._token_budget
+                    if request_deficit <= 0 and token_deficit <= 0:
+                        self._request_budget -= 1.0
+                        self._token_budget -= tokens
+                        return
+
+                    wait = max(
+                        request_deficit * 60.0 / self.requests_per_minute,
+                        token_deficit * 60.0 / self.tokens_per_minute
+                    )
+
+                await asyncio.sleep(wait)
+
+    def pause(self, seconds: float) -> None:
+        """
+        Hold all new requests for `seconds` (e.g. from a Retry-After header).
+
+        Args:
+            seconds: Pause duration
+        """
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    @asynccontextmanager
+    async def slot(self, tokens: int):
+        """
+        Reserve a concurrency slot and rate budget for one request.
+
+        Args:
+            tokens: Estimated input tokens of the request
+        """
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async with self._semaphore:
+            await self.acquire(tokens)
+            yield
+
+
+def retry_after_seconds(error: Any) -> Optional[float]:
+    """
+    Read the server-suggested delay from an OpenAI API error.
+
+    Args:
+        error: Exception raised by the OpenAI client
+
+    Returns:
+        Delay in seconds, or None if the response carried no hint
+    """
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+
+    retry_after_ms = headers.get("retry-after-ms")
+    if retry_after_ms:
+        try:
+            return float(retry_after_ms) / 1000.0
+        except ValueError:
+            pass
+
+    retry_after = headers.get("retry-after")
+    if retry_after:
+        try:
+            return float(retry_after)
+        except ValueError:
+            pass
+
+    return None
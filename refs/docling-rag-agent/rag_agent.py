@@ -9,12 +9,17 @@ import json
 import logging
 import os
 import sys
-from typing import Any
+from typing import Any, List, Optional
 
 import asyncpg
 from dotenv import load_dotenv
 from pydantic_ai import Agent, RunContext
 
+from utils.vector_codec import register_vector_codec
+from utils.search import knowledge_base_multi_search, knowledge_base_search
+from utils.local_index import close_local_index
+from utils.answer_cache import AnswerCache, seed_instructions
+
 # Load environment variables
 load_dotenv(".env")
 
@@ -29,7 +34,11 @@ async def initialize_db():
     global db_pool
     if not db_pool:
         db_pool = await asyncpg.create_pool(
-            os.getenv("DATABASE_URL"), min_size=2, max_size=10, command_timeout=60
+            os.getenv("DATABASE_URL"),
+            min_size=2,
+            max_size=10,
+            command_timeout=60,
+            init=register_vector_codec,  # Binary float32 vectors instead of decimal text
         )
         logger.info("Database connection pool initialized")
 
@@ -37,18 +46,34 @@ async def initialize_db():
 async def close_db():
     """Close database connection pool."""
     global db_pool
+    await close_local_index()
     if db_pool:
         await db_pool.close()
         logger.info("Database connection pool closed")
 
 
-async def search_knowledge_base(ctx: RunContext[None], query: str, limit: int = 5) -> str:
+async def search_knowledge_base(
+    ctx: RunContext[None],
+    query: str,
+    limit: int = 5,
+    source: Optional[str] = None,
+    title: Optional[str] = None,
+    file_type: Optional[str] = None,
+    ingested_after: Optional[str] = None,
+) -> str:
     """
-    Search the knowledge base using semantic similarity.
+    Search the knowledge base by meaning and exact terms.
+
+    Combines vector similarity with full-text matching (SEARCH_TYPE=hybrid by
+    default), so names, tickers and other exact terms are found as well.
 
     Args:
         query: The search query to find relevant information
         limit: Maximum number of results to return (default: 5)
+        source: Only search documents whose file path contains this text
+        title: Only search documents whose title contains this text
+        file_type: Only search documents with this file extension (e.g. "pdf")
+        ingested_after: Only search documents ingested on or after this ISO date
 
     Returns:
         Formatted search results with source citations
@@ -58,53 +83,73 @@ async def search_knowledge_base(ctx: RunContext[None], query: str, limit: int =
         if not db_pool:
             await initialize_db()
 
-        # Generate embedding for query
-        from ingestion.embedder import create_embedder
-
-        embedder = create_embedder()
-        query_embedding = await embedder.embed_query(query)
+        return await knowledge_base_search(
+            db_pool,
+            query,
+            limit,
+            filters={
+                "source": source,
+                "title": title,
+                "file_type": file_type,
+                "ingested_after": ingested_after,
+            },
+        )
 
-        # Convert to PostgreSQL vector format
-        embedding_str = "[" + ",".join(map(str, query_embedding)) + "]"
+    except Exception as e:
+        logger.error(f"Knowledge base search failed: {e}", exc_info=True)
+        return f"I encountered an error searching the knowledge base: {str(e)}"
 
-        # Search using match_chunks function
-        async with db_pool.acquire() as conn:
-            results = await conn.fetch(
-                """
-                SELECT * FROM match_chunks($1::vector, $2)
-                """,
-                embedding_str,
-                limit,
-            )
 
-        # Format results for response
-        if not results:
-            return "No relevant information found in the knowledge base for your query."
+async def search_knowledge_base_multi(
+    ctx: RunContext[None],
+    queries: List[str],
+    limit: int = 3,
+    source: Optional[str] = None,
+    title: Optional[str] = None,
+    file_type: Optional[str] = None,
+    ingested_after: Optional[str] = None,
+) -> str:
+    """
+    Search the knowledge base for several related queries at once.
 
-        # Build response with sources
-        response_parts = []
-        for i, row in enumerate(results, 1):
-            similarity = row["similarity"]
-            content = row["content"]
-            doc_title = row["document_title"]
-            doc_source = row["document_source"]
+    Use this instead of calling search_knowledge_base repeatedly when a question
+    needs more than one search (e.g. comparing companies or covering several
+    aspects). Each result is listed once, under the query it matches best.
 
-            response_parts.append(f"[Source: {doc_title}]\n{content}\n")
+    Args:
+        queries: Search queries (at most 8)
+        limit: Maximum number of results per query (default: 3)
+        source: Only search documents whose file path contains this text
+        title: Only search documents whose title contains this text
+        file_type: Only search documents with this file extension (e.g. "pdf")
+        ingested_after: Only search documents ingested on or after this ISO date
 
-        if not response_parts:
-            return "Found some results but they may not be directly relevant to your query. Please try rephrasing your question."
+    Returns:
+        Formatted search results per query with source citations
+    """
+    try:
+        # Ensure database is initialized
+        if not db_pool:
+            await initialize_db()
 
-        return f"Found {len(response_parts)} relevant results:\n\n" + "\n---\n".join(response_parts)
+        return await knowledge_base_multi_search(
+            db_pool,
+            queries,
+            limit,
+            filters={
+                "source": source,
+                "title": title,
+                "file_type": file_type,
+                "ingested_after": ingested_after,
+            },
+        )
 
     except Exception as e:
-        logger.error(f"Knowledge base search failed: {e}", exc_info=True)
+        logger.error(f"Knowledge base multi-query search failed: {e}", exc_info=True)
         return f"I encountered an error searching the knowledge base: {str(e)}"
 
 
-# Create the PydanticAI agent with the RAG tool
-agent = Agent(
-    "openai:gpt-4o-mini",
-    system_prompt="""You are an intelligent knowledge assistant with access to an organization's documentation and information.
+SYSTEM_PROMPT = """You are an intelligent knowledge assistant with access to an organization's documentation and information.
 Your role is to help users find accurate information from the knowledge base.
 You have a professional yet friendly demeanor.
 
@@ -112,8 +157,18 @@ IMPORTANT: Always search the knowledge base before answering questions about spe
 If information isn't in the knowledge base, clearly state that and offer general guidance.
 Be concise but thorough in your responses.
 Ask clarifying questions if the user's query is ambiguous.
-When you find relevant information, synthesize it clearly and cite the source documents.""",
-    tools=[search_knowledge_base],
+When a question needs several searches, run them together with search_knowledge_base_multi.
+When you find relevant information, synthesize it clearly and cite the source documents."""
+
+# Semantic cache of answers to first questions
+answer_cache = AnswerCache.from_env()
+
+# Create the PydanticAI agent with the RAG tool
+agent = Agent(
+    "openai:gpt-4o-mini",
+    system_prompt=SYSTEM_PROMPT,
+    instructions=seed_instructions,
+    tools=[search_knowledge_base, search_knowledge_base_multi],
 )
 
 
@@ -152,17 +207,19 @@ async def run_cli():
             print("Assistant: ", end="", flush=True)
 
             try:
-                # Stream the response using run_stream
-                async with agent.run_stream(user_input, message_history=message_history) as result:
-                    # Stream text as it comes in (delta=True for only new tokens)
-                    async for text in result.stream_text(delta=True):
-                        # Print only the new token
-                        print(text, end="", flush=True)
-
-                    print()  # New line after streaming completes
-
-                    # Update message history for context
-                    message_history = result.all_messages()
+                # Stream the response (first questions go through the semantic answer cache)
+                response = await answer_cache.run_with_answer_cache(
+                    agent,
+                    db_pool,
+                    user_input,
+                    message_history,
+                    SYSTEM_PROMPT,
+                    on_text=lambda text: print(text, end="", flush=True),
+                )
+                print()  # New line after streaming completes
+
+                # Update message history for context
+                message_history = response.messages
 
             except KeyboardInterrupt:
                 print("\n\n[Interrupted]")
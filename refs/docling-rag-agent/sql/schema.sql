@@ -1,6 +1,13 @@
+-- Embedding columns are sized for text-embedding-3-small (1536 dimensions).
+-- For other models replace every vector(1536) with the model's dimensions
+-- (e.g. vector(384) for local:sentence-transformers/all-MiniLM-L6-v2):
+--   sed 's/vector(1536)/vector(384)/g' sql/schema.sql | psql "$DATABASE_URL"
+
 CREATE EXTENSION IF NOT EXISTS vector;
 CREATE EXTENSION IF NOT EXISTS "uuid-ossp";
 
+DROP TABLE IF EXISTS answer_cache CASCADE;
+DROP TABLE IF EXISTS document_signatures CASCADE;
 DROP TABLE IF EXISTS chunks CASCADE;
 DROP TABLE IF EXISTS documents CASCADE;
 DROP INDEX IF EXISTS idx_chunks_embedding;
@@ -28,16 +35,52 @@ CREATE TABLE chunks (
     chunk_index INTEGER NOT NULL,
     metadata JSONB DEFAULT '{}',
     token_count INTEGER,
+    -- Full-text representation for keyword and hybrid search
+    content_tsv tsvector GENERATED ALWAYS AS (to_tsvector('english', content)) STORED,
     created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
 );
 
+-- Starting point for an empty table; after ingestion the index is retuned
+-- for the chunk count (ivfflat with lists ~ sqrt(rows), HNSW for large
+-- tables) by `python -m utils.vector_index`
 CREATE INDEX idx_chunks_embedding ON chunks USING ivfflat (embedding vector_cosine_ops) WITH (lists = 1);
 CREATE INDEX idx_chunks_document_id ON chunks (document_id);
 CREATE INDEX idx_chunks_chunk_index ON chunks (document_id, chunk_index);
+CREATE INDEX idx_chunks_content_tsv ON chunks USING GIN (content_tsv);
+-- Incremental refresh of the in-process vector index (utils/local_index.py)
+CREATE INDEX idx_chunks_created_at ON chunks (created_at);
+
+-- MinHash signatures for near-duplicate detection (ingest --near-duplicates)
+CREATE TABLE document_signatures (
+    document_id UUID PRIMARY KEY REFERENCES documents(id) ON DELETE CASCADE,
+    signature BYTEA NOT NULL
+);
+
+-- Semantic answer cache of the agents (utils/answer_cache.py). Entries are
+-- deleted by triggers when any chunk in chunk_ids changes or is removed
+CREATE TABLE answer_cache (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    query TEXT NOT NULL,
+    query_embedding vector(1536) NOT NULL,
+    embedding_model TEXT NOT NULL,
+    chunk_ids UUID[] NOT NULL,
+    answer TEXT NOT NULL,
+    hits INTEGER DEFAULT 0,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX idx_answer_cache_embedding ON answer_cache USING hnsw (query_embedding vector_cosine_ops);
+CREATE INDEX idx_answer_cache_chunk_ids ON answer_cache USING GIN (chunk_ids);
+
+DROP FUNCTION IF EXISTS match_chunks(vector, INT);
 
+-- ef_search (HNSW) and probes (ivfflat) trade recall for speed per query;
+-- NULL keeps the server setting
 CREATE OR REPLACE FUNCTION match_chunks(
     query_embedding vector(1536),
-    match_count INT DEFAULT 10
+    match_count INT DEFAULT 10,
+    ef_search INT DEFAULT NULL,
+    probes INT DEFAULT NULL
 )
 RETURNS TABLE (
     chunk_id UUID,
@@ -51,6 +94,14 @@ RETURNS TABLE (
 LANGUAGE plpgsql
 AS $$
 BEGIN
+    -- Transaction-local, so the settings only apply to this search
+    IF ef_search IS NOT NULL THEN
+        PERFORM set_config('hnsw.ef_search', ef_search::text, true);
+    END IF;
+    IF probes IS NOT NULL THEN
+        PERFORM set_config('ivfflat.probes', probes::text, true);
+    END IF;
+
     RETURN QUERY
     SELECT 
         c.id AS chunk_id,
@@ -68,6 +119,326 @@ BEGIN
 END;
 $$;
 
+-- Document filter shared by the filtered search functions. Keys of doc_filter
+-- (all optional):
+--   metadata         JSONB object the document metadata must contain (GIN)
+--   source, title    case-insensitive substring of the source path / title
+--   file_types       JSON array of lowercase file extensions, e.g. ["pdf"]
+--   ingested_after   timestamp, documents ingested at or after it
+--   ingested_before  timestamp, documents ingested before it
+-- Written as a single SQL expression so the planner inlines it and can use
+-- idx_documents_metadata and idx_documents_created_at
+CREATE OR REPLACE FUNCTION document_matches_filter(
+    doc_metadata JSONB,
+    doc_title TEXT,
+    doc_source TEXT,
+    doc_created_at TIMESTAMP WITH TIME ZONE,
+    doc_filter JSONB
+)
+RETURNS BOOLEAN
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT doc_metadata @> COALESCE(doc_filter->'metadata', '{}'::jsonb)
+        AND (doc_filter->>'source' IS NULL OR doc_source ILIKE '%' || (doc_filter->>'source') || '%')
+        AND (doc_filter->>'title' IS NULL OR doc_title ILIKE '%' || (doc_filter->>'title') || '%')
+        AND (doc_filter->'file_types' IS NULL
+             OR (doc_filter->'file_types') ? lower(substring(doc_source FROM '\.([^./\\]+)$')))
+        AND (doc_filter->>'ingested_after' IS NULL
+             OR doc_created_at >= (doc_filter->>'ingested_after')::timestamptz)
+        AND (doc_filter->>'ingested_before' IS NULL
+             OR doc_created_at < (doc_filter->>'ingested_before')::timestamptz)
+$$;
+
+-- Vector search restricted to documents matching doc_filter. Filtering after
+-- an approximate index scan would drop most of its k results, so:
+-- - scopes of at most exact_scan_limit chunks are searched exactly, reaching
+--   them through the document filter and idx_chunks_document_id
+-- - larger scopes use the vector index, over-fetching candidates (and raising
+--   ef_search / probes) by the fraction of documents the filter excludes
+CREATE OR REPLACE FUNCTION filtered_match_chunks(
+    query_embedding vector(1536),
+    doc_filter JSONB DEFAULT '{}',
+    match_count INT DEFAULT 10,
+    ef_search INT DEFAULT NULL,
+    probes INT DEFAULT NULL,
+    exact_scan_limit INT DEFAULT 20000
+)
+RETURNS TABLE (
+    chunk_id UUID,
+    document_id UUID,
+    content TEXT,
+    similarity FLOAT,
+    metadata JSONB,
+    document_title TEXT,
+    document_source TEXT
+)
+LANGUAGE plpgsql
+AS $$
+#variable_conflict use_column
+DECLARE
+    scoped_chunks BIGINT;
+    matching_documents BIGINT;
+    total_documents BIGINT;
+    overfetch INT;
+    candidate_count INT;
+BEGIN
+    IF doc_filter IS NULL OR doc_filter = '{}'::jsonb THEN
+        RETURN QUERY SELECT * FROM match_chunks(query_embedding, match_count, ef_search, probes);
+        RETURN;
+    END IF;
+
+    -- Bounded count: only needs to know whether the scope is small
+    SELECT count(*) INTO scoped_chunks
+    FROM (
+        SELECT 1
+        FROM documents d
+        JOIN chunks c ON c.document_id = d.id
+        WHERE document_matches_filter(d.metadata, d.title, d.source, d.created_at, doc_filter)
+            AND c.embedding IS NOT NULL
+        LIMIT exact_scan_limit + 1
+    ) s;
+
+    IF scoped_chunks <= exact_scan_limit THEN
+        RETURN QUERY
+        WITH scoped AS MATERIALIZED (
+            SELECT
+                c.id,
+                c.document_id,
+                c.content,
+                c.embedding <=> query_embedding AS distance,
+                c.metadata,
+                d.title,
+                d.source
+            FROM documents d
+            JOIN chunks c ON c.document_id = d.id
+            WHERE document_matches_filter(d.metadata, d.title, d.source, d.created_at, doc_filter)
+                AND c.embedding IS NOT NULL
+        )
+        SELECT
+            s.id AS chunk_id,
+            s.document_id,
+            s.content,
+            (1 - s.distance)::FLOAT AS similarity,
+            s.metadata,
+            s.title AS document_title,
+            s.source AS document_source
+        FROM scoped s
+        ORDER BY s.distance
+        LIMIT match_count;
+        RETURN;
+    END IF;
+
+    SELECT
+        count(*) FILTER (WHERE document_matches_filter(d.metadata, d.title, d.source, d.created_at, doc_filter)),
+        count(*)
+    INTO matching_documents, total_documents
+    FROM documents d;
+
+    overfetch := CEIL(total_documents::FLOAT / GREATEST(matching_documents, 1));
+    candidate_count := LEAST(match_count::BIGINT * overfetch * 2, 10000);
+
+    -- Index scans return at most ef_search (HNSW) rows, or the rows of the
+    -- probed lists (ivfflat). Both are capped at pgvector's maximum, so with
+    -- HNSW a very selective filter can return fewer than match_count rows
+    -- once candidate_count exceeds 1000.
+    PERFORM set_config('hnsw.ef_search', LEAST(GREATEST(candidate_count, COALESCE(ef_search, 40)), 1000)::text, true);
+    PERFORM set_config('ivfflat.probes', LEAST(COALESCE(probes, 1)::BIGINT * overfetch, 32768)::text, true);
+
+    RETURN QUERY
+    SELECT
+        v.id AS chunk_id,
+        v.document_id,
+        v.content,
+        (1 - v.distance)::FLOAT AS similarity,
+        v.metadata,
+        d.title AS document_title,
+        d.source AS document_source
+    FROM (
+        SELECT c.id, c.document_id, c.content, c.metadata, c.embedding <=> query_embedding AS distance
+        FROM chunks c
+        WHERE c.embedding IS NOT NULL
+        ORDER BY c.embedding <=> query_embedding
+        LIMIT candidate_count
+    ) v
+    JOIN documents d ON v.document_id = d.id
+    WHERE document_matches_filter(d.metadata, d.title, d.source, d.created_at, doc_filter)
+    ORDER BY v.distance
+    LIMIT match_count;
+END;
+$$;
+
+DROP FUNCTION IF EXISTS hybrid_match_chunks(vector, TEXT, INT, INT, INT, INT);
+
+-- Hybrid search: the top candidates of vector search and of full-text search
+-- (ts_rank_cd) are fused with reciprocal-rank fusion, score = sum of
+-- 1 / (rrf_k + rank) over both lists, so exact-term matches such as product
+-- names and SKUs surface even when their embeddings are not the closest.
+-- doc_filter restricts both lists (see document_matches_filter)
+CREATE OR REPLACE FUNCTION hybrid_match_chunks(
+    query_embedding vector(1536),
+    query_text TEXT,
+    match_count INT DEFAULT 10,
+    rrf_k INT DEFAULT 60,
+    ef_search INT DEFAULT NULL,
+    probes INT DEFAULT NULL,
+    doc_filter JSONB DEFAULT '{}'
+)
+RETURNS TABLE (
+    chunk_id UUID,
+    document_id UUID,
+    content TEXT,
+    similarity FLOAT,
+    text_rank FLOAT,
+    score FLOAT,
+    metadata JSONB,
+    document_title TEXT,
+    document_source TEXT
+)
+LANGUAGE plpgsql
+AS $$
+#variable_conflict use_column
+DECLARE
+    candidate_count INT := GREATEST(match_count * 4, 20);
+BEGIN
+    RETURN QUERY
+    WITH semantic AS (
+        SELECT v.chunk_id AS id, ROW_NUMBER() OVER (ORDER BY v.similarity DESC) AS rank_ix
+        FROM filtered_match_chunks(query_embedding, doc_filter, candidate_count, ef_search, probes) v
+    ),
+    keyword AS (
+        SELECT t.id, t.text_rank, ROW_NUMBER() OVER (ORDER BY t.text_rank DESC) AS rank_ix
+        FROM (
+            SELECT c.id, ts_rank_cd(c.content_tsv, q.query) AS text_rank
+            FROM chunks c
+            JOIN documents d ON c.document_id = d.id,
+            websearch_to_tsquery('english', query_text) AS q(query)
+            WHERE c.content_tsv @@ q.query
+                AND document_matches_filter(d.metadata, d.title, d.source, d.created_at, doc_filter)
+            ORDER BY ts_rank_cd(c.content_tsv, q.query) DESC
+            LIMIT candidate_count
+        ) t
+    ),
+    fused AS (
+        SELECT
+            COALESCE(s.id, k.id) AS id,
+            k.text_rank,
+            COALESCE(1.0 / (rrf_k + s.rank_ix), 0) + COALESCE(1.0 / (rrf_k + k.rank_ix), 0) AS score
+        FROM semantic s
+        FULL OUTER JOIN keyword k ON s.id = k.id
+    )
+    SELECT
+        c.id AS chunk_id,
+        c.document_id,
+        c.content,
+        (1 - (c.embedding <=> query_embedding))::FLOAT AS similarity,
+        f.text_rank::FLOAT,
+        f.score::FLOAT,
+        c.metadata,
+        d.title AS document_title,
+        d.source AS document_source
+    FROM fused f
+    JOIN chunks c ON c.id = f.id
+    JOIN documents d ON c.document_id = d.id
+    ORDER BY f.score DESC
+    LIMIT match_count;
+END;
+$$;
+
+-- Several related searches in one round trip: each query (embedding and
+-- text at the same position) gets its top match_count chunks from the
+-- search_type function; a chunk found by several queries is returned once,
+-- under the query that scored it highest, with all of them in matched_queries
+CREATE OR REPLACE FUNCTION multi_match_chunks(
+    query_embeddings vector(1536)[],
+    query_texts TEXT[],
+    match_count INT DEFAULT 5,
+    search_type TEXT DEFAULT 'hybrid',
+    rrf_k INT DEFAULT 60,
+    ef_search INT DEFAULT NULL,
+    probes INT DEFAULT NULL,
+    doc_filter JSONB DEFAULT '{}'
+)
+RETURNS TABLE (
+    query_index INT,
+    matched_queries INT[],
+    chunk_id UUID,
+    document_id UUID,
+    content TEXT,
+    similarity FLOAT,
+    score FLOAT,
+    metadata JSONB,
+    document_title TEXT,
+    document_source TEXT
+)
+LANGUAGE sql
+AS $$
+    WITH queries AS (
+        -- 1-based positions; embeddings may be NULL for keyword search
+        SELECT q.embedding, q.query_text, q.query_position::INT AS query_position
+        FROM unnest(query_embeddings, query_texts) WITH ORDINALITY AS q(embedding, query_text, query_position)
+    ),
+    matches AS (
+        SELECT q.query_position, m.chunk_id, m.document_id, m.content, m.similarity, m.similarity AS score,
+               m.metadata, m.document_title, m.document_source
+        FROM queries q
+        CROSS JOIN LATERAL filtered_match_chunks(q.embedding, doc_filter, match_count, ef_search, probes) m
+        WHERE search_type = 'semantic'
+
+        UNION ALL
+
+        SELECT q.query_position, m.chunk_id, m.document_id, m.content, m.similarity, m.score,
+               m.metadata, m.document_title, m.document_source
+        FROM queries q
+        CROSS JOIN LATERAL hybrid_match_chunks(
+            q.embedding, q.query_text, match_count, rrf_k, ef_search, probes, doc_filter
+        ) m
+        WHERE search_type = 'hybrid'
+
+        UNION ALL
+
+        SELECT q.query_position, k.id, k.document_id, k.content, NULL::FLOAT, k.text_rank,
+               k.metadata, k.title, k.source
+        FROM queries q
+        CROSS JOIN LATERAL (
+            SELECT c.id, c.document_id, c.content, c.metadata, d.title, d.source,
+                   ts_rank_cd(c.content_tsv, t.query)::FLOAT AS text_rank
+            FROM chunks c
+            JOIN documents d ON c.document_id = d.id,
+            websearch_to_tsquery('english', q.query_text) AS t(query)
+            WHERE c.content_tsv @@ t.query
+                AND document_matches_filter(d.metadata, d.title, d.source, d.created_at, doc_filter)
+            ORDER BY text_rank DESC
+            LIMIT match_count
+        ) k
+        WHERE search_type = 'keyword'
+    ),
+    best AS (
+        SELECT DISTINCT ON (m.chunk_id) m.*
+        FROM matches m
+        ORDER BY m.chunk_id, m.score DESC NULLS LAST, m.query_position
+    ),
+    matched AS (
+        SELECT m.chunk_id, array_agg(m.query_position ORDER BY m.query_position) AS query_positions
+        FROM matches m
+        GROUP BY m.chunk_id
+    )
+    SELECT
+        b.query_position,
+        a.query_positions,
+        b.chunk_id,
+        b.document_id,
+        b.content,
+        b.similarity,
+        b.score,
+        b.metadata,
+        b.document_title,
+        b.document_source
+    FROM best b
+    JOIN matched a ON a.chunk_id = b.chunk_id
+    ORDER BY b.query_position, b.score DESC NULLS LAST;
+$$;
+
 CREATE OR REPLACE FUNCTION update_updated_at_column()
 RETURNS TRIGGER AS $$
 BEGIN
@@ -77,4 +448,29 @@ END;
 $$ LANGUAGE plpgsql;
 
 CREATE TRIGGER update_documents_updated_at BEFORE UPDATE ON documents
-    FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
\ No newline at end of file
+    FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
+
+CREATE OR REPLACE FUNCTION invalidate_answer_cache()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'TRUNCATE' THEN
+        DELETE FROM answer_cache;
+    ELSE
+        DELETE FROM answer_cache a
+        WHERE a.chunk_ids && ARRAY(SELECT o.id FROM old_chunks o);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Re-ingestion deletes a document's chunks (directly or by cascade)
+CREATE TRIGGER invalidate_answer_cache_on_chunk_delete AFTER DELETE ON chunks
+    REFERENCING OLD TABLE AS old_chunks
+    FOR EACH STATEMENT EXECUTE FUNCTION invalidate_answer_cache();
+
+CREATE TRIGGER invalidate_answer_cache_on_chunk_update AFTER UPDATE ON chunks
+    REFERENCING OLD TABLE AS old_chunks
+    FOR EACH STATEMENT EXECUTE FUNCTION invalidate_answer_cache();
+
+CREATE TRIGGER invalidate_answer_cache_on_chunk_truncate AFTER TRUNCATE ON chunks
+    FOR EACH STATEMENT EXECUTE FUNCTION invalidate_answer_cache();
@@ -0,0 +1,8 @@
+"""Shared test setup."""
+
+import os
+
+# ingestion.embedder creates the embeddings client and utils.db_utils the
+# connection pool object at import; tests never connect with them
+os.environ.setdefault("OPENAI_API_KEY", "test")
+os.environ.setdefault("DATABASE_URL", "postgresql://localhost/test")
@@ -0,0 +1,213 @@
+"""Tests for the semantic answer cache."""
+
+import asyncio
+
+import pytest
+from pydantic_ai import Agent
+from pydantic_ai.messages import ModelRequest, ModelResponse, TextPart, ToolReturnPart
+from pydantic_ai.models.function import DeltaToolCall, FunctionModel
+
+from ingestion import embedder
+from utils.answer_cache import (
+    AnswerCache,
+    CachedAnswer,
+    cached_exchange,
+    record_retrieved_chunks,
+    seed_instructions,
+)
+
+SEED = CachedAnswer(id="1", query="What is the fund size?", answer="$50M", chunk_ids=["c1"], similarity=0.9)
+
+
+class FakeConnection:
+    """Answers the cache's queries from a single stored row."""
+
+    def __init__(self, row=None, existing_chunks=None):
+        self.row = row
+        self.existing_chunks = existing_chunks
+        self.executed = []
+
+    async def fetchrow(self, sql, *args):
+        return self.row
+
+    async def fetchval(self, sql, chunk_ids):
+        # FOR KEY SHARE check of the chunks an answer was built on
+        return len(chunk_ids) if self.existing_chunks is None else self.existing_chunks
+
+    async def execute(self, sql, *args):
+        self.executed.append((" ".join(sql.split()), args))
+
+    def transaction(self):
+        return FakeTransaction()
+
+    def acquire(self):
+        return FakeAcquire(self)
+
+
+class FakeTransaction:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class FakeAcquire:
+    def __init__(self, conn):
+        self.conn = conn
+
+    async def __aenter__(self):
+        return self.conn
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+def cache_row(similarity):
+    return {"id": "1", "query": "What is the fund size?", "answer": "$50M", "chunk_ids": ["c1"], "similarity": similarity}
+
+
+def test_track_collects_chunks_and_seeds_the_run():
+    cache = AnswerCache()
+    record_retrieved_chunks(["ignored"])
+    assert seed_instructions() == ""
+
+    with cache.track(seed=SEED) as retrieved:
+        record_retrieved_chunks(["c1", "c2"])
+        record_retrieved_chunks(["c2"])
+        instructions = seed_instructions()
+
+    assert retrieved == {"c1", "c2"}
+    assert "Earlier question: What is the fund size?" in instructions
+    assert instructions.endswith("$50M")
+    assert seed_instructions() == ""
+
+
+def test_track_is_isolated_between_concurrent_runs():
+    cache = AnswerCache()
+
+    async def run(chunk_id):
+        with cache.track() as retrieved:
+            await asyncio.sleep(0)
+            record_retrieved_chunks([chunk_id])
+            await asyncio.sleep(0)
+        return retrieved
+
+    async def main():
+        return await asyncio.gather(run("a"), run("b"))
+
+    assert asyncio.run(main()) == [{"a"}, {"b"}]
+
+
+def test_cached_exchange():
+    messages = cached_exchange("You are helpful.", "What is the fund size?", "$50M")
+
+    assert [part.content for part in messages[0].parts] == ["You are helpful.", "What is the fund size?"]
+    assert messages[1].parts[0].content == "$50M"
+
+
+@pytest.mark.parametrize(
+    "similarity, expected, stats",
+    [
+        (0.97, "hit", {"hits": 1, "seeded": 0, "misses": 0}),
+        (0.95, "hit", {"hits": 1, "seeded": 0, "misses": 0}),
+        (0.90, "seed", {"hits": 0, "seeded": 1, "misses": 0}),
+        (0.80, None, {"hits": 0, "seeded": 0, "misses": 1}),
+    ],
+)
+def test_lookup_thresholds(similarity, expected, stats):
+    cache = AnswerCache(threshold=0.95, seed_threshold=0.88)
+    conn = FakeConnection(cache_row(similarity))
+
+    cached = asyncio.run(cache.lookup(conn, [1.0, 0.0], "model"))
+
+    if expected is None:
+        assert cached is None
+    else:
+        assert cached.answer == "$50M"
+        assert cache.is_hit(cached) == (expected == "hit")
+    assert {key: cache.stats[key] for key in stats} == stats
+    # Only hits are counted in the table
+    assert len(conn.executed) == (1 if expected == "hit" else 0)
+
+
+def test_lookup_without_seeding_or_when_disabled():
+    conn = FakeConnection(cache_row(0.9))
+
+    assert asyncio.run(AnswerCache(seed_threshold=None).lookup(conn, [1.0], "model")) is None
+    assert asyncio.run(AnswerCache(enabled=False).lookup(conn, [1.0], "model")) is None
+    with pytest.raises(ValueError):
+        AnswerCache(threshold=0.9, seed_threshold=0.95)
+
+
+def test_store_requires_chunks_that_still_exist():
+    cache = AnswerCache()
+
+    assert not asyncio.run(cache.store(FakeConnection(), "q", [1.0], "model", [], "answer"))
+    assert not asyncio.run(cache.store(FakeConnection(), "q", [1.0], "model", ["c1"], "  "))
+
+    changed = FakeConnection(existing_chunks=1)
+    assert not asyncio.run(cache.store(changed, "q", [1.0], "model", ["c1", "c2"], "answer"))
+    assert changed.executed == []
+
+    conn = FakeConnection()
+    assert asyncio.run(cache.store(conn, "q", [1.0], "model", ["c2", "c1", "c2"], "answer"))
+    sql, args = conn.executed[0]
+    assert sql.startswith("INSERT INTO answer_cache")
+    assert args[3] == ["c1", "c2"]
+
+
+class FakeQueryEmbedder:
+    generator = type("Generator", (), {"cache_model": "model"})()
+
+    async def embed(self, query):
+        return [1.0, 0.0]
+
+
+def make_agent():
+    """Agent that searches once, then answers with the seed instructions it was given."""
+
+    def search(query: str) -> str:
+        """Search the knowledge base."""
+        record_retrieved_chunks(["c7"])
+        return "The fund size is $60M."
+
+    async def stream(messages, info):
+        if isinstance(messages[-1], ModelRequest) and isinstance(messages[-1].parts[-1], ToolReturnPart):
+            yield "Seeded. " if seed_instructions() else "Fresh. "
+            yield "$60M"
+        else:
+            yield {0: DeltaToolCall(name="search", json_args='{"query": "fund size"}')}
+
+    return Agent(FunctionModel(stream_function=stream), instructions=seed_instructions, tools=[search])
+
+
+@pytest.mark.parametrize(
+    "similarity, history, expected_answer, stored",
+    [
+        (0.97, [], "$50M", False),
+        (0.90, [], "Seeded. $60M", True),
+        (0.80, [], "Fresh. $60M", True),
+        (0.97, [ModelResponse(parts=[TextPart(content="Earlier turn")])], "Fresh. $60M", False),
+    ],
+)
+def test_run_with_answer_cache(monkeypatch, similarity, history, expected_answer, stored):
+    monkeypatch.setattr(embedder, "get_query_embedder", lambda: FakeQueryEmbedder())
+    cache = AnswerCache(threshold=0.95, seed_threshold=0.88)
+    conn = FakeConnection(cache_row(similarity))
+    streamed = []
+
+    response = asyncio.run(cache.run_with_answer_cache(
+        make_agent(), conn, "What is the fund size?", history, "You are helpful.", on_text=streamed.append
+    ))
+
+    assert response.answer == expected_answer
+    assert "".join(streamed) == expected_answer
+    assert response.from_cache == (expected_answer == "$50M")
+    assert response.messages[-1].parts[0].content.endswith("$60M" if stored or history else "$50M")
+
+    inserts = [args for sql, args in conn.executed if sql.startswith("INSERT")]
+    assert len(inserts) == int(stored)
+    if stored:
+        assert inserts[0][3] == ["c7"]
+        assert inserts[0][4] == expected_answer
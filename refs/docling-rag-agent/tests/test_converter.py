@@ -0,0 +1,52 @@
+"""Tests for recovering the conversion pool after a worker dies."""
+
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from ingestion import converter
+from ingestion.converter import DoclingConversionPool
+
+
+class RecordingExecutor(ThreadPoolExecutor):
+    def __init__(self):
+        super().__init__(max_workers=2)
+        self.shutdowns = []
+
+    def shutdown(self, wait=True, **kwargs):
+        self.shutdowns.append(wait)
+        super().shutdown(wait=False, **kwargs)
+
+
+def test_broken_pool_is_only_replaced_by_its_first_failure(monkeypatch):
+    release_second = threading.Event()
+
+    def dead_worker(file_path):
+        if file_path == "second.pdf":
+            release_second.wait(timeout=5)
+        raise BrokenProcessPool("worker died")
+
+    monkeypatch.setattr(converter, "convert_document", dead_worker)
+    pool = DoclingConversionPool(max_workers=2)
+    broken = pool._executor = RecordingExecutor()
+    replacement = RecordingExecutor()
+
+    async def main():
+        second = asyncio.ensure_future(pool.convert("second.pdf"))
+        first = asyncio.ensure_future(pool.convert("first.pdf"))
+        await asyncio.gather(first, return_exceptions=True)
+
+        # A later file has already started a fresh pool when the second failure arrives
+        assert pool._executor is None
+        pool._executor = replacement
+        release_second.set()
+        return await asyncio.gather(first, second, return_exceptions=True)
+
+    results = asyncio.run(main())
+
+    assert all(isinstance(result, BrokenProcessPool) for result in results)
+    assert broken.shutdowns == [False]
+    assert replacement.shutdowns == []
+    assert pool._executor is replacement
+    replacement.shutdown()
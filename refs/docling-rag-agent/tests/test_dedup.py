@@ -0,0 +1,71 @@
+"""Tests for chunk deduplication before embedding."""
+
+from ingestion.chunker import DocumentChunk
+from ingestion.dedup import ChunkDeduplicator, content_key
+
+
+def make_item(content: str):
+    return ("document", DocumentChunk(content=content, index=0, start_char=0, end_char=len(content), metadata={}))
+
+
+def embed(item, vector=(1.0, 0.0)):
+    chunk = item[1]
+    chunk.embedding = list(vector)
+    chunk.metadata["embedding_model"] = "test-model"
+    return chunk
+
+
+def test_content_key_ignores_whitespace():
+    assert content_key("Terms  and\nconditions") == content_key(" Terms and conditions ")
+    assert content_key("Terms and conditions") != content_key("terms and conditions")
+
+
+def test_routes_first_copy_to_embedder_and_later_copies_wait():
+    deduplicator = ChunkDeduplicator()
+    first, second = make_item("Disclaimer"), make_item("Disclaimer  ")
+
+    assert deduplicator.route(first) == ChunkDeduplicator.EMBED
+    assert deduplicator.route(second) == ChunkDeduplicator.WAITING
+
+    waiting = deduplicator.resolve(embed(first))
+
+    assert waiting == [second]
+    assert second[1].embedding == [1.0, 0.0]
+    assert second[1].metadata["embedding_model"] == "test-model"
+    assert second[1].metadata["duplicate_content"] is True
+
+
+def test_shares_cached_embedding():
+    deduplicator = ChunkDeduplicator()
+    first = make_item("Disclaimer")
+    deduplicator.route(first)
+    deduplicator.resolve(embed(first))
+
+    later = make_item("Disclaimer")
+    assert deduplicator.route(later) == ChunkDeduplicator.SHARED
+    assert list(later[1].embedding) == [1.0, 0.0]
+    assert later[1].metadata["chunk_hash"] == first[1].metadata["chunk_hash"]
+    assert "content_hash" not in later[1].metadata
+
+
+def test_failed_embedding_is_retried_by_next_copy():
+    deduplicator = ChunkDeduplicator()
+    first, waiting = make_item("Disclaimer"), make_item("Disclaimer")
+    deduplicator.route(first)
+    deduplicator.route(waiting)
+
+    assert deduplicator.resolve(first[1]) == [waiting]
+    assert waiting[1].embedding is None
+    assert deduplicator.route(make_item("Disclaimer")) == ChunkDeduplicator.EMBED
+
+
+def test_keeps_metadata_of_cached_texts_when_pruning():
+    deduplicator = ChunkDeduplicator(cache_size=1)
+    for text in ("a", "b", "c"):
+        item = make_item(text)
+        deduplicator.route(item)
+        deduplicator.resolve(embed(item))
+
+    later = make_item("c")
+    assert deduplicator.route(later) == ChunkDeduplicator.SHARED
+    assert later[1].metadata["embedding_model"] == "test-model"
@@ -0,0 +1,187 @@
+"""Tests for the embedding generator and cache."""
+
+import asyncio
+
+import numpy as np
+import pytest
+
+from ingestion import embedder as embedder_module
+from ingestion.embedder import EmbeddingCache, EmbeddingGenerator, QueryEmbedder
+from ingestion.rate_limiter import RateLimiter
+
+
+def test_cache_evicts_least_recently_used():
+    cache = EmbeddingCache(max_size=2)
+    cache.put("a", [1.0])
+    cache.put("b", [2.0])
+    assert cache.get("a") is not None  # "b" is now least recently used
+    cache.put("c", [3.0])
+
+    assert cache.get("b") is None
+    assert cache.get("a").tolist() == [1.0]
+    assert cache.get("c").tolist() == [3.0]
+    assert cache.stats()["evictions"] == 1
+
+
+def test_cache_stores_float32_and_bounds_bytes():
+    cache = EmbeddingCache(max_size=10, max_bytes=16)
+    cache.put("a", [1.0, 2.0])
+    cache.put("b", [3.0, 4.0])
+    cache.put("c", [5.0, 6.0])
+
+    assert cache.get("a") is None
+    assert cache.get("b").dtype == np.float32
+    assert cache.stats()["bytes"] == 16
+
+
+def test_cache_replacing_an_entry_keeps_byte_count():
+    cache = EmbeddingCache(max_size=10)
+    cache.put("a", [1.0, 2.0])
+    cache.put("a", [3.0, 4.0])
+
+    assert cache.stats()["bytes"] == 8
+    assert cache.get("a").tolist() == [3.0, 4.0]
+
+
+def test_cache_counts_hits_and_misses():
+    cache = EmbeddingCache()
+    cache.put("a", [1.0])
+    cache.get("a")
+    cache.get("b")
+
+    assert "a" in cache
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"]) == (1, 1)
+
+
+def make_generator(**kwargs) -> EmbeddingGenerator:
+    return EmbeddingGenerator(
+        model="text-embedding-3-small",
+        dimensions=None,
+        retry_delay=0,
+        limiter=RateLimiter.unlimited(4),
+        **kwargs
+    )
+
+
+@pytest.mark.parametrize(
+    "token_counts, expected",
+    [
+        ([40, 40, 40], [[0, 1], [2]]),
+        ([100, 10, 90], [[0], [1, 2]]),
+        ([150, 10], [[0], [1]]),
+        ([1, 1, 1, 1, 1], [[0, 1, 2], [3, 4]]),
+        ([], []),
+    ],
+)
+def test_pack_batches_respects_token_and_input_limits(token_counts, expected):
+    generator = make_generator(batch_size=3, max_batch_tokens=100)
+    assert generator._pack_batches(token_counts) == expected
+
+
+def test_bisection_isolates_failing_inputs():
+    generator = make_generator()
+    requests = []
+
+    async def fake_request(texts):
+        requests.append(list(texts))
+        if "bad" in texts:
+            raise ValueError("invalid input")
+        return [[float(len(text))] for text in texts]
+
+    generator._request = fake_request
+    texts = ["a", "bb", "bad", "dddd", "eeeee", "ffffff", "ggggggg", "hhhhhhhh"]
+
+    embeddings = asyncio.run(generator._bisect_failed_batch(texts))
+
+    assert embeddings == [[1.0], [2.0], None, [4.0], [5.0], [6.0], [7.0], [8.0]]
+    # One failing input costs about log2(n) requests per level, not one per text
+    assert len(requests) == 6
+
+
+def test_tokenizer_is_loaded_only_to_split_texts(monkeypatch):
+    loads = []
+    monkeypatch.setattr(embedder_module, "get_tokenizer", lambda model: loads.append(model))
+    generator = make_generator()
+
+    async def fake_request(texts):
+        return [[1.0] for _ in texts]
+
+    generator._request = fake_request
+    asyncio.run(generator.generate_embedding("what did the fund return?"))
+    asyncio.run(generator.generate_embeddings_batch(["carry", "hurdle rate"]))
+    assert loads == []
+
+    pieces = generator._split_for_model("word " * 10000)
+    assert loads == ["text-embedding-3-small"]
+    assert len(pieces) > 1
+    generator._split_for_model("word")
+    assert len(loads) == 1
+
+
+class BlockingGenerator:
+    """Query embedding backend whose first request hangs until it is cancelled."""
+
+    def __init__(self):
+        self.calls = 0
+        self.started = asyncio.Event()
+
+    async def _embed(self, text):
+        self.calls += 1
+        if self.calls == 1:
+            self.started.set()
+            await asyncio.Event().wait()
+        return [float(len(text)), 1.0]
+
+    async def generate_embedding(self, text):
+        return await self._embed(text)
+
+    async def generate_embeddings_batch(self, texts):
+        return [await self._embed(text) for text in texts]
+
+
+@pytest.mark.parametrize("waiter", ["embed", "embed_many"])
+def test_waiters_survive_cancelled_query_request(waiter):
+    generator = BlockingGenerator()
+    embedder = QueryEmbedder(generator=generator)
+
+    async def run():
+        owner = asyncio.create_task(embedder.embed("Series A terms"))
+        await generator.started.wait()
+        if waiter == "embed":
+            waiting = asyncio.create_task(embedder.embed("series a  terms"))
+        else:
+            waiting = asyncio.create_task(embedder.embed_many(["series a terms"]))
+        await asyncio.sleep(0)
+
+        owner.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await owner
+        return await asyncio.wait_for(waiting, timeout=1)
+
+    result = asyncio.run(run())
+
+    embedding = result if waiter == "embed" else result[0]
+    assert embedding.tolist() == [14.0, 1.0]
+    assert generator.calls == 2
+    assert not embedder._pending
+
+
+def test_cancelled_batch_request_releases_waiters():
+    generator = BlockingGenerator()
+    embedder = QueryEmbedder(generator=generator)
+
+    async def run():
+        owner = asyncio.create_task(embedder.embed_many(["fund size", "carry"]))
+        await generator.started.wait()
+        waiting = asyncio.create_task(embedder.embed("carry"))
+        await asyncio.sleep(0)
+
+        owner.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await owner
+        return await asyncio.wait_for(waiting, timeout=1)
+
+    assert asyncio.run(run()).tolist() == [5.0, 1.0]
+    assert not embedder._pending
+
@@ -0,0 +1,104 @@
+"""Tests for the persistent SQLite embedding cache."""
+
+import asyncio
+import threading
+
+import numpy as np
+import pytest
+
+from ingestion.chunker import DocumentChunk
+from ingestion.embedder import EmbeddingGenerator
+from ingestion.embedding_store import PersistentEmbeddingCache
+from ingestion.rate_limiter import RateLimiter
+
+
+def test_round_trip_survives_reopening(tmp_path):
+    path = str(tmp_path / "cache" / "embeddings.sqlite3")
+    cache = PersistentEmbeddingCache(path)
+    cache.put_many("model", [("alpha", [0.1, 0.2, 0.3]), ("beta", np.array([1.0, -1.0, 0.5]))])
+    cache.close()
+
+    reopened = PersistentEmbeddingCache(path)
+    alpha, missing, beta, alpha_again = reopened.get_many("model", ["alpha", "gamma", "beta", "alpha"])
+
+    # Stored as float32, so values round-trip to float32 precision
+    assert alpha == pytest.approx([0.1, 0.2, 0.3], abs=1e-7)
+    assert missing is None
+    assert beta == [1.0, -1.0, 0.5]
+    assert alpha_again == alpha
+    assert reopened.get_many("model", []) == []
+    reopened.close()
+
+
+def test_entries_are_keyed_by_model(tmp_path):
+    cache = PersistentEmbeddingCache(str(tmp_path / "embeddings.sqlite3"))
+    cache.put_many("text-embedding-3-small", [("alpha", [1.0, 0.0])])
+    cache.put_many("text-embedding-3-small@256", [("alpha", [0.0, 1.0])])
+
+    assert cache.get_many("text-embedding-3-small", ["alpha"]) == [[1.0, 0.0]]
+    assert cache.get_many("text-embedding-3-small@256", ["alpha"]) == [[0.0, 1.0]]
+    assert cache.get_many("text-embedding-3-large", ["alpha"]) == [None]
+
+    # Re-embedding a text replaces its entry
+    cache.put_many("text-embedding-3-small", [("alpha", [0.5, 0.5])])
+    assert cache.get_many("text-embedding-3-small", ["alpha"]) == [[0.5, 0.5]]
+    cache.close()
+
+
+def make_generator(cache, dimensions=None):
+    generator = EmbeddingGenerator(
+        model="text-embedding-3-small",
+        dimensions=dimensions,
+        retry_delay=0,
+        limiter=RateLimiter.unlimited(4),
+        persistent_cache=cache
+    )
+    generator.requests = []
+
+    async def fake_request(texts):
+        generator.requests.append(list(texts))
+        return [[float(len(text)), 1.0] for text in texts]
+
+    generator._request = fake_request
+    return generator
+
+
+def make_chunks(texts):
+    return [
+        DocumentChunk(content=text, index=i, start_char=0, end_char=len(text), metadata={})
+        for i, text in enumerate(texts)
+    ]
+
+
+def test_embed_chunks_reuses_cached_embeddings_off_the_event_loop(tmp_path, monkeypatch):
+    cache = PersistentEmbeddingCache(str(tmp_path / "embeddings.sqlite3"))
+    event_loop_thread = threading.get_ident()
+    cache_threads = []
+    get_many, put_many = cache.get_many, cache.put_many
+
+    def recording(method):
+        def call(*args):
+            cache_threads.append(threading.get_ident())
+            return method(*args)
+        return call
+
+    monkeypatch.setattr(cache, "get_many", recording(get_many))
+    monkeypatch.setattr(cache, "put_many", recording(put_many))
+
+    first = make_generator(cache)
+    asyncio.run(first.embed_chunks(make_chunks(["one", "three"])))
+    assert first.requests == [["one", "three"]]
+
+    second = make_generator(cache)
+    chunks = asyncio.run(second.embed_chunks(make_chunks(["three", "fourth"])))
+    assert second.requests == [["fourth"]]
+    assert [chunk.embedding for chunk in chunks] == [[5.0, 1.0], [6.0, 1.0]]
+
+    # A different output size is a different cache model
+    shortened = make_generator(cache, dimensions=256)
+    asyncio.run(shortened.embed_chunks(make_chunks(["one"])))
+    assert shortened.requests == [["one"]]
+
+    assert len(cache_threads) == 6
+    assert event_loop_thread not in cache_threads
+    cache.close()
@@ -0,0 +1,116 @@
+"""Tests for the streaming ingestion pipeline, with stub convert/embed/write stages."""
+
+import asyncio
+from types import SimpleNamespace
+
+from ingestion.chunker import DocumentChunk
+from ingestion.ingest import DocumentIngestionPipeline
+from ingestion.rate_limiter import RateLimiter
+
+FILES = ["docs/a.md", "docs/b.md", "docs/c.md", "docs/d.md"]
+
+
+class StubEmbedder:
+    def __init__(self):
+        self.rate_limiter = RateLimiter.unlimited(max_concurrency=2)
+        self.batch_size = 1
+        self.max_batch_tokens = 1000
+        self.batches = []
+
+    async def embed_chunks(self, chunks):
+        self.batches.append([chunk.content for chunk in chunks])
+        if any("unembeddable" in chunk.content for chunk in chunks):
+            raise ValueError("embedding request rejected")
+        for chunk in chunks:
+            chunk.embedding = [1.0, 0.0]
+        return chunks
+
+
+def make_pipeline(concurrency=3):
+    """Pipeline with stub stages; only the queue plumbing of ingest_documents is real."""
+    pipeline = DocumentIngestionPipeline.__new__(DocumentIngestionPipeline)
+    pipeline.documents_folder = "docs"
+    pipeline.concurrency = concurrency
+    pipeline.chunk_queue_size = 8
+    pipeline.incremental = False
+    pipeline.clean_before_ingest = False
+    pipeline.tune_index = False
+    pipeline.deduplicator = None
+    pipeline.near_duplicates = None
+    pipeline.near_duplicate_index = None
+    pipeline.embedder = StubEmbedder()
+    pipeline._initialized = True
+    pipeline._find_document_files = lambda: list(FILES)
+    pipeline.chunked = []
+    pipeline.saved = []
+
+    async def convert(document):
+        # Later files convert faster, so documents finish out of order
+        await asyncio.sleep(0.01 * (len(FILES) - document.position))
+        if document.source == "b.md":
+            raise RuntimeError("conversion crashed")
+        document.title = document.source
+        document.content = "unembeddable text" if document.source == "c.md" else f"text of {document.source}"
+        return True
+
+    async def chunk(document):
+        pipeline.chunked.append(document.source)
+        return [
+            DocumentChunk(content=f"{document.content} #{i}", index=i, start_char=0, end_char=1, metadata={})
+            for i in range(2)
+        ]
+
+    async def save(title, source, content, chunks, metadata, replace_document_ids=None, signature=None):
+        pipeline.saved.append((source, [chunk.embedding for chunk in chunks], dict(metadata)))
+        return f"id-{source}"
+
+    pipeline._convert_document = convert
+    pipeline._chunk_document = chunk
+    pipeline._save_to_postgres = save
+    return pipeline
+
+
+def test_results_keep_discovery_order():
+    pipeline = make_pipeline()
+    progress = []
+
+    results = asyncio.run(pipeline.ingest_documents(lambda current, total: progress.append((current, total))))
+
+    assert [result.title for result in results] == ["a.md", "b.md", "c.md", "d.md"]
+    assert [result.document_id for result in results] == ["id-a.md", "", "id-c.md", "id-d.md"]
+    assert progress == [(1, 4), (2, 4), (3, 4), (4, 4)]
+
+
+def test_failed_conversion_leaves_the_pipeline_early():
+    pipeline = make_pipeline()
+
+    results = asyncio.run(pipeline.ingest_documents())
+
+    assert results[1].errors == ["conversion crashed"]
+    assert results[1].chunks_created == 0
+    assert "b.md" not in pipeline.chunked
+    assert "b.md" not in [source for source, _, _ in pipeline.saved]
+    assert results[0].errors == [] and results[3].errors == []
+
+
+def test_failed_embeddings_are_stored_without_vectors():
+    pipeline = make_pipeline()
+
+    results = asyncio.run(pipeline.ingest_documents())
+
+    saved = {source: (embeddings, metadata) for source, embeddings, metadata in pipeline.saved}
+    embeddings, metadata = saved["c.md"]
+    assert embeddings == [None, None]
+    assert metadata["embedding_incomplete"] is True
+    assert results[2].chunks_created == 2
+    assert "2 chunks could not be embedded" in results[2].errors[0]
+    assert saved["a.md"][0] == [[1.0, 0.0], [1.0, 0.0]]
+
+
+def test_single_document_at_a_time():
+    pipeline = make_pipeline(concurrency=1)
+
+    results = asyncio.run(pipeline.ingest_documents())
+
+    assert [result.title for result in results] == ["a.md", "b.md", "c.md", "d.md"]
+    assert len(pipeline.embedder.batches) == 6
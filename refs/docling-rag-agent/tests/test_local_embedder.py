@@ -0,0 +1,52 @@
+"""Tests for recovering the local embedding pool after a worker dies."""
+
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from ingestion import local_embedder
+from ingestion.local_embedder import LocalEmbeddingBackend
+
+
+class RecordingExecutor(ThreadPoolExecutor):
+    def __init__(self):
+        super().__init__(max_workers=2)
+        self.shutdowns = []
+
+    def shutdown(self, wait=True, **kwargs):
+        self.shutdowns.append(wait)
+        super().shutdown(wait=False, **kwargs)
+
+
+def test_broken_pool_is_only_replaced_by_its_first_failure(monkeypatch):
+    release_second = threading.Event()
+
+    def dead_worker(texts):
+        if texts == ["second"]:
+            release_second.wait(timeout=5)
+        raise BrokenProcessPool("worker died")
+
+    monkeypatch.setattr(local_embedder, "encode_texts", dead_worker)
+    backend = LocalEmbeddingBackend("local:model", max_workers=2)
+    broken = backend._executor = RecordingExecutor()
+    replacement = RecordingExecutor()
+
+    async def main():
+        second = asyncio.ensure_future(backend.embed(["second"]))
+        first = asyncio.ensure_future(backend.embed(["first"]))
+        await asyncio.gather(first, return_exceptions=True)
+
+        # A later batch has already started a fresh pool when the second failure arrives
+        assert backend._executor is None
+        backend._executor = replacement
+        release_second.set()
+        return await asyncio.gather(first, second, return_exceptions=True)
+
+    results = asyncio.run(main())
+
+    assert all(isinstance(result, BrokenProcessPool) for result in results)
+    assert broken.shutdowns == [False]
+    assert replacement.shutdowns == []
+    assert backend._executor is replacement
+    replacement.shutdown()
@@ -0,0 +1,192 @@
+"""Tests for the in-process vector index."""
+
+import asyncio
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from utils import local_index
+from utils.local_index import LocalVectorIndex, chunk_id_hash
+
+WATERMARK = datetime(2024, 6, 1, 12, 0)
+
+
+def chunk_row(chunk_id, embedding, created_at=WATERMARK):
+    return {
+        "chunk_id": chunk_id,
+        "document_id": f"doc-{chunk_id}",
+        "content": f"content of {chunk_id}",
+        "embedding": np.asarray(embedding, dtype=np.float32),
+        "metadata": {},
+        "created_at": created_at,
+        "document_title": "Title",
+        "document_source": "source.md",
+    }
+
+
+def clustered_rows(count, dimensions=16, clusters=20, seed=0):
+    generator = np.random.default_rng(seed)
+    centers = generator.normal(size=(clusters, dimensions))
+    vectors = centers[generator.integers(clusters, size=count)] + 0.05 * generator.normal(size=(count, dimensions))
+    return [chunk_row(f"c{i}", vector) for i, vector in enumerate(vectors)], centers
+
+
+def build_index(tmp_path, rows, **kwargs):
+    index = LocalVectorIndex("model", directory=str(tmp_path), **kwargs)
+    index._add_rows(rows)
+    index.rebuild()
+    index.ready = True
+    return index
+
+
+def result_ids(results):
+    return [result["chunk_id"] for result in results]
+
+
+def test_flat_search_is_exact(tmp_path):
+    rows, centers = clustered_rows(300)
+    index = build_index(tmp_path, rows)
+    assert index.centroids is None
+
+    query = centers[3]
+    results = index.search(query, limit=5)
+
+    vectors = np.stack([row["embedding"] for row in rows])
+    similarities = vectors @ query / np.linalg.norm(vectors, axis=1) / np.linalg.norm(query)
+    expected = [rows[i]["chunk_id"] for i in np.argsort(-similarities)[:5]]
+    assert result_ids(results) == expected
+    assert results[0]["score"] == pytest.approx(similarities.max(), abs=1e-5)
+    assert results[0]["content"] == f"content of {expected[0]}"
+
+
+def test_ivf_search_matches_flat_search(tmp_path, monkeypatch):
+    rows, centers = clustered_rows(900)
+    flat = build_index(tmp_path / "flat", rows)
+
+    monkeypatch.setattr(local_index, "IVF_MIN_ROWS", 500)
+    ivf = build_index(tmp_path / "ivf", rows)
+    assert len(ivf.centroids) == 30
+    assert ivf.offsets[-1] == 900
+    exhaustive = build_index(tmp_path / "exhaustive", rows, nprobe=30)
+
+    for query in centers[:5]:
+        expected = result_ids(flat.search(query, limit=10))
+        # Scanning every list is exact; the default nprobe finds the close cluster
+        assert result_ids(exhaustive.search(query, limit=10)) == expected
+        assert len(set(result_ids(ivf.search(query, limit=10))) & set(expected)) >= 8
+
+
+def test_search_before_load_and_snapshot_reload(tmp_path):
+    rows, centers = clustered_rows(50)
+    index = LocalVectorIndex("model", directory=str(tmp_path))
+    assert index.search(centers[0]) is None
+
+    built = build_index(tmp_path, rows)
+    reloaded = LocalVectorIndex("model", directory=str(tmp_path))
+    assert reloaded.load()
+    reloaded.ready = True
+    assert result_ids(reloaded.search(centers[0])) == result_ids(built.search(centers[0]))
+    assert reloaded.watermark == WATERMARK
+    assert not LocalVectorIndex("other-model", directory=str(tmp_path)).load()
+
+
+class FakeCursor:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for row in self.rows:
+            yield row
+
+
+class FakeTransaction:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class FakeChunksTable:
+    """Pool and connection over an in-memory chunks table."""
+
+    def __init__(self, rows):
+        self.rows = {row["chunk_id"]: row for row in rows}
+        self.queries = []
+
+    def acquire(self):
+        return self
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def transaction(self):
+        return FakeTransaction()
+
+    def cursor(self, query, *args, prefetch=None):
+        self.queries.append(args)
+        since = args[0] if args else None
+        return FakeCursor([row for row in self.rows.values() if since is None or row["created_at"] > since])
+
+    async def fetchrow(self, query):
+        return {"chunks": len(self.rows), "checksum": sum(chunk_id_hash(chunk_id) for chunk_id in self.rows)}
+
+    async def fetch(self, query, *args):
+        if not args:
+            return [{"id": chunk_id} for chunk_id in self.rows]
+        return [self.rows[chunk_id] for chunk_id in args[0]]
+
+
+def test_refresh_merges_new_late_and_deleted_chunks(tmp_path):
+    base = [chunk_row("a", [1, 0, 0]), chunk_row("b", [0, 1, 0]), chunk_row("c", [0, 0, 1])]
+    index = build_index(tmp_path, base)
+
+    table = FakeChunksTable([
+        base[0],
+        base[2],
+        chunk_row("new", [1, 1, 0], WATERMARK + timedelta(minutes=1)),
+        # Committed late: created_at is before the watermark but within the overlap
+        chunk_row("late", [0, 1, 1], WATERMARK - timedelta(minutes=5)),
+        # Behind the overlap, and "b" was deleted: same row count, different checksum
+        chunk_row("old", [1, 0, 1], WATERMARK - timedelta(hours=1)),
+    ])
+
+    asyncio.run(index.refresh(table))
+
+    assert table.queries == [(WATERMARK - local_index.REFRESH_OVERLAP,)]
+    assert sorted(index.positions) == ["a", "c", "late", "new", "old"]
+    assert index.watermark == WATERMARK + timedelta(minutes=1)
+    assert "b" not in result_ids(index.search([0, 1, 0], limit=10))
+    assert result_ids(index.search([1, 1, 0], limit=1)) == ["new"]
+
+    # Rebuilding compacts the deleted row away and keeps the results
+    before = index.search([0, 1, 1], limit=5)
+    index.rebuild()
+    assert len(index.base) == 5 and len(index.delta) == 0
+    assert result_ids(index.search([0, 1, 1], limit=5)) == result_ids(before)
+
+
+def test_first_refresh_builds_snapshot_in_a_thread(tmp_path, monkeypatch):
+    rows, centers = clustered_rows(20)
+    index = LocalVectorIndex("model", directory=str(tmp_path))
+    threaded = []
+    to_thread = asyncio.to_thread
+
+    async def recording_to_thread(function, *args):
+        threaded.append(function.__name__)
+        return await to_thread(function, *args)
+
+    monkeypatch.setattr(asyncio, "to_thread", recording_to_thread)
+    asyncio.run(index.refresh(FakeChunksTable(rows)))
+
+    assert threaded == ["_write_snapshot"]
+    assert index.ready
+    assert len(index.base) == 20 and len(index.delta) == 0
+    assert (tmp_path / "CURRENT").exists()
@@ -0,0 +1,59 @@
+"""Tests for MinHash LSH near-duplicate detection."""
+
+import numpy as np
+
+from ingestion.near_duplicates import MinHasher, NearDuplicateIndex
+
+REPORT = " ".join(f"word{i}" for i in range(400))
+
+
+def revise(text: str, every: int) -> str:
+    """Replace every n-th word."""
+    return " ".join("changed" if i % every == 0 else word for i, word in enumerate(text.split()))
+
+
+def test_signature_is_deterministic_and_ignores_case_and_whitespace():
+    hasher = MinHasher()
+    signature = hasher.signature(REPORT)
+
+    assert signature.dtype == np.uint32
+    assert signature.shape == (128,)
+    assert np.array_equal(signature, MinHasher().signature("  " + REPORT.upper().replace(" ", "\n")))
+    assert hasher.signature("   ") is None
+
+
+def test_finds_revised_document():
+    index = NearDuplicateIndex(threshold=0.8)
+    index.add("report-v1.pdf", index.hasher.signature(REPORT))
+    index.add("other.pdf", index.hasher.signature(" ".join(f"other{i}" for i in range(400))))
+
+    match = index.query(index.hasher.signature(revise(REPORT, 100)))
+
+    assert match is not None
+    assert match[0] == "report-v1.pdf"
+    assert match[1] >= 0.8
+
+
+def test_ignores_dissimilar_and_excluded_documents():
+    index = NearDuplicateIndex(threshold=0.8)
+    signature = index.hasher.signature(REPORT)
+    index.add("report.pdf", signature)
+
+    assert index.query(index.hasher.signature(revise(REPORT, 3))) is None
+    assert index.query(signature, exclude="report.pdf") is None
+
+
+def test_remove_and_reload():
+    index = NearDuplicateIndex()
+    signature = index.hasher.signature(REPORT)
+    index.add("report.pdf", signature)
+    index.remove("report.pdf")
+    assert index.query(signature) is None
+    assert all(not buckets for buckets in index._buckets)
+
+    index.load([
+        ("report.pdf", NearDuplicateIndex.to_bytes(signature)),
+        ("other-settings.pdf", NearDuplicateIndex.to_bytes(signature[:64])),
+    ])
+    assert list(index.signatures) == ["report.pdf"]
+    assert index.query(signature) == ("report.pdf", 1.0)
@@ -0,0 +1,106 @@
+"""Tests for the embeddings request scheduler."""
+
+import asyncio
+
+import pytest
+
+from ingestion import rate_limiter
+from ingestion.rate_limiter import RateLimiter, retry_after_seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Fake monotonic clock; asyncio.sleep advances it instead of waiting."""
+    now = [1000.0]
+    sleeps = []
+    real_sleep = asyncio.sleep
+
+    async def fake_sleep(seconds):
+        sleeps.append(round(seconds, 6))
+        now[0] += seconds
+        await real_sleep(0)
+
+    monkeypatch.setattr(rate_limiter.time, "monotonic", lambda: now[0])
+    monkeypatch.setattr(asyncio, "sleep", fake_sleep)
+    return sleeps
+
+
+def test_requests_per_minute_budget(clock):
+    limiter = RateLimiter(requests_per_minute=2, tokens_per_minute=1000)
+
+    async def run():
+        for _ in range(3):
+            await limiter.acquire(1)
+
+    asyncio.run(run())
+    assert clock == [30.0]
+
+
+def test_tokens_per_minute_budget(clock):
+    limiter = RateLimiter(requests_per_minute=100, tokens_per_minute=100)
+
+    async def run():
+        await limiter.acquire(80)
+        await limiter.acquire(80)
+
+    asyncio.run(run())
+    assert clock == [36.0]
+
+
+def test_oversized_request_waits_for_full_bucket(clock):
+    limiter = RateLimiter(requests_per_minute=100, tokens_per_minute=100)
+
+    async def run():
+        await limiter.acquire(1000)
+        await limiter.acquire(1000)
+
+    asyncio.run(run())
+    assert clock == [60.0]
+
+
+def test_pause_holds_new_requests(clock):
+    limiter = RateLimiter()
+
+    async def run():
+        limiter.pause(5)
+        await limiter.acquire(1)
+
+    asyncio.run(run())
+    assert clock == [5.0]
+
+
+def test_slot_caps_concurrency():
+    limiter = RateLimiter.unlimited(max_concurrency=2)
+    in_flight = []
+    peak = []
+
+    async def request():
+        async with limiter.slot(1):
+            in_flight.append(1)
+            peak.append(len(in_flight))
+            await asyncio.sleep(0.01)
+            in_flight.pop()
+
+    async def run():
+        await asyncio.gather(*(request() for _ in range(5)))
+
+    asyncio.run(run())
+    assert max(peak) == 2
+
+
+class FakeError:
+    def __init__(self, headers):
+        self.response = type("Response", (), {"headers": headers})()
+
+
+@pytest.mark.parametrize(
+    "headers, expected",
+    [
+        ({"retry-after-ms": "1500"}, 1.5),
+        ({"retry-after": "2"}, 2.0),
+        ({"retry-after": "Wed, 21 Oct 2015 07:28:00 GMT"}, None),
+        ({}, None),
+    ],
+)
+def test_retry_after_seconds(headers, expected):
+    assert retry_after_seconds(FakeError(headers)) == expected
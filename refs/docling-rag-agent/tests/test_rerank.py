@@ -0,0 +1,130 @@
+"""Tests for second-stage ranking and result diversification."""
+
+import numpy as np
+import pytest
+
+from utils.models import SearchRequest
+from utils.rerank import (
+    RerankSettings,
+    chunk_overlap,
+    diversify,
+    join_chunks,
+    mmr_order,
+    normalize_embeddings,
+    rank_candidates,
+)
+
+
+def row(chunk_id, document_id, chunk_index, score=1.0, content=None, embedding=None):
+    return {
+        "chunk_id": chunk_id,
+        "document_id": document_id,
+        "chunk_index": chunk_index,
+        "score": score,
+        "content": content or chunk_id,
+        "embedding": embedding,
+    }
+
+
+def test_mmr_skips_near_duplicates():
+    candidates = normalize_embeddings(np.array([[1.0, 0.0], [0.99, 0.1], [0.6, 0.8]]))
+    relevance = np.array([1.0, 0.99, 0.6], dtype=np.float32)
+
+    assert list(mmr_order(relevance, candidates, 1.0)) == [0, 1, 2]
+    assert list(mmr_order(relevance, candidates, 0.5)) == [0, 2, 1]
+
+
+def test_diversify_caps_results_per_document():
+    rows = [row("a1", "a", 1), row("a2", "a", 5), row("a3", "a", 9), row("b1", "b", 1), row("c1", "c", 1)]
+
+    results = diversify(rows, limit=3, max_per_document=1)
+
+    assert [result["chunk_id"] for result in results] == ["a1", "b1", "c1"]
+    assert results[0]["chunk_ids"] == ["a1"]
+
+
+def test_diversify_merges_adjacent_chunks():
+    rows = [
+        row("a5", "a", 5, content="Revenue grew 40% to $12M."),
+        row("a7", "a", 7, content="Churn fell to 2%."),
+        row("b5", "b", 5),
+        row("a6", "a", 6, content="Gross margin was 70%."),
+        row("b9", "b", 9),
+        row("c1", "c", 1),
+    ]
+
+    results = diversify(rows, limit=3, merge_adjacent=True)
+
+    # a6 bridges a5 and a7 into one passage, freeing a slot for b9
+    assert [result["chunk_ids"] for result in results] == [["a5", "a6", "a7"], ["b5"], ["b9"]]
+    assert results[0]["chunk_index"] == 5
+    assert results[0]["content"] == "Revenue grew 40% to $12M.\n\nGross margin was 70%.\n\nChurn fell to 2%."
+
+
+@pytest.mark.parametrize(
+    "previous, content, expected",
+    [
+        ("The fund invested in seed rounds across Europe.", "seed rounds across Europe. It also led", 26),
+        ("Revenue was 10", "100 customers signed", 0),
+        ("Revenue grew strongly in the third quarter", "in the third quarter of 2024", 20),
+        ("Revenue grew in the third quarter", "third quarter of 2024", 0),
+        ("Short overlap here", "here it is", 0),
+    ],
+)
+def test_chunk_overlap(previous, content, expected):
+    assert chunk_overlap(previous, content) == expected
+
+
+def test_join_chunks_removes_overlap():
+    assert join_chunks([
+        "The fund invested in seed rounds across Europe.",
+        "seed rounds across Europe. It also led two Series A rounds.",
+    ]) == "The fund invested in seed rounds across Europe. It also led two Series A rounds."
+    assert join_chunks(["Revenue was 10", "100 customers signed"]) == "Revenue was 10\n\n100 customers signed"
+    assert join_chunks(["Only chunk"]) == "Only chunk"
+
+
+def test_rank_candidates_rescores_semantic_candidates():
+    rows = [
+        row("far", "a", 1, score=0.9, embedding=[0.0, 1.0]),
+        row("near", "b", 1, score=0.8, embedding=[1.0, 0.0]),
+    ]
+
+    results = rank_candidates(rows, 1, RerankSettings(candidates=2), query_embedding=[2.0, 0.0])
+
+    assert [result["chunk_id"] for result in results] == ["near"]
+    assert results[0]["score"] == pytest.approx(1.0)
+    assert "embedding" not in results[0]
+
+
+def test_rank_candidates_applies_mmr_to_fused_scores():
+    rows = [
+        row("a", "a", 1, score=0.03, embedding=[1.0, 0.0]),
+        row("a-copy", "b", 1, score=0.029, embedding=[1.0, 0.01]),
+        row("c", "c", 1, score=0.02, embedding=[0.0, 1.0]),
+    ]
+
+    results = rank_candidates(rows, 2, RerankSettings(mmr_lambda=0.5))
+
+    assert [result["chunk_id"] for result in results] == ["a", "c"]
+    assert [result["score"] for result in results] == [0.03, 0.02]
+
+
+def test_candidate_count():
+    assert RerankSettings().candidate_count(5) == 0
+    assert RerankSettings(candidates=50).candidate_count(5) == 50
+    assert RerankSettings(max_per_document=1).candidate_count(5) == 20
+
+    with pytest.raises(ValueError):
+        RerankSettings(mmr_lambda=1.5)
+
+
+def test_settings_from_request_fall_back_to_env(monkeypatch):
+    monkeypatch.setenv("RERANK_CANDIDATES", "40")
+    monkeypatch.setenv("RERANK_MMR_LAMBDA", "0.7")
+    monkeypatch.setenv("MERGE_ADJACENT_CHUNKS", "on")
+    monkeypatch.delenv("MAX_CHUNKS_PER_DOCUMENT", raising=False)
+
+    settings = RerankSettings.from_request(SearchRequest(query="q", max_per_document=2, merge_adjacent=False))
+
+    assert settings == RerankSettings(candidates=40, mmr_lambda=0.7, max_per_document=2, merge_adjacent=False)
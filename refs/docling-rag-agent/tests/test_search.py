@@ -0,0 +1,87 @@
+"""Tests for search filters and candidate over-fetching."""
+
+import asyncio
+from datetime import date, datetime
+
+import pytest
+
+from utils.models import SearchType
+from utils.rerank import RerankSettings
+from utils.search import HNSW_MAX_EF_SEARCH, build_document_filter, search_chunks
+
+
+def test_empty_filters():
+    assert build_document_filter(None) == {}
+    assert build_document_filter({"source": None, "title": "", "file_type": []}) == {}
+
+
+def test_builds_document_filter():
+    document_filter = build_document_filter({
+        "source": "reports/",
+        "title": "Q3",
+        "file_type": [".PDF", "docx"],
+        "ingested_after": date(2024, 1, 31),
+        "ingested_before": "2024-06-01T12:00:00",
+        "metadata": {"fund": "II"},
+        "sector": "fintech",
+    })
+
+    assert document_filter == {
+        "source": "reports/",
+        "title": "Q3",
+        "file_types": ["pdf", "docx"],
+        "ingested_after": "2024-01-31",
+        "ingested_before": "2024-06-01T12:00:00",
+        "metadata": {"fund": "II", "sector": "fintech"},
+    }
+
+
+def test_single_file_type_and_datetime():
+    document_filter = build_document_filter({"file_type": "md", "ingested_after": datetime(2024, 1, 1, 8)})
+    assert document_filter == {"file_types": ["md"], "ingested_after": "2024-01-01T08:00:00"}
+
+
+def test_rejects_invalid_filters():
+    with pytest.raises(ValueError):
+        build_document_filter({"ingested_after": "last week"})
+    with pytest.raises(ValueError):
+        build_document_filter({"metadata": "fund II"})
+
+
+class RecordingConnection:
+    def __init__(self):
+        self.args = None
+
+    async def fetch(self, sql, *args):
+        self.args = args
+        return []
+
+
+@pytest.mark.parametrize(
+    "search_type, limit, candidates, env_ef_search, expected",
+    [
+        (SearchType.SEMANTIC, 5, 0, None, None),
+        (SearchType.SEMANTIC, 5, 0, "64", 64),
+        (SearchType.SEMANTIC, 5, 50, None, 50),
+        (SearchType.SEMANTIC, 5, 5000, None, HNSW_MAX_EF_SEARCH),
+        (SearchType.SEMANTIC, 5, 0, "5000", HNSW_MAX_EF_SEARCH),
+        (SearchType.HYBRID, 5, 0, None, None),
+        (SearchType.HYBRID, 20, 0, None, 80),
+        (SearchType.HYBRID, 5, 50, None, 200),
+        (SearchType.HYBRID, 5, 500, None, HNSW_MAX_EF_SEARCH),
+    ],
+)
+def test_ef_search_covers_the_vector_candidates(monkeypatch, search_type, limit, candidates, env_ef_search, expected):
+    if env_ef_search:
+        monkeypatch.setenv("VECTOR_EF_SEARCH", env_ef_search)
+    else:
+        monkeypatch.delenv("VECTOR_EF_SEARCH", raising=False)
+    conn = RecordingConnection()
+
+    asyncio.run(search_chunks(
+        conn, "query", [1.0, 0.0], limit, search_type, rerank=RerankSettings(candidates=candidates)
+    ))
+
+    # ef_search is the third SEMANTIC_SQL argument and the fifth HYBRID_SQL one
+    ef_search = conn.args[2] if search_type == SearchType.SEMANTIC else conn.args[4]
+    assert ef_search == expected
@@ -0,0 +1,427 @@
+"""
+Semantic answer cache for the RAG agents.
+
+Stores (question embedding, retrieved chunk ids, final answer) in the
+answer_cache table. A new question whose embedding is close enough to a
+cached one is answered from the cache; a somewhat less similar one runs the
+agent with the cached answer as a draft. Triggers on chunks (sql/schema.sql)
+delete every cached answer built on a chunk that is re-ingested or removed.
+
+Only the first question of a conversation is cached, since later questions
+may depend on earlier turns.
+"""
+
+import os
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
+
+import asyncpg
+from pydantic_ai.messages import (
+    ModelMessage,
+    ModelRequest,
+    ModelResponse,
+    SystemPromptPart,
+    TextPart,
+    UserPromptPart,
+)
+
+logger = logging.getLogger(__name__)
+
+# Cosine similarity above which a cached answer is returned as-is
+DEFAULT_THRESHOLD = 0.95
+
+# Cosine similarity above which a cached answer seeds the new one
+DEFAULT_SEED_THRESHOLD = 0.88
+
+
+@dataclass
+class CachedAnswer:
+    """Answer found in the cache."""
+    id: str
+    query: str
+    answer: str
+    chunk_ids: List[str]
+    similarity: float
+
+
+@dataclass
+class AgentAnswer:
+    """Answer to a user message, from the agent or the cache."""
+    answer: str
+    messages: List[ModelMessage]  # History to continue the conversation from
+    new_messages: List[ModelMessage]  # Messages of this exchange
+    cached: Optional[CachedAnswer] = None  # Cache hit, or the answer that seeded this one
+    from_cache: bool = False
+
+
+# Chunk ids returned by search_knowledge_base during the current agent run
+_retrieved_chunks: ContextVar[Optional[Set[str]]] = ContextVar("retrieved_chunks", default=None)
+
+# Cached answer seeding the current agent run
+_seed_answer: ContextVar[Optional[CachedAnswer]] = ContextVar("seed_answer", default=None)
+
+
+def record_retrieved_chunks(chunk_ids: Iterable[str]) -> None:
+    """Remember chunks retrieved by a search tool for the answer being generated."""
+    retrieved = _retrieved_chunks.get()
+    if retrieved is not None:
+        retrieved.update(str(chunk_id) for chunk_id in chunk_ids)
+
+
+def seed_instructions() -> str:
+    """
+    Get agent instructions for a run seeded by a cached answer.
+
+    Returns:
+        Instructions containing the cached answer, or "" if the run is not seeded
+    """
+    seed = _seed_answer.get()
+    if seed is None:
+        return ""
+
+    return (
+        "A similar question was answered before. Use the earlier answer as a draft: "
+        "search the knowledge base to verify it and adapt it to the current question.\n"
+        f"Earlier question: {seed.query}\n"
+        f"Earlier answer:\n{seed.answer}"
+    )
+
+
+def cached_exchange(system_prompt: str, question: str, answer: str) -> List[ModelMessage]:
+    """
+    Build the message history of a question answered from the cache.
+
+    Args:
+        system_prompt: Agent system prompt (only sent with the first request)
+        question: Question asked
+        answer: Cached answer shown to the user
+
+    Returns:
+        Messages to continue the conversation from
+    """
+    return [
+        ModelRequest(parts=[SystemPromptPart(content=system_prompt), UserPromptPart(content=question)]),
+        ModelResponse(parts=[TextPart(content=answer)])
+    ]
+
+
+class AnswerCache:
+    """Semantic cache of agent answers in PostgreSQL."""
+
+    def __init__(
+        self,
+        threshold: float = DEFAULT_THRESHOLD,
+        seed_threshold: Optional[float] = DEFAULT_SEED_THRESHOLD,
+        ttl_hours: Optional[float] = None,
+        enabled: bool = True
+    ):
+        """
+        Initialize answer cache.
+
+        Args:
+            threshold: Minimum cosine similarity to return a cached answer
+            seed_threshold: Minimum cosine similarity to seed a new answer with a
+                cached one (None disables seeding)
+            ttl_hours: Ignore answers older than this (None keeps them until
+                their chunks change)
+            enabled: Whether the cache is used at all
+        """
+        if seed_threshold is not None and seed_threshold > threshold:
+            raise ValueError("seed_threshold must not be above threshold")
+
+        self.threshold = threshold
+        self.seed_threshold = seed_threshold
+        self.ttl_hours = ttl_hours
+        self.enabled = enabled
+        self.stats: Dict[str, int] = {"hits": 0, "seeded": 0, "misses": 0, "stored": 0}
+
+    @classmethod
+    def from_env(cls) -> "AnswerCache":
+        """
+        Create an answer cache configured from environment variables.
+
+        Reads ANSWER_CACHE ("off" disables it), ANSWER_CACHE_THRESHOLD,
+        ANSWER_CACHE_SEED_THRESHOLD ("off" disables seeding) and
+        ANSWER_CACHE_TTL_HOURS.
+        """
+        seed_threshold = os.getenv("ANSWER_CACHE_SEED_THRESHOLD", str(DEFAULT_SEED_THRESHOLD))
+        ttl_hours = os.getenv("ANSWER_CACHE_TTL_HOURS")
+
+        return cls(
+            threshold=float(os.getenv("ANSWER_CACHE_THRESHOLD", str(DEFAULT_THRESHOLD))),
+            seed_threshold=None if seed_threshold.lower() == "off" else float(seed_threshold),
+            ttl_hours=float(ttl_hours) if ttl_hours else None,
+            enabled=os.getenv("ANSWER_CACHE", "on").lower() not in ("off", "false", "0")
+        )
+
+    def _min_similarity(self) -> float:
+        return self.threshold if self.seed_threshold is None else self.seed_threshold
+
+    async def lookup(
+        self,
+        conn: asyncpg.Connection,
+        query_embedding: Sequence[float],
+        embedding_model: str
+    ) -> Optional[CachedAnswer]:
+        """
+        Find the cached answer to the most similar earlier question.
+
+        Args:
+            conn: Connection with the binary vector codec registered
+            query_embedding: Embedding of the new question
+            embedding_model: Model (and dimensions) the embedding was made with
+
+        Returns:
+            Cached answer at or above the seed threshold, or None. Answers at or
+            above the return threshold count as hits.
+        """
+        if not self.enabled:
+            return None
+
+        try:
+            row = await conn.fetchrow(
+                """
+                SELECT
+                    id::text,
+                    query,
+                    answer,
+                    chunk_ids::text[] AS chunk_ids,
+                    1 - (query_embedding <=> $1::vector) AS similarity
+                FROM answer_cache
+                WHERE embedding_model = $2
+                    AND ($3::float IS NULL OR created_at > CURRENT_TIMESTAMP - $3::float * INTERVAL '1 hour')
+                ORDER BY query_embedding <=> $1::vector
+                LIMIT 1
+                """,
+                query_embedding,
+                embedding_model,
+                self.ttl_hours
+            )
+        except asyncpg.PostgresError as e:
+            logger.warning(f"Answer cache lookup failed: {e}")
+            return None
+
+        if row is None or row["similarity"] < self._min_similarity():
+            self.stats["misses"] += 1
+            return None
+
+        cached = CachedAnswer(
+            id=row["id"],
+            query=row["query"],
+            answer=row["answer"],
+            chunk_ids=list(row["chunk_ids"]),
+            similarity=float(row["similarity"])
+        )
+
+        if cached.similarity >= self.threshold:
+            self.stats["hits"] += 1
+            await conn.execute("UPDATE answer_cache SET hits = hits + 1 WHERE id = $1::uuid", cached.id)
+        else:
+            self.stats["seeded"] += 1
+
+        return cached
+
+    def is_hit(self, cached: Optional[CachedAnswer]) -> bool:
+        """Check whether a lookup result can be returned without running the agent."""
+        return cached is not None and cached.similarity >= self.threshold
+
+    async def store(
+        self,
+        conn: asyncpg.Connection,
+        query: str,
+        query_embedding: Sequence[float],
+        embedding_model: str,
+        chunk_ids: Iterable[str],
+        answer: str
+    ) -> bool:
+        """
+        Cache an answer.
+
+        Answers that did not use the knowledge base are not cached, since no
+        chunk change would ever invalidate them.
+
+        Args:
+            conn: Connection with the binary vector codec registered
+            query: Question asked
+            query_embedding: Embedding of the question
+            embedding_model: Model (and dimensions) the embedding was made with
+            chunk_ids: Chunks retrieved while generating the answer
+            answer: Final answer
+
+        Returns:
+            True if the answer was stored
+        """
+        chunk_ids = sorted(set(chunk_ids))
+        if not self.enabled or not chunk_ids or not answer.strip():
+            return False
+
+        try:
+            # Lock the chunks so a concurrent re-ingestion cannot delete them
+            # between this check and the insert (its trigger would miss the row)
+            async with conn.transaction():
+                existing = await conn.fetchval(
+                    "SELECT count(*) FROM (SELECT 1 FROM chunks WHERE id = ANY($1::uuid[]) FOR KEY SHARE) c",
+                    chunk_ids
+                )
+                if existing != len(chunk_ids):
+                    logger.debug("Not caching answer: chunks changed while it was generated")
+                    return False
+
+                await conn.execute(
+                    """
+                    INSERT INTO answer_cache (query, query_embedding, embedding_model, chunk_ids, answer)
+                    VALUES ($1, $2::vector, $3, $4::uuid[], $5)
+                    """,
+                    query,
+                    query_embedding,
+                    embedding_model,
+                    chunk_ids,
+                    answer
+                )
+        except asyncpg.PostgresError as e:
+            logger.warning(f"Storing answer in cache failed: {e}")
+            return False
+
+        self.stats["stored"] += 1
+        return True
+
+    async def lookup_question(
+        self,
+        pool: asyncpg.Pool,
+        question: str
+    ) -> Tuple[Optional[Any], Optional[CachedAnswer]]:
+        """
+        Look up the first question of a conversation.
+
+        Args:
+            pool: Pool with the binary vector codec registered
+            question: User message
+
+        Returns:
+            Tuple of (question embedding, cached answer or None); the embedding is
+            None if the question could not be embedded
+        """
+        from ingestion.embedder import get_query_embedder
+
+        embedder = get_query_embedder()
+        try:
+            question_embedding = await embedder.embed(question)
+        except Exception as e:
+            logger.warning(f"Answer cache lookup skipped: {e}")
+            return None, None
+
+        async with pool.acquire() as conn:
+            cached = await self.lookup(conn, question_embedding, embedder.generator.cache_model)
+
+        return question_embedding, cached
+
+    async def store_answer(
+        self,
+        pool: asyncpg.Pool,
+        question: str,
+        question_embedding: Any,
+        chunk_ids: Iterable[str],
+        answer: str
+    ) -> bool:
+        """
+        Cache the answer to the first question of a conversation.
+
+        Args:
+            pool: Pool with the binary vector codec registered
+            question: User message
+            question_embedding: Embedding returned by lookup_question()
+            chunk_ids: Chunks retrieved while generating the answer
+            answer: Final answer
+
+        Returns:
+            True if the answer was stored
+        """
+        from ingestion.embedder import get_query_embedder
+
+        async with pool.acquire() as conn:
+            return await self.store(
+                conn,
+                question,
+                question_embedding,
+                get_query_embedder().generator.cache_model,
+                chunk_ids,
+                answer
+            )
+
+    @contextmanager
+    def track(self, seed: Optional[CachedAnswer] = None) -> Iterator[Set[str]]:
+        """
+        Collect the chunks retrieved during an agent run.
+
+        Args:
+            seed: Cached answer to offer the agent as a draft
+
+        Yields:
+            Set filled with chunk ids by record_retrieved_chunks()
+        """
+        retrieved: Set[str] = set()
+        retrieved_token = _retrieved_chunks.set(retrieved)
+        seed_token = _seed_answer.set(seed)
+        try:
+            yield retrieved
+        finally:
+            _retrieved_chunks.reset(retrieved_token)
+            _seed_answer.reset(seed_token)
+
+    async def run_with_answer_cache(
+        self,
+        agent: Any,
+        pool: asyncpg.Pool,
+        question: str,
+        message_history: List[ModelMessage],
+        system_prompt: str,
+        on_text: Optional[Callable[[str], None]] = None
+    ) -> AgentAnswer:
+        """
+        Answer a user message, using the cache for the first question of a conversation.
+
+        A hit is returned without running the agent; otherwise the agent's
+        answer is streamed (seeded by a similar cached answer, if any) and
+        cached together with the chunks it retrieved.
+
+        Args:
+            agent: Agent to run
+            pool: Pool with the binary vector codec registered
+            question: User message
+            message_history: Messages of the conversation so far
+            system_prompt: Agent system prompt, for the history of cached answers
+            on_text: Called with each new piece of the answer as it streams
+
+        Returns:
+            Answer with the updated message history
+        """
+        question_embedding, cached = None, None
+        if self.enabled and not message_history:
+            question_embedding, cached = await self.lookup_question(pool, question)
+
+        if self.is_hit(cached):
+            if on_text:
+                on_text(cached.answer)
+            messages = cached_exchange(system_prompt, question, cached.answer)
+            return AgentAnswer(cached.answer, messages, messages, cached=cached, from_cache=True)
+
+        answer_parts = []
+        with self.track(seed=cached) as retrieved_chunks:
+            async with agent.run_stream(question, message_history=message_history) as result:
+                # Stream text as it comes in (delta=True for only new tokens)
+                async for text in result.stream_text(delta=True):
+                    if on_text:
+                        on_text(text)
+                    answer_parts.append(text)
+
+                messages = result.all_messages()
+                new_messages = result.new_messages()
+
+        answer = "".join(answer_parts)
+        if question_embedding is not None:
+            await self.store_answer(pool, question, question_embedding, retrieved_chunks, answer)
+
+        return AgentAnswer(answer, messages, new_messages, cached=cached)
@@ -15,6 +15,8 @@ import asyncpg
 from asyncpg.pool import Pool
 from dotenv import load_dotenv
 
+from .vector_codec import register_vector_codec
+
 # Load environment variables
 load_dotenv()
 
@@ -45,7 +47,8 @@ class DatabasePool:
                 min_size=5,
                 max_size=20,
                 max_inactive_connection_lifetime=300,
-                command_timeout=60
+                command_timeout=60,
+                init=register_vector_codec  # Send/receive embeddings as binary float32
             )
             logger.info("Database connection pool initialized")
     
@@ -0,0 +1,584 @@
+"""
+In-process vector index over the chunks table.
+
+For read-heavy deployments whose embeddings fit in RAM, searches can skip the
+PostgreSQL round trip: chunk embeddings are kept in a float32 matrix,
+memory-mapped from an on-disk snapshot, and searched with NumPy.
+- Below IVF_MIN_ROWS chunks the search is exact (flat)
+- Above, vectors are clustered into ~sqrt(rows) lists (spherical k-means) and
+  stored list by list, so a query scans only the nprobe closest lists
+
+Chunks added since the snapshot are fetched incrementally by created_at and
+searched flat from memory; deletions (re-ingestion) and rows committed behind
+the watermark are detected by comparing the count and a checksum of the chunk
+ids. Once the in-memory part grows large, the snapshot is rebuilt.
+
+Usage:
+    uv run python -m utils.local_index          # build or refresh the snapshot
+"""
+
+import os
+import json
+import time
+import shutil
+import hashlib
+import asyncio
+import logging
+import argparse
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Set
+
+import asyncpg
+import numpy as np
+from dotenv import load_dotenv
+
+from .rerank import normalize_embeddings
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INDEX_DIR = ".cache/vector_index"
+
+# Exact search below this many chunks, IVF above
+IVF_MIN_ROWS = 10_000
+
+# k-means training sample per list and iterations
+KMEANS_SAMPLE_PER_LIST = 64
+KMEANS_ITERATIONS = 10
+
+# created_at is the inserting transaction's start time, so rows committed
+# late can carry timestamps before the watermark; re-read this far back
+REFRESH_OVERLAP = timedelta(minutes=10)
+
+CHUNK_COLUMNS = """
+    c.id::text AS chunk_id,
+    c.document_id::text AS document_id,
+    c.content,
+    c.embedding,
+    c.metadata,
+    c.created_at,
+    d.title AS document_title,
+    d.source AS document_source
+"""
+
+# Count and checksum of the chunk ids; a deletion offset by a late insert
+# leaves the count unchanged but not the checksum (see chunk_id_hash)
+LIVE_CHUNKS_SQL = """
+    SELECT
+        count(*) AS chunks,
+        COALESCE(sum(('x' || substr(md5(id::text), 1, 15))::bit(60)::bigint), 0) AS checksum
+    FROM chunks
+    WHERE embedding IS NOT NULL
+"""
+
+RECORD_FIELDS = ("chunk_id", "document_id", "content", "metadata", "document_title", "document_source")
+
+
+def chunk_id_hash(chunk_id: str) -> int:
+    """Hash a chunk id the way LIVE_CHUNKS_SQL does (first 60 bits of its MD5)."""
+    return int(hashlib.md5(chunk_id.encode("utf-8")).hexdigest()[:15], 16)
+
+
+def train_ivf(vectors: np.ndarray, nlist: int, seed: int = 0) -> np.ndarray:
+    """
+    Cluster unit vectors with spherical k-means.
+
+    Args:
+        vectors: Normalized (rows, dimensions) matrix
+        nlist: Number of lists (centroids)
+        seed: Random seed of the sample and initial centroids
+
+    Returns:
+        Normalized (nlist, dimensions) centroids
+    """
+    generator = np.random.default_rng(seed)
+    sample_size = min(len(vectors), nlist * KMEANS_SAMPLE_PER_LIST)
+    sample = vectors[np.sort(generator.choice(len(vectors), sample_size, replace=False))]
+    centroids = sample[generator.choice(sample_size, nlist, replace=False)].copy()
+
+    for _ in range(KMEANS_ITERATIONS):
+        assignments = np.argmax(sample @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, sample)
+        counts = np.bincount(assignments, minlength=nlist)
+
+        # Re-seed empty lists with random sample vectors
+        empty = counts == 0
+        if empty.any():
+            sums[empty] = sample[generator.choice(sample_size, int(empty.sum()))]
+
+        centroids = normalize_embeddings(sums)
+
+    return centroids
+
+
+def assign_lists(vectors: np.ndarray, centroids: np.ndarray, block_size: int = 65536) -> np.ndarray:
+    """Assign each vector to its closest centroid, in blocks to bound memory."""
+    return np.concatenate([
+        np.argmax(vectors[start:start + block_size] @ centroids.T, axis=1)
+        for start in range(0, len(vectors), block_size)
+    ]) if len(vectors) else np.zeros(0, dtype=np.int64)
+
+
+class LocalVectorIndex:
+    """Chunk embeddings searched in-process, refreshed from PostgreSQL."""
+
+    def __init__(
+        self,
+        embedding_model: str,
+        directory: Optional[str] = None,
+        refresh_interval: float = 60.0,
+        nprobe: Optional[int] = None
+    ):
+        """
+        Initialize index.
+
+        Args:
+            embedding_model: Model (and dimensions) of the chunk embeddings; a
+                snapshot of another model is not used
+            directory: Snapshot directory (default: LOCAL_VECTOR_INDEX_DIR env var)
+            refresh_interval: Seconds between incremental refreshes
+            nprobe: Lists scanned per query (default: sqrt of the list count)
+        """
+        self.embedding_model = embedding_model
+        self.directory = Path(directory or os.getenv("LOCAL_VECTOR_INDEX_DIR", DEFAULT_INDEX_DIR))
+        self.refresh_interval = refresh_interval
+        self.nprobe = nprobe
+        self.ready = False
+
+        self._last_refresh = 0.0
+        self._refresh_task: Optional[asyncio.Task] = None
+        self._clear()
+
+    def _clear(self) -> None:
+        """Drop all indexed data."""
+        self.base: np.ndarray = np.zeros((0, 0), dtype=np.float32)
+        self.base_records: List[Dict[str, Any]] = []
+        self.centroids: Optional[np.ndarray] = None
+        self.offsets: Optional[np.ndarray] = None
+        self.delta: np.ndarray = np.zeros((0, 0), dtype=np.float32)
+        self.delta_records: List[Dict[str, Any]] = []
+        self.alive = np.zeros(0, dtype=bool)
+        self.positions: Dict[str, int] = {}
+        self.checksum = 0  # Sum of chunk_id_hash over positions
+        self.watermark: Optional[datetime] = None
+
+    @classmethod
+    def from_env(cls, embedding_model: str) -> "LocalVectorIndex":
+        """
+        Create an index configured from environment variables.
+
+        Reads LOCAL_VECTOR_INDEX_DIR, LOCAL_VECTOR_INDEX_REFRESH_SECONDS and
+        LOCAL_VECTOR_INDEX_NPROBE.
+        """
+        nprobe = os.getenv("LOCAL_VECTOR_INDEX_NPROBE")
+        return cls(
+            embedding_model,
+            refresh_interval=float(os.getenv("LOCAL_VECTOR_INDEX_REFRESH_SECONDS", "60")),
+            nprobe=int(nprobe) if nprobe else None
+        )
+
+    @property
+    def size(self) -> int:
+        """Number of indexed chunks."""
+        return len(self.positions)
+
+    def stats(self) -> Dict[str, Any]:
+        """Get index statistics."""
+        return {
+            "chunks": self.size,
+            "snapshot_rows": len(self.base),
+            "memory_rows": len(self.delta),
+            "lists": 0 if self.centroids is None else len(self.centroids),
+            "watermark": self.watermark.isoformat() if self.watermark else None
+        }
+
+    def search(self, query_embedding: Sequence[float], limit: int = 5) -> Optional[List[Dict[str, Any]]]:
+        """
+        Find the chunks most similar to a query.
+
+        Args:
+            query_embedding: Query embedding
+            limit: Maximum number of results
+
+        Returns:
+            Rows with the columns of match_chunks plus score (= similarity),
+            best first; None if the index is not loaded yet
+        """
+        if not self.ready:
+            return None
+
+        query = normalize_embeddings(np.asarray(query_embedding, dtype=np.float32))
+        rows: List[np.ndarray] = []
+        scores: List[np.ndarray] = []
+
+        if len(self.base):
+            if self.centroids is not None:
+                nlist = len(self.centroids)
+                nprobe = min(nlist, self.nprobe or max(1, round(np.sqrt(nlist))))
+                probed = np.argpartition(-(self.centroids @ query), nprobe - 1)[:nprobe]
+                for list_id in probed:
+                    start, end = int(self.offsets[list_id]), int(self.offsets[list_id + 1])
+                    if end > start:
+                        rows.append(np.arange(start, end))
+                        scores.append(self.base[start:end] @ query)
+            else:
+                rows.append(np.arange(len(self.base)))
+                scores.append(self.base @ query)
+
+        if len(self.delta):
+            rows.append(np.arange(len(self.base), len(self.base) + len(self.delta)))
+            scores.append(self.delta @ query)
+
+        if not rows:
+            return []
+
+        candidates = np.concatenate(rows)
+        similarities = np.concatenate(scores)
+        keep = self.alive[candidates]
+        candidates, similarities = candidates[keep], similarities[keep]
+        if not len(candidates):
+            return []
+
+        count = min(limit, len(candidates))
+        top = np.argpartition(-similarities, count - 1)[:count]
+        top = top[np.argsort(-similarities[top])]
+
+        results = []
+        for i in top:
+            similarity = float(similarities[i])
+            results.append({**self._record(int(candidates[i])), "similarity": similarity, "score": similarity})
+        return results
+
+    def _record(self, position: int) -> Dict[str, Any]:
+        if position < len(self.base_records):
+            return self.base_records[position]
+        return self.delta_records[position - len(self.base_records)]
+
+    def maybe_refresh(self, pool: asyncpg.Pool) -> None:
+        """
+        Start a background refresh if the index is stale.
+
+        Searches do not wait for it; until the first refresh completes, search()
+        returns None and callers use PostgreSQL.
+        """
+        if self._refresh_task is not None and not self._refresh_task.done():
+            return
+        if self.ready and time.monotonic() - self._last_refresh < self.refresh_interval:
+            return
+
+        self._refresh_task = asyncio.create_task(self._refresh_in_background(pool))
+
+    async def _refresh_in_background(self, pool: asyncpg.Pool) -> None:
+        try:
+            await self.refresh(pool)
+        except Exception as e:
+            # Retried after refresh_interval; searches fall back meanwhile
+            self._last_refresh = time.monotonic()
+            logger.warning(f"Local vector index refresh failed: {e}")
+
+    async def refresh(self, pool: asyncpg.Pool) -> None:
+        """
+        Bring the index up to date with the chunks table.
+
+        Loads the snapshot on first use, then adds chunks created since the
+        watermark and drops deleted ones. Rebuilds the snapshot when there is
+        none or the in-memory part has grown large.
+
+        Args:
+            pool: Pool with the binary vector codec registered
+        """
+        if not self.ready and not len(self.base) and not len(self.delta):
+            if not self.load():
+                logger.info("Building local vector index from PostgreSQL")
+
+        async with pool.acquire() as conn:
+            since = self.watermark - REFRESH_OVERLAP if self.watermark else None
+            if since is None:
+                query = f"SELECT {CHUNK_COLUMNS} FROM chunks c JOIN documents d ON c.document_id = d.id WHERE c.embedding IS NOT NULL"
+                args: List[Any] = []
+            else:
+                query = f"SELECT {CHUNK_COLUMNS} FROM chunks c JOIN documents d ON c.document_id = d.id WHERE c.embedding IS NOT NULL AND c.created_at > $1"
+                args = [since]
+
+            async with conn.transaction():
+                rows = [
+                    row async for row in conn.cursor(query, *args, prefetch=1000)
+                    if row["chunk_id"] not in self.positions
+                ]
+            added = self._add_rows(rows)
+
+            live = await conn.fetchrow(LIVE_CHUNKS_SQL)
+            removed = 0
+            if live["chunks"] != self.size or int(live["checksum"]) != self.checksum:
+                # Chunks were deleted (re-ingestion) or committed behind the watermark
+                live_ids = {row["id"] for row in await conn.fetch("SELECT id::text AS id FROM chunks WHERE embedding IS NOT NULL")}
+                removed = self._remove(set(self.positions) - live_ids)
+                missing = list(live_ids - set(self.positions))
+                if missing:
+                    rows = await conn.fetch(
+                        f"SELECT {CHUNK_COLUMNS} FROM chunks c JOIN documents d ON c.document_id = d.id WHERE c.id = ANY($1::uuid[])",
+                        missing
+                    )
+                    added += self._add_rows(rows)
+
+        if added or removed:
+            logger.info(f"Local vector index: {added} chunks added, {removed} removed, {self.size} total")
+
+        if self._needs_rebuild():
+            # Copying, k-means and writing take a while; keep serving searches meanwhile
+            await asyncio.to_thread(self._write_snapshot)
+            self.load()
+
+        self._last_refresh = time.monotonic()
+        self.ready = True
+
+    def _add_rows(self, rows: Sequence[Any]) -> int:
+        """Append new chunks (rows with CHUNK_COLUMNS) to the in-memory part."""
+        rows = [row for row in rows if row["chunk_id"] not in self.positions]
+        if not rows:
+            return 0
+
+        vectors = normalize_embeddings(np.stack([np.asarray(row["embedding"], dtype=np.float32) for row in rows]))
+        dimensions = self.base.shape[1] if len(self.base) else (self.delta.shape[1] if len(self.delta) else vectors.shape[1])
+        if vectors.shape[1] != dimensions:
+            raise ValueError(f"Chunk embeddings have {vectors.shape[1]} dimensions, index has {dimensions}")
+
+        start = len(self.base) + len(self.delta)
+        self.delta = vectors if not len(self.delta) else np.vstack([self.delta, vectors])
+        self.alive = np.concatenate([self.alive, np.ones(len(rows), dtype=bool)])
+
+        for offset, row in enumerate(rows):
+            self.delta_records.append({field: row[field] for field in RECORD_FIELDS})
+            self.positions[row["chunk_id"]] = start + offset
+            self.checksum += chunk_id_hash(row["chunk_id"])
+            if self.watermark is None or row["created_at"] > self.watermark:
+                self.watermark = row["created_at"]
+
+        return len(rows)
+
+    def _remove(self, chunk_ids: Set[str]) -> int:
+        """Mark chunks as deleted."""
+        for chunk_id in chunk_ids:
+            self.alive[self.positions.pop(chunk_id)] = False
+            self.checksum -= chunk_id_hash(chunk_id)
+        return len(chunk_ids)
+
+    def _needs_rebuild(self) -> bool:
+        """Rebuild when the snapshot is missing or a large share of rows changed."""
+        total = len(self.base) + len(self.delta)
+        if not total:
+            return False
+        if not len(self.base):
+            return True
+        dead = total - self.size
+        return len(self.delta) > max(IVF_MIN_ROWS, 0.1 * len(self.base)) or dead > 0.2 * total
+
+    def rebuild(self) -> None:
+        """Write all live chunks into a new snapshot (retraining the lists) and load it."""
+        self._write_snapshot()
+        self.load()
+
+    def _write_snapshot(self) -> None:
+        """Write all live chunks into a new snapshot without loading it."""
+        self._save(*self._snapshot_data())
+
+    def _snapshot_data(self):
+        """
+        Collect the live chunks for a snapshot.
+
+        Returns:
+            Arguments of _save(): vectors, records and watermark
+        """
+        positions = np.array(sorted(self.positions.values()), dtype=np.int64)
+        base_count = len(self.base)
+        from_base = positions[positions < base_count]
+        from_delta = positions[positions >= base_count] - base_count
+
+        parts = []
+        if len(from_base):
+            parts.append(np.asarray(self.base[from_base]))
+        if len(from_delta):
+            parts.append(self.delta[from_delta])
+        vectors = np.vstack(parts) if parts else np.zeros((0, 0), dtype=np.float32)
+        records = [self.base_records[i] for i in from_base] + [self.delta_records[i] for i in from_delta]
+        return vectors, records, self.watermark
+
+    def _save(self, vectors: np.ndarray, records: List[Dict[str, Any]], watermark: Optional[datetime]) -> None:
+        """
+        Write a snapshot directory and point CURRENT at it.
+
+        Large snapshots are clustered into IVF lists and stored list by list.
+        """
+        centroids = None
+        offsets = None
+        if len(vectors) >= IVF_MIN_ROWS:
+            nlist = max(1, round(np.sqrt(len(vectors))))
+            centroids = train_ivf(vectors, nlist)
+            assignments = assign_lists(vectors, centroids)
+            order = np.argsort(assignments, kind="stable")
+            vectors = vectors[order]
+            records = [records[i] for i in order]
+            offsets = np.searchsorted(assignments[order], np.arange(nlist + 1))
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        name = f"snapshot-{int(time.time() * 1000)}-{os.getpid()}"
+        snapshot = self.directory / name
+        snapshot.mkdir()
+
+        np.save(snapshot / "vectors.npy", vectors)
+        if centroids is not None:
+            np.save(snapshot / "centroids.npy", centroids)
+            np.save(snapshot / "offsets.npy", offsets)
+        with open(snapshot / "records.jsonl", "w", encoding="utf-8") as f:
+            for record in records:
+                f.write(json.dumps(record) + "\n")
+        with open(snapshot / "state.json", "w", encoding="utf-8") as f:
+            json.dump({
+                "embedding_model": self.embedding_model,
+                "rows": len(records),
+                "watermark": watermark.isoformat() if watermark else None
+            }, f)
+
+        # Atomic switch; readers of the old snapshot keep their mapping
+        current_tmp = self.directory / f"CURRENT.{os.getpid()}.tmp"
+        current_tmp.write_text(name)
+        os.replace(current_tmp, self.directory / "CURRENT")
+
+        for old in self.directory.glob("snapshot-*"):
+            if old.name != name:
+                shutil.rmtree(old, ignore_errors=True)
+
+        logger.info(f"Saved local vector index snapshot with {len(records)} chunks to {snapshot}")
+
+    def load(self) -> bool:
+        """
+        Load the current snapshot, memory-mapping its vectors.
+
+        Returns:
+            True if a snapshot for this embedding model was loaded
+        """
+        current = self.directory / "CURRENT"
+        if not current.exists():
+            return False
+
+        snapshot = self.directory / current.read_text().strip()
+        try:
+            with open(snapshot / "state.json", encoding="utf-8") as f:
+                state = json.load(f)
+            if state["embedding_model"] != self.embedding_model:
+                logger.info(f"Ignoring local vector index snapshot of {state['embedding_model']}")
+                return False
+
+            base = np.load(snapshot / "vectors.npy", mmap_mode="r")
+            with open(snapshot / "records.jsonl", encoding="utf-8") as f:
+                records = [json.loads(line) for line in f]
+            centroids = offsets = None
+            if (snapshot / "centroids.npy").exists():
+                centroids = np.load(snapshot / "centroids.npy")
+                offsets = np.load(snapshot / "offsets.npy")
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Failed to load local vector index snapshot {snapshot}: {e}")
+            return False
+
+        self._clear()
+        self.base = base
+        self.base_records = records
+        self.centroids = centroids
+        self.offsets = offsets
+        self.alive = np.ones(len(records), dtype=bool)
+        self.positions = {record["chunk_id"]: i for i, record in enumerate(records)}
+        self.checksum = sum(chunk_id_hash(chunk_id) for chunk_id in self.positions)
+        self.watermark = datetime.fromisoformat(state["watermark"]) if state["watermark"] else None
+        return True
+
+    async def close(self) -> None:
+        """
+        Stop a running refresh.
+
+        In-memory changes are not written; the next start re-reads them from
+        the snapshot's watermark.
+        """
+        if self._refresh_task is not None and not self._refresh_task.done():
+            self._refresh_task.cancel()
+            try:
+                await self._refresh_task
+            except asyncio.CancelledError:
+                pass
+
+
+_local_index: Optional[LocalVectorIndex] = None
+
+
+def get_local_index(embedding_model: str) -> Optional[LocalVectorIndex]:
+    """
+    Get the process-wide local index, if enabled with LOCAL_VECTOR_INDEX=on.
+
+    Only semantic searches use the index; with the default SEARCH_TYPE=hybrid
+    it is never created.
+
+    Args:
+        embedding_model: Model (and dimensions) of the chunk embeddings
+
+    Returns:
+        Shared LocalVectorIndex, or None when disabled
+    """
+    global _local_index
+    if os.getenv("LOCAL_VECTOR_INDEX", "off").lower() not in ("on", "true", "1"):
+        return None
+    if _local_index is None:
+        _local_index = LocalVectorIndex.from_env(embedding_model)
+    return _local_index
+
+
+async def close_local_index() -> None:
+    """Stop the shared index's background refresh, if it was created."""
+    if _local_index is not None:
+        await _local_index.close()
+
+
+async def build_snapshot(database_url: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Build or refresh the snapshot ahead of time, so agents start with it.
+
+    Args:
+        database_url: PostgreSQL connection URL (default: DATABASE_URL env var)
+
+    Returns:
+        Index statistics
+    """
+    from ingestion.embedder import get_query_embedder
+    from .vector_codec import register_vector_codec
+
+    database_url = database_url or os.getenv("DATABASE_URL")
+    if not database_url:
+        raise ValueError("DATABASE_URL environment variable not set")
+
+    index = LocalVectorIndex.from_env(get_query_embedder().generator.cache_model)
+    pool = await asyncpg.create_pool(database_url, min_size=1, max_size=1, init=register_vector_codec)
+    try:
+        await index.refresh(pool)
+        if len(index.delta) or index.size != len(index.base):
+            index.rebuild()
+    finally:
+        await pool.close()
+
+    return index.stats()
+
+
+def main():
+    """Main entry point."""
+    parser = argparse.ArgumentParser(description="Build or refresh the local vector index snapshot")
+    parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+
+    stats = asyncio.run(build_snapshot())
+    for name, value in stats.items():
+        print(f"{name}: {value}")
+
+
+if __name__ == "__main__":
+    main()
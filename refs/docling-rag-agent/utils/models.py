@@ -27,7 +27,20 @@ class SearchRequest(BaseModel):
     query: str = Field(..., description="Search query")
     search_type: SearchType = Field(default=SearchType.SEMANTIC, description="Type of search")
     limit: int = Field(default=10, ge=1, le=50, description="Maximum results")
-    filters: Dict[str, Any] = Field(default_factory=dict, description="Search filters")
+    filters: Dict[str, Any] = Field(
+        default_factory=dict,
+        description="Document filters: source, title, file_type, ingested_after, ingested_before, metadata; other keys match document metadata"
+    )
+    mmr_lambda: Optional[float] = Field(
+        default=None, ge=0.0, le=1.0,
+        description="Pick results by maximal marginal relevance (1.0: relevance only); None uses RERANK_MMR_LAMBDA"
+    )
+    max_per_document: Optional[int] = Field(
+        default=None, ge=1, description="Maximum results from one document; None uses MAX_CHUNKS_PER_DOCUMENT"
+    )
+    merge_adjacent: Optional[bool] = Field(
+        default=None, description="Merge adjacent chunks of a document into one result; None uses MERGE_ADJACENT_CHUNKS"
+    )
     
     model_config = ConfigDict(use_enum_values=True)
 
@@ -53,6 +66,7 @@ class ChunkResult(BaseModel):
     metadata: Dict[str, Any] = Field(default_factory=dict)
     document_title: str
     document_source: str
+    chunk_ids: List[str] = Field(default_factory=list, description="Chunks merged into this result")
     
     @field_validator('score')
     @classmethod
@@ -193,4 +207,7 @@ class IngestionResult(BaseModel):
     title: str
     chunks_created: int
     processing_time_ms: float
-    errors: List[str] = Field(default_factory=list)
\ No newline at end of file
+    errors: List[str] = Field(default_factory=list)
+    skipped: bool = False  # Unchanged since the last incremental ingestion
+    duplicate_chunks: int = 0  # Chunks that reused the embedding of an identical chunk
+    near_duplicate_of: Optional[str] = None  # Source of a nearly identical stored document
\ No newline at end of file
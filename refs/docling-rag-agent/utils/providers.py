@@ -55,6 +55,17 @@ def get_embedding_model() -> str:
     return os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
 
 
+def get_embedding_dimensions() -> Optional[int]:
+    """
+    Get the configured embedding dimensions.
+
+    Returns:
+        EMBEDDING_DIMENSIONS as an int, or None to use the model's native size
+    """
+    dimensions = os.getenv("EMBEDDING_DIMENSIONS")
+    return int(dimensions) if dimensions else None
+
+
 def get_ingestion_model() -> OpenAIModel:
     """
     Get model for ingestion tasks (uses same model as main LLM).
@@ -96,6 +107,6 @@ def get_model_info() -> dict:
     return {
         "llm_provider": "openai",
         "llm_model": os.getenv("LLM_CHOICE", "gpt-4o-mini"),
-        "embedding_provider": "openai",
+        "embedding_provider": "local" if get_embedding_model().startswith("local:") else "openai",
         "embedding_model": get_embedding_model(),
     }
@@ -0,0 +1,311 @@
+"""
+Second-stage ranking of search candidates.
+
+search_chunks can over-fetch candidates and rank them again here:
+- semantic candidates come with their embeddings and are re-scored exactly
+  with a single float32 matrix product against the query (RERANK_CANDIDATES)
+- optionally picked by maximal marginal relevance, trading some relevance to
+  the query for less redundancy between results (RERANK_MMR_LAMBDA); hybrid
+  and keyword candidates use their search score, scaled to 0-1, as relevance
+- results can be capped per document (MAX_CHUNKS_PER_DOCUMENT) and adjacent
+  chunks of a document merged into one passage (MERGE_ADJACENT_CHUNKS), so a
+  search returns more distinct information per token
+"""
+
+import os
+from collections import defaultdict
+from dataclasses import dataclass
+from itertools import islice
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Optional, Sequence
+
+import numpy as np
+
+from .models import SearchRequest
+
+# Candidates fetched per result when diversifying without RERANK_CANDIDATES
+CANDIDATES_PER_RESULT = 4
+
+# Longest text compared when removing the overlap between adjacent chunks
+MAX_OVERLAP_CHARS = 1000
+
+# Shortest repeated text treated as chunk overlap; chunks from the
+# HybridChunker do not overlap, and short matches are coincidences
+MIN_OVERLAP_CHARS = 20
+
+
+@dataclass
+class RerankSettings:
+    """Second-stage ranking applied by search_chunks."""
+    candidates: int = 0
+    mmr_lambda: Optional[float] = None
+    max_per_document: Optional[int] = None
+    merge_adjacent: bool = False
+
+    def __post_init__(self):
+        if self.mmr_lambda is not None and not 0.0 <= self.mmr_lambda <= 1.0:
+            raise ValueError("mmr_lambda must be between 0 and 1")
+        if self.max_per_document is not None and self.max_per_document < 1:
+            raise ValueError("max_per_document must be at least 1")
+
+    @classmethod
+    def from_env(cls) -> "RerankSettings":
+        """
+        Create settings from environment variables.
+
+        Reads RERANK_CANDIDATES, RERANK_MMR_LAMBDA, MAX_CHUNKS_PER_DOCUMENT and
+        MERGE_ADJACENT_CHUNKS ("on" enables merging); unset keeps each step off.
+        """
+        candidates = os.getenv("RERANK_CANDIDATES")
+        mmr_lambda = os.getenv("RERANK_MMR_LAMBDA")
+        max_per_document = os.getenv("MAX_CHUNKS_PER_DOCUMENT")
+
+        return cls(
+            candidates=int(candidates) if candidates else 0,
+            mmr_lambda=float(mmr_lambda) if mmr_lambda else None,
+            max_per_document=int(max_per_document) if max_per_document else None,
+            merge_adjacent=os.getenv("MERGE_ADJACENT_CHUNKS", "off").lower() in ("on", "true", "1")
+        )
+
+    @classmethod
+    def from_request(cls, request: SearchRequest) -> "RerankSettings":
+        """
+        Create settings for a search request.
+
+        Options the request leaves unset (None) come from the environment, as
+        does the candidate count (see from_env).
+        """
+        defaults = cls.from_env()
+
+        return cls(
+            candidates=defaults.candidates,
+            mmr_lambda=defaults.mmr_lambda if request.mmr_lambda is None else request.mmr_lambda,
+            max_per_document=(
+                defaults.max_per_document if request.max_per_document is None else request.max_per_document
+            ),
+            merge_adjacent=defaults.merge_adjacent if request.merge_adjacent is None else request.merge_adjacent
+        )
+
+    @property
+    def diversifies(self) -> bool:
+        """Whether results are diversified rather than only re-scored."""
+        return self.mmr_lambda is not None or self.max_per_document is not None or self.merge_adjacent
+
+    def candidate_count(self, limit: int) -> int:
+        """
+        Get the number of candidates to fetch for a search.
+
+        Args:
+            limit: Maximum number of results
+
+        Returns:
+            Candidates to fetch, or 0 for a single-stage search
+        """
+        if self.candidates > limit:
+            return self.candidates
+        if self.diversifies:
+            return limit * CANDIDATES_PER_RESULT
+        return 0
+
+
+def normalize_embeddings(vectors: np.ndarray) -> np.ndarray:
+    """Scale rows to unit length, so dot products are cosine similarities."""
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (vectors / norms).astype(np.float32)
+
+
+def mmr_order(relevance: np.ndarray, candidates: np.ndarray, mmr_lambda: float) -> Iterator[int]:
+    """
+    Pick candidates by maximal marginal relevance.
+
+    Each step takes the candidate maximizing
+    mmr_lambda * relevance - (1 - mmr_lambda) * max cosine similarity to the
+    candidates already picked.
+
+    Args:
+        relevance: Relevance of each candidate to the query on a 0-1 scale
+            (e.g. cosine similarity)
+        candidates: Normalized (candidates, dimensions) embedding matrix
+        mmr_lambda: 1.0 ranks by relevance only, lower values favor diversity
+
+    Yields:
+        Positions of the picked candidates, in order
+    """
+    redundancy = np.zeros(len(relevance), dtype=np.float32)
+    available = np.ones(len(relevance), dtype=bool)
+
+    for _ in range(len(relevance)):
+        scores = np.where(available, mmr_lambda * relevance - (1 - mmr_lambda) * redundancy, -np.inf)
+        best = int(np.argmax(scores))
+        yield best
+        available[best] = False
+        redundancy = np.maximum(redundancy, candidates @ candidates[best])
+
+
+def chunk_overlap(previous: str, content: str) -> int:
+    """
+    Find the text a chunk repeats from the end of the previous one.
+
+    Only whole-word matches of at least MIN_OVERLAP_CHARS count as overlap.
+
+    Args:
+        previous: Content of the previous chunk
+        content: Content of the chunk
+
+    Returns:
+        Number of leading characters of content that repeat previous (0 if none)
+    """
+    for size in range(min(len(previous), len(content), MAX_OVERLAP_CHARS), MIN_OVERLAP_CHARS - 1, -1):
+        if not previous.endswith(content[:size]):
+            continue
+        starts_at_word = size == len(previous) or not previous[-size - 1].isalnum() or not content[0].isalnum()
+        ends_at_word = size == len(content) or not content[size].isalnum() or not content[size - 1].isalnum()
+        if starts_at_word and ends_at_word:
+            return size
+    return 0
+
+
+def join_chunks(contents: Sequence[str]) -> str:
+    """
+    Join the contents of consecutive chunks, dropping text repeated by overlap.
+
+    Args:
+        contents: Chunk contents in chunk_index order
+
+    Returns:
+        Passage text; chunks without overlap are separated by a blank line
+    """
+    passage = contents[0]
+    for content in contents[1:]:
+        overlap = chunk_overlap(passage, content)
+        passage = passage + content[overlap:] if overlap else f"{passage}\n\n{content}"
+    return passage
+
+
+def _passage_row(chunks: Dict[int, Dict[str, Any]]) -> Dict[str, Any]:
+    """Build the result row of a passage from its chunks (best chunk first)."""
+    row = dict(next(iter(chunks.values())))
+    ordered = [chunks[index] for index in sorted(chunks)]
+    row["chunk_ids"] = [chunk["chunk_id"] for chunk in ordered]
+    if len(ordered) > 1:
+        row["chunk_index"] = ordered[0]["chunk_index"]
+        row["content"] = join_chunks([chunk["content"] for chunk in ordered])
+    return row
+
+
+def diversify(
+    rows: Iterable[Dict[str, Any]],
+    limit: int,
+    max_per_document: Optional[int] = None,
+    merge_adjacent: bool = False
+) -> List[Dict[str, Any]]:
+    """
+    Select results from ranked candidates, per document and passage.
+
+    Args:
+        rows: Candidates with document_id and chunk_index, best first
+        limit: Maximum number of results
+        max_per_document: Most results from one document (None: no cap)
+        merge_adjacent: Merge a candidate into a result holding the chunk
+            before or after it, instead of returning it separately
+
+    Returns:
+        Result rows, best first; each has chunk_ids listing the chunks it
+        contains, and merged passages the joined content of their chunks
+    """
+    passages: List[Dict[int, Dict[str, Any]]] = []
+    per_document: Dict[Any, int] = defaultdict(int)
+
+    for row in rows:
+        document_id = row["document_id"]
+
+        if merge_adjacent:
+            index = row["chunk_index"]
+            touching = [
+                passage for passage in passages
+                if next(iter(passage.values()))["document_id"] == document_id
+                and (index - 1 in passage or index + 1 in passage)
+            ]
+            if touching:
+                touching[0][index] = row
+                # The chunk can bridge two passages of the document
+                for passage in touching[1:]:
+                    touching[0].update(passage)
+                    passages.remove(passage)
+                    per_document[document_id] -= 1
+                continue
+
+        if len(passages) >= limit:
+            break
+        if max_per_document is not None and per_document[document_id] >= max_per_document:
+            continue
+
+        passages.append({row.get("chunk_index"): row})
+        per_document[document_id] += 1
+
+    return [_passage_row(passage) for passage in passages]
+
+
+def _embedding_matrix(rows: Sequence[Mapping[str, Any]]) -> Optional[np.ndarray]:
+    """Stack candidate embeddings into a normalized matrix (zeros for chunks without one)."""
+    embeddings = [row["embedding"] for row in rows]
+    dimensions = next((len(embedding) for embedding in embeddings if embedding is not None), None)
+    if dimensions is None:
+        return None
+
+    return normalize_embeddings(np.stack([
+        np.zeros(dimensions, dtype=np.float32) if embedding is None else np.asarray(embedding, dtype=np.float32)
+        for embedding in embeddings
+    ]))
+
+
+def rank_candidates(
+    rows: Sequence[Mapping[str, Any]],
+    limit: int,
+    settings: RerankSettings,
+    query_embedding: Optional[Sequence[float]] = None
+) -> List[Dict[str, Any]]:
+    """
+    Rank over-fetched search candidates and keep the best.
+
+    Args:
+        rows: Candidates, best first; with an embedding column when
+            query_embedding is given or MMR is enabled
+        limit: Maximum number of results
+        settings: Second-stage ranking to apply
+        query_embedding: Query embedding to re-score the candidates against
+            (None keeps their scores, and their order unless MMR is enabled)
+
+    Returns:
+        Rows without the embedding, in result order; re-scored rows have
+        similarity and score set to the exact cosine similarity
+    """
+    if not rows:
+        return []
+
+    results = [{key: value for key, value in dict(row).items() if key != "embedding"} for row in rows]
+    needs_embeddings = query_embedding is not None or settings.mmr_lambda is not None
+    candidates = _embedding_matrix(rows) if needs_embeddings else None
+    order: Iterable[int] = range(len(results))
+
+    if candidates is not None:
+        if query_embedding is not None:
+            relevance = candidates @ normalize_embeddings(np.asarray(query_embedding, dtype=np.float32))
+            for row, similarity in zip(results, relevance.tolist()):
+                row["similarity"] = row["score"] = similarity
+            order = np.argsort(-relevance, kind="stable").tolist()
+        else:
+            # Fused or text-rank scores, scaled so they weigh like similarities
+            scores = np.array([row["score"] for row in results], dtype=np.float32)
+            spread = scores.max() - scores.min()
+            relevance = (scores - scores.min()) / spread if spread > 0 else np.ones_like(scores)
+
+        if settings.mmr_lambda is not None:
+            order = mmr_order(relevance, candidates, settings.mmr_lambda)
+
+    ranked = (results[position] for position in order)
+
+    if settings.max_per_document is None and not settings.merge_adjacent:
+        return list(islice(ranked, limit))
+
+    return diversify(ranked, limit, settings.max_per_document, settings.merge_adjacent)
@@ -0,0 +1,421 @@
+"""
+Chunk retrieval shared by the agents.
+
+Implements the SearchType modes on top of the SQL functions in sql/schema.sql:
+- semantic: vector similarity (match_chunks)
+- keyword:  PostgreSQL full-text search over chunks.content_tsv
+- hybrid:   both, fused by reciprocal-rank fusion (hybrid_match_chunks)
+
+search_chunks_multi runs several queries in one statement (multi_match_chunks),
+returning each chunk once.
+
+knowledge_base_search and knowledge_base_multi_search implement the agents'
+search tools on top of these, returning results formatted for the LLM.
+
+Each mode can be restricted to documents matching filters, which are applied
+inside the SQL (document_matches_filter) rather than to the top-k afterwards.
+
+A second stage (utils/rerank.py) can over-fetch candidates and re-rank them:
+exactly in NumPy and by MMR for semantic searches, and per document, merging
+adjacent chunks into passages, for every mode.
+"""
+
+import os
+import json
+from datetime import date, datetime
+from typing import Any, Dict, List, Mapping, Optional, Sequence
+
+import asyncpg
+
+from .answer_cache import record_retrieved_chunks
+from .local_index import get_local_index
+from .models import SearchRequest, SearchType
+from .rerank import RerankSettings, rank_candidates
+from .vector_index import get_vector_search_settings
+
+# Reciprocal-rank fusion constant; larger values flatten the rank curve
+RRF_K = 60
+
+# Most queries searched by one search_chunks_multi call
+MAX_MULTI_QUERIES = 8
+
+# pgvector's default and largest hnsw.ef_search
+HNSW_DEFAULT_EF_SEARCH = 40
+HNSW_MAX_EF_SEARCH = 1000
+
+# Vector candidates hybrid_match_chunks fuses per result, and at least
+HYBRID_CANDIDATES_PER_RESULT = 4
+HYBRID_MIN_CANDIDATES = 20
+
+SEMANTIC_SQL = """
+    SELECT *, similarity AS score
+    FROM match_chunks($1::vector, $2, $3, $4)
+"""
+
+FILTERED_SEMANTIC_SQL = """
+    SELECT *, similarity AS score
+    FROM filtered_match_chunks($1::vector, $2::jsonb, $3, $4, $5)
+"""
+
+KEYWORD_SQL = """
+    SELECT
+        c.id AS chunk_id,
+        c.document_id,
+        c.content,
+        NULL::float AS similarity,
+        ts_rank_cd(c.content_tsv, q.query)::float AS text_rank,
+        ts_rank_cd(c.content_tsv, q.query)::float AS score,
+        c.metadata,
+        d.title AS document_title,
+        d.source AS document_source
+    FROM chunks c
+    JOIN documents d ON c.document_id = d.id,
+    websearch_to_tsquery('english', $1) AS q(query)
+    WHERE c.content_tsv @@ q.query
+        AND document_matches_filter(d.metadata, d.title, d.source, d.created_at, $3::jsonb)
+    ORDER BY score DESC
+    LIMIT $2
+"""
+
+HYBRID_SQL = """
+    SELECT *
+    FROM hybrid_match_chunks($1::vector, $2, $3, $4, $5, $6, $7::jsonb)
+"""
+
+# Over-fetched candidates of any search above, with what the second stage needs
+CANDIDATES_SQL = """
+    SELECT m.*, c.chunk_index{embedding}
+    FROM ({search}) m
+    JOIN chunks c ON c.id = m.chunk_id
+    ORDER BY m.score DESC
+"""
+
+MULTI_SQL = """
+    SELECT *
+    FROM multi_match_chunks({embeddings}, $1::text[], $2, $3, $4, $5, $6, $7::jsonb)
+"""
+
+# Filter keys with their own predicate; any other key is matched against
+# documents.metadata
+FILTER_FIELDS = ("source", "title", "file_type", "ingested_after", "ingested_before", "metadata")
+
+
+def build_document_filter(filters: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Convert search filters into the doc_filter argument of the SQL functions.
+
+    Args:
+        filters: Filters such as SearchRequest.filters:
+            source / title: substring of the document source path / title
+            file_type: extension or list of extensions ("pdf", ".docx")
+            ingested_after / ingested_before: datetime, date or ISO string
+            metadata: dict the document metadata must contain
+            any other key: document metadata value to match exactly
+
+    Returns:
+        Filter dictionary, empty when nothing is filtered
+    """
+    document_filter: Dict[str, Any] = {}
+    metadata: Dict[str, Any] = {}
+
+    for key, value in (filters or {}).items():
+        if value is None or value == "" or value == [] or value == {}:
+            continue
+
+        if key in ("source", "title"):
+            document_filter[key] = str(value)
+        elif key == "file_type":
+            file_types = [value] if isinstance(value, str) else list(value)
+            document_filter["file_types"] = [str(file_type).lower().lstrip(".") for file_type in file_types]
+        elif key in ("ingested_after", "ingested_before"):
+            if isinstance(value, (datetime, date)):
+                value = value.isoformat()
+            else:
+                # Fail here rather than with a cast error inside the query
+                value = datetime.fromisoformat(str(value)).isoformat()
+            document_filter[key] = value
+        elif key == "metadata":
+            if not isinstance(value, dict):
+                raise ValueError("metadata filter must be a dictionary")
+            metadata.update(value)
+        else:
+            metadata[key] = value
+
+    if metadata:
+        document_filter["metadata"] = metadata
+
+    return document_filter
+
+
+def get_search_type() -> SearchType:
+    """
+    Get the search mode used by search_knowledge_base.
+
+    Returns:
+        SEARCH_TYPE env var as a SearchType (default: hybrid)
+    """
+    return SearchType(os.getenv("SEARCH_TYPE", SearchType.HYBRID.value))
+
+
+async def search_chunks(
+    conn: asyncpg.Connection,
+    query: str,
+    query_embedding: Optional[Sequence[float]],
+    limit: int = 5,
+    search_type: SearchType = SearchType.HYBRID,
+    filters: Optional[Dict[str, Any]] = None,
+    rerank: Optional[RerankSettings] = None
+) -> List[Mapping[str, Any]]:
+    """
+    Retrieve the chunks best matching a query.
+
+    Args:
+        conn: Connection with the binary vector codec registered
+        query: Search query text
+        query_embedding: Query embedding (not needed for keyword search)
+        limit: Maximum number of results
+        search_type: Retrieval mode
+        filters: Restrict results to matching documents (see build_document_filter)
+        rerank: Second-stage ranking (default: RerankSettings.from_env())
+
+    Returns:
+        Rows with chunk_id, document_id, content, similarity, score, metadata,
+        document_title and document_source, best first. With a second stage,
+        dicts that also have chunk_index and chunk_ids (the chunks merged
+        into the result)
+    """
+    search_type = SearchType(search_type)
+    document_filter = build_document_filter(filters)
+    filter_json = json.dumps(document_filter)
+    rerank = rerank or RerankSettings.from_env()
+    candidates = rerank.candidate_count(limit)
+    count = candidates or limit
+
+    if search_type == SearchType.KEYWORD:
+        sql, args = KEYWORD_SQL, [query, count, filter_json]
+    else:
+        if query_embedding is None:
+            raise ValueError(f"{search_type.value} search requires a query embedding")
+
+        ef_search, probes = get_vector_search_settings()
+        scan_rows = count
+        if search_type == SearchType.HYBRID:
+            scan_rows = max(count * HYBRID_CANDIDATES_PER_RESULT, HYBRID_MIN_CANDIDATES)
+        if ef_search is not None or scan_rows > HNSW_DEFAULT_EF_SEARCH:
+            # The HNSW scan returns at most ef_search rows
+            ef_search = min(max(ef_search or 0, scan_rows), HNSW_MAX_EF_SEARCH)
+
+        if search_type == SearchType.HYBRID:
+            sql, args = HYBRID_SQL, [query_embedding, query, count, RRF_K, ef_search, probes, filter_json]
+        elif document_filter:
+            sql, args = FILTERED_SEMANTIC_SQL, [query_embedding, filter_json, count, ef_search, probes]
+        else:
+            sql, args = SEMANTIC_SQL, [query_embedding, count, ef_search, probes]
+
+    if not candidates:
+        return await conn.fetch(sql, *args)
+
+    # Only semantic scores are cosine similarities that can be recomputed exactly;
+    # MMR needs the embeddings in every mode
+    semantic = search_type == SearchType.SEMANTIC
+    with_embeddings = semantic or rerank.mmr_lambda is not None
+    rows = await conn.fetch(CANDIDATES_SQL.format(search=sql, embedding=", c.embedding" if with_embeddings else ""), *args)
+    return rank_candidates(rows, limit, rerank, query_embedding if semantic else None)
+
+
+async def search_chunks_for_request(
+    conn: asyncpg.Connection,
+    request: SearchRequest,
+    query_embedding: Optional[Sequence[float]]
+) -> List[Mapping[str, Any]]:
+    """
+    Run a SearchRequest.
+
+    Args:
+        conn: Connection with the binary vector codec registered
+        request: Query, mode, limit, filters and diversification options
+        query_embedding: Embedding of request.query (not needed for keyword search)
+
+    Returns:
+        Rows of search_chunks()
+    """
+    return await search_chunks(
+        conn,
+        request.query,
+        query_embedding,
+        request.limit,
+        request.search_type,
+        filters=request.filters,
+        rerank=RerankSettings.from_request(request)
+    )
+
+
+async def search_chunks_multi(
+    conn: asyncpg.Connection,
+    queries: List[str],
+    query_embeddings: Optional[List[Sequence[float]]],
+    limit: int = 5,
+    search_type: SearchType = SearchType.HYBRID,
+    filters: Optional[Dict[str, Any]] = None
+) -> List[asyncpg.Record]:
+    """
+    Retrieve the best chunks for several queries in one round trip.
+
+    Args:
+        conn: Connection with the binary vector codec registered
+        queries: Search query texts
+        query_embeddings: Embeddings of the queries, in the same order (not
+            needed for keyword search)
+        limit: Maximum number of results per query, before de-duplication
+        search_type: Retrieval mode
+        filters: Restrict results to matching documents (see build_document_filter)
+
+    Returns:
+        Rows of search_chunks() plus query_index (1-based position of the
+        query that scored the chunk highest) and matched_queries (positions of
+        every query that found it); each chunk appears once, grouped by query
+    """
+    search_type = SearchType(search_type)
+
+    if search_type == SearchType.KEYWORD:
+        embeddings_sql = "NULL::vector[]"
+        vectors: List[Sequence[float]] = []
+    else:
+        if query_embeddings is None or len(query_embeddings) != len(queries):
+            raise ValueError(f"{search_type.value} search requires one embedding per query")
+        # One parameter per vector, so each is sent with the binary vector codec
+        embeddings_sql = "ARRAY[" + ", ".join(f"${i}::vector" for i in range(8, 8 + len(queries))) + "]"
+        vectors = list(query_embeddings)
+
+    ef_search, probes = get_vector_search_settings()
+
+    return await conn.fetch(
+        MULTI_SQL.format(embeddings=embeddings_sql),
+        queries,
+        limit,
+        search_type.value,
+        RRF_K,
+        ef_search,
+        probes,
+        json.dumps(build_document_filter(filters)),
+        *vectors
+    )
+
+
+async def knowledge_base_search(
+    pool: asyncpg.Pool,
+    query: str,
+    limit: int = 5,
+    filters: Optional[Dict[str, Any]] = None
+) -> str:
+    """
+    Search the knowledge base for the search_knowledge_base agent tool.
+
+    Unfiltered, single-stage semantic searches are served by the in-process
+    index (utils/local_index.py) once it is loaded, everything else by
+    PostgreSQL. Retrieved chunks are recorded for the answer cache.
+
+    Args:
+        pool: Pool with the binary vector codec registered
+        query: Search query text
+        limit: Maximum number of results
+        filters: Restrict results to matching documents (see build_document_filter)
+
+    Returns:
+        Formatted search results with source citations
+    """
+    from ingestion.embedder import get_query_embedder
+
+    search_type = get_search_type()
+    rerank = RerankSettings.from_env()
+
+    # Generate embedding for query (shared client and query cache across calls)
+    query_embedding = None
+    if search_type != SearchType.KEYWORD:
+        query_embedding = await get_query_embedder().embed(query)
+
+    # Unfiltered, single-stage semantic searches use the in-process index once it is loaded;
+    # hybrid and keyword searches need PostgreSQL's full-text index
+    results = None
+    if (
+        search_type == SearchType.SEMANTIC
+        and not build_document_filter(filters)
+        and not rerank.candidate_count(limit)
+    ):
+        local_index = get_local_index(get_query_embedder().generator.cache_model)
+        if local_index is not None:
+            local_index.maybe_refresh(pool)
+            results = local_index.search(query_embedding, limit)
+
+    # Otherwise search PostgreSQL (vector is sent via the binary codec)
+    if results is None:
+        async with pool.acquire() as conn:
+            results = await search_chunks(conn, query, query_embedding, limit, search_type, filters=filters, rerank=rerank)
+
+    # Remember which chunks this answer is built on (answer cache invalidation)
+    record_retrieved_chunks(chunk_id for row in results for chunk_id in row.get("chunk_ids", [row["chunk_id"]]))
+
+    if not results:
+        return "No relevant information found in the knowledge base for your query."
+
+    # Build response with sources
+    response_parts = [f"[Source: {row['document_title']}]\n{row['content']}\n" for row in results]
+    return f"Found {len(response_parts)} relevant results:\n\n" + "\n---\n".join(response_parts)
+
+
+async def knowledge_base_multi_search(
+    pool: asyncpg.Pool,
+    queries: List[str],
+    limit: int = 3,
+    filters: Optional[Dict[str, Any]] = None
+) -> str:
+    """
+    Search the knowledge base for the search_knowledge_base_multi agent tool.
+
+    Args:
+        pool: Pool with the binary vector codec registered
+        queries: Search query texts (blank ones are dropped, at most
+            MAX_MULTI_QUERIES are searched)
+        limit: Maximum number of results per query
+        filters: Restrict results to matching documents (see build_document_filter)
+
+    Returns:
+        Formatted search results per query with source citations
+    """
+    from ingestion.embedder import get_query_embedder
+
+    queries = [query.strip() for query in queries if query.strip()][:MAX_MULTI_QUERIES]
+    if not queries:
+        return "No search queries were given."
+
+    search_type = get_search_type()
+
+    # Embed all queries with one request
+    query_embeddings = None
+    if search_type != SearchType.KEYWORD:
+        query_embeddings = await get_query_embedder().embed_many(queries)
+
+    # One statement for all queries, each chunk returned once
+    async with pool.acquire() as conn:
+        results = await search_chunks_multi(conn, queries, query_embeddings, limit, search_type, filters=filters)
+
+    # Remember which chunks this answer is built on (answer cache invalidation)
+    record_retrieved_chunks(row["chunk_id"] for row in results)
+
+    if not results:
+        return "No relevant information found in the knowledge base for these queries."
+
+    # Group results by the query they matched best
+    response_parts = []
+    for position, query in enumerate(queries, 1):
+        rows = [row for row in results if row["query_index"] == position]
+        section = [f"Results for \"{query}\":"]
+        if not rows:
+            section.append("No additional results (see the other queries).")
+        for row in rows:
+            others = [str(index) for index in row["matched_queries"] if index != position]
+            also = f" (also matches query {', '.join(others)})" if others else ""
+            section.append(f"[Source: {row['document_title']}]{also}\n{row['content']}\n")
+        response_parts.append("\n".join(section))
+
+    return f"Found {len(results)} relevant results for {len(queries)} queries:\n\n" + "\n---\n".join(response_parts)
@@ -0,0 +1,66 @@
+"""
+Binary pgvector codec for asyncpg.
+
+Registers an encoder/decoder for the `vector` type that uses pgvector's binary
+wire format (uint16 dimensions, uint16 unused, then big-endian float32 values),
+so embeddings travel as raw float32 buffers instead of decimal text that
+Postgres has to parse on every query and insert.
+
+Encoding accepts any 1-D sequence of floats (lists, tuples, NumPy arrays);
+decoding returns float32 NumPy arrays.
+"""
+
+import struct
+from typing import Sequence, Union
+
+import asyncpg
+import numpy as np
+
+_HEADER = struct.Struct(">HH")
+
+VectorLike = Union[Sequence[float], np.ndarray]
+
+
+def encode_vector(value: VectorLike) -> bytes:
+    """Encode a vector in pgvector binary format."""
+    array = np.asarray(value, dtype=">f4")
+    if array.ndim != 1:
+        raise ValueError(f"Expected a 1-D vector, got shape {array.shape}")
+    return _HEADER.pack(array.shape[0], 0) + array.tobytes()
+
+
+def decode_vector(data: bytes) -> np.ndarray:
+    """Decode a pgvector binary value into a float32 array."""
+    dimensions, _ = _HEADER.unpack_from(data)
+    return np.frombuffer(
+        data, dtype=">f4", count=dimensions, offset=_HEADER.size
+    ).astype(np.float32)
+
+
+async def register_vector_codec(conn: asyncpg.Connection) -> None:
+    """
+    Register the binary vector codec on a connection.
+
+    Intended as the `init` hook of asyncpg.create_pool.
+
+    Args:
+        conn: Connection to configure
+    """
+    schema = await conn.fetchval(
+        """
+        SELECT n.nspname
+        FROM pg_type t
+        JOIN pg_namespace n ON n.oid = t.typnamespace
+        WHERE t.typname = 'vector'
+        """
+    )
+    if schema is None:
+        raise ValueError("pgvector type 'vector' not found; run CREATE EXTENSION vector")
+
+    await conn.set_type_codec(
+        "vector",
+        schema=schema,
+        encoder=encode_vector,
+        decoder=decode_vector,
+        format="binary"
+    )
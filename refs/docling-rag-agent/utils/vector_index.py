@@ -0,0 +1,256 @@
+"""
+Vector index management for chunk embeddings.
+
+Chooses the ANN index for `chunks.embedding` from the current number of
+embedded chunks and rebuilds it without blocking reads or writes:
+- ivfflat with lists ~= sqrt(rows) while the table is small enough to
+  rebuild cheaply
+- HNSW once the table is large, since it keeps recall and latency flat
+  without periodic retraining
+
+Usage:
+    uv run python -m utils.vector_index              # tune if needed
+    uv run python -m utils.vector_index --dry-run    # show the recommendation
+    uv run python -m utils.vector_index --method hnsw --force
+"""
+
+import os
+import re
+import math
+import asyncio
+import logging
+import argparse
+from typing import Any, Dict, Optional, Tuple
+
+import asyncpg
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+INDEX_NAME = "idx_chunks_embedding"
+
+# Switch from ivfflat to HNSW at this many embedded chunks
+HNSW_MIN_ROWS = 100_000
+
+# HNSW build parameters (pgvector defaults)
+HNSW_M = 16
+HNSW_EF_CONSTRUCTION = 64
+
+
+def recommend_index(rows: int, method: str = "auto", hnsw_min_rows: int = HNSW_MIN_ROWS) -> Dict[str, Any]:
+    """
+    Choose index parameters for a number of embedded chunks.
+
+    Args:
+        rows: Number of chunks with embeddings
+        method: "auto", "hnsw" or "ivfflat"
+        hnsw_min_rows: Row count from which "auto" picks HNSW
+
+    Returns:
+        Index spec, e.g. {"method": "ivfflat", "lists": 100}
+    """
+    if method == "auto":
+        method = "hnsw" if rows >= hnsw_min_rows else "ivfflat"
+
+    if method == "hnsw":
+        return {"method": "hnsw", "m": HNSW_M, "ef_construction": HNSW_EF_CONSTRUCTION}
+    if method == "ivfflat":
+        return {"method": "ivfflat", "lists": max(1, round(math.sqrt(rows)))}
+
+    raise ValueError(f"Unknown index method: {method}")
+
+
+def recommend_search_settings(index: Dict[str, Any]) -> Dict[str, int]:
+    """Suggested per-query knobs (VECTOR_EF_SEARCH / VECTOR_PROBES) for an index."""
+    if index["method"] == "hnsw":
+        return {"ef_search": 100}
+    return {"probes": max(1, round(math.sqrt(index["lists"])))}
+
+
+def get_vector_search_settings() -> Tuple[Optional[int], Optional[int]]:
+    """
+    Get the per-query ANN knobs passed to match_chunks.
+
+    Returns:
+        Tuple of (HNSW ef_search, ivfflat probes) from VECTOR_EF_SEARCH and
+        VECTOR_PROBES; None keeps the server setting
+    """
+    ef_search = os.getenv("VECTOR_EF_SEARCH")
+    probes = os.getenv("VECTOR_PROBES")
+    return (int(ef_search) if ef_search else None, int(probes) if probes else None)
+
+
+def parse_index_definition(definition: str) -> Dict[str, Any]:
+    """
+    Read method and parameters from a pg_indexes.indexdef string.
+
+    Args:
+        definition: CREATE INDEX statement as reported by PostgreSQL
+
+    Returns:
+        Index spec in the same shape as recommend_index()
+    """
+    method_match = re.search(r"USING (\w+)", definition)
+    method = method_match.group(1).lower() if method_match else "unknown"
+    spec: Dict[str, Any] = {"method": method}
+
+    for name, value in re.findall(r"(\w+)\s*=\s*'?(\d+)'?", definition):
+        spec[name.lower()] = int(value)
+
+    if method == "ivfflat":
+        spec.setdefault("lists", 100)
+    elif method == "hnsw":
+        spec.setdefault("m", 16)
+        spec.setdefault("ef_construction", 64)
+
+    return spec
+
+
+def needs_rebuild(current: Optional[Dict[str, Any]], target: Dict[str, Any]) -> bool:
+    """
+    Check whether the current index is far enough from the target to rebuild.
+
+    ivfflat lists within a factor of two of the target are kept, so the index
+    is not rebuilt on every small ingestion.
+    """
+    if current is None or current["method"] != target["method"]:
+        return True
+
+    if target["method"] == "ivfflat":
+        ratio = current["lists"] / target["lists"]
+        return not 0.5 <= ratio <= 2.0
+
+    return current.get("m") != target["m"] or current.get("ef_construction") != target["ef_construction"]
+
+
+def index_statement(name: str, spec: Dict[str, Any]) -> str:
+    """Build the CREATE INDEX CONCURRENTLY statement for an index spec."""
+    if spec["method"] == "hnsw":
+        options = f"m = {spec['m']}, ef_construction = {spec['ef_construction']}"
+    else:
+        options = f"lists = {spec['lists']}"
+
+    return (
+        f"CREATE INDEX CONCURRENTLY {name} ON chunks "
+        f"USING {spec['method']} (embedding vector_cosine_ops) WITH ({options})"
+    )
+
+
+async def get_current_index(conn: asyncpg.Connection) -> Optional[Dict[str, Any]]:
+    """Get the spec of the existing embedding index, if any."""
+    definition = await conn.fetchval(
+        "SELECT indexdef FROM pg_indexes WHERE tablename = 'chunks' AND indexname = $1",
+        INDEX_NAME
+    )
+    return parse_index_definition(definition) if definition else None
+
+
+async def rebuild_vector_index(conn: asyncpg.Connection, spec: Dict[str, Any]) -> None:
+    """
+    Replace the embedding index without blocking searches or ingestion.
+
+    The new index is built concurrently under a temporary name, then swapped
+    in place of the old one.
+
+    Args:
+        conn: Connection outside a transaction (CONCURRENTLY requires it)
+        spec: Index spec from recommend_index()
+    """
+    temporary_name = f"{INDEX_NAME}_new"
+
+    # Leftover of an interrupted rebuild (concurrent builds leave invalid indexes)
+    await conn.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {temporary_name}")
+
+    maintenance_work_mem = os.getenv("INDEX_MAINTENANCE_WORK_MEM")
+    if maintenance_work_mem:
+        await conn.execute(f"SET maintenance_work_mem = '{maintenance_work_mem}'")
+
+    logger.info(f"Building {spec['method']} index {spec}")
+    await conn.execute(index_statement(temporary_name, spec))
+
+    await conn.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {INDEX_NAME}")
+    await conn.execute(f"ALTER INDEX {temporary_name} RENAME TO {INDEX_NAME}")
+
+
+async def tune_vector_index(
+    database_url: Optional[str] = None,
+    method: str = "auto",
+    force: bool = False,
+    dry_run: bool = False,
+    hnsw_min_rows: int = HNSW_MIN_ROWS
+) -> Dict[str, Any]:
+    """
+    Rebuild the embedding index if it does not fit the current chunk count.
+
+    Uses its own connection without a command timeout, since index builds on
+    large tables take longer than pooled queries are allowed to.
+
+    Args:
+        database_url: PostgreSQL connection URL (default: DATABASE_URL env var)
+        method: "auto", "hnsw" or "ivfflat"
+        force: Rebuild even if the current index already fits
+        dry_run: Only report what would be done
+        hnsw_min_rows: Row count from which "auto" picks HNSW
+
+    Returns:
+        Dictionary with rows, previous and target index specs, whether the
+        index was rebuilt, and suggested search settings
+    """
+    database_url = database_url or os.getenv("DATABASE_URL")
+    if not database_url:
+        raise ValueError("DATABASE_URL environment variable not set")
+
+    conn = await asyncpg.connect(database_url)
+    try:
+        rows = await conn.fetchval("SELECT count(*) FROM chunks WHERE embedding IS NOT NULL")
+        current = await get_current_index(conn)
+        target = recommend_index(rows, method, hnsw_min_rows)
+        rebuild = force or needs_rebuild(current, target)
+
+        if rebuild and not dry_run:
+            await rebuild_vector_index(conn, target)
+            logger.info(f"Rebuilt {INDEX_NAME} for {rows} chunks: {target}")
+        elif not rebuild:
+            logger.info(f"{INDEX_NAME} fits {rows} chunks, keeping {current}")
+    finally:
+        await conn.close()
+
+    return {
+        "rows": rows,
+        "previous": current,
+        "index": target,
+        "rebuilt": rebuild and not dry_run,
+        "search_settings": recommend_search_settings(target)
+    }
+
+
+def main():
+    """Main entry point."""
+    parser = argparse.ArgumentParser(description="Tune the chunk embedding index")
+    parser.add_argument("--method", choices=["auto", "hnsw", "ivfflat"], default="auto", help="Index type (auto picks by chunk count)")
+    parser.add_argument("--force", action="store_true", help="Rebuild even if the current index fits")
+    parser.add_argument("--dry-run", action="store_true", help="Only show the recommendation")
+    parser.add_argument("--hnsw-min-rows", type=int, default=HNSW_MIN_ROWS, help="Chunk count from which auto picks HNSW")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+
+    result = asyncio.run(tune_vector_index(
+        method=args.method,
+        force=args.force,
+        dry_run=args.dry_run,
+        hnsw_min_rows=args.hnsw_min_rows
+    ))
+
+    print(f"Embedded chunks: {result['rows']}")
+    print(f"Current index:   {result['previous']}")
+    print(f"Target index:    {result['index']}")
+    print(f"Rebuilt:         {result['rebuilt']}")
+    for name, value in result["search_settings"].items():
+        print(f"Suggested VECTOR_{name.upper()}={value}")
+
+
+if __name__ == "__main__":
+    main()